@@ -37,8 +37,8 @@ Initializes controllers and launches the FastAPI application using Uvicorn
 # Add button on right side of the maximize/restore spreadsheet view, the button should open a split view of spreadsheet with editing mode on the right side, and visual editing enabled on the left side, where user can edit the spreadsheet in a visual way 🔁 
 # Add visual programming option from frontend where user can create new spreadsheet json format on frontend and ask AI to generate script for applying it to the spreadsheet 🔁
 # Modify system to use default python script, if prompt operation becomes complex (pandas operation requires more than 2 steps).
-# Add auto code executor and interpreter to test script from LLM and ask LLM to regenerate the script, if test is unsuccessful. This will help reduce number of errors cuased by complex prompts requiring multiple operations.
-# This cycle should occur 3 times, after 3rd trial, system should breakout and show user error (Failed to generate script for set of instructions).
+# Add auto code executor and interpreter to test script from LLM and ask LLM to regenerate the script, if test is unsuccessful. This will help reduce number of errors cuased by complex prompts requiring multiple operations. ✅
+# This cycle should occur 3 times, after 3rd trial, system should breakout and show user error (Failed to generate script for set of instructions). ✅
 
 import os
 import argparse
@@ -0,0 +1,111 @@
+"""
+Diff benchmark
+--------------
+Compares the vectorized modified-cell diff against the original per-cell loop
+on typical script edits, and checks that both report the same cells.
+
+Usage:
+    python benchmarks/diff_benchmark.py --rows 200000 --cols 20
+"""
+
+import os
+import sys
+import time
+import argparse
+from typing import Any, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.controller.cell_diff import find_modified_cells
+
+
+def legacy_find_modified_cells(orig_df: pd.DataFrame, new_df: pd.DataFrame) -> List[List[int]]:
+    """The original per-cell loop, kept here as the baseline"""
+    orig_columns = set(orig_df.columns)
+    modified_cells: List[List[int]] = []
+
+    new_columns = set(new_df.columns) - orig_columns
+    for col_name in new_columns:
+        col_idx = list(new_df.columns).index(col_name)
+        for row_idx in range(len(new_df)):
+            modified_cells.append([row_idx, col_idx])
+
+    for col_name in orig_columns:
+        if col_name in new_df.columns:
+            col_idx = list(new_df.columns).index(col_name)
+            orig_col_idx = list(orig_df.columns).index(col_name)
+
+            for row_idx in range(min(len(orig_df), len(new_df))):
+                orig_val: Any = orig_df.iat[row_idx, orig_col_idx]
+                new_val: Any = new_df.iat[row_idx, col_idx]
+
+                if pd.isna(orig_val) and pd.isna(new_val):
+                    continue
+                elif pd.isna(orig_val) or pd.isna(new_val):
+                    modified_cells.append([row_idx, col_idx])
+                elif orig_val != new_val:
+                    modified_cells.append([row_idx, col_idx])
+
+    return modified_cells
+
+
+def make_frame(rows: int, cols: int, seed: int = 0) -> pd.DataFrame:
+    """Build a sheet mixing float (with NaN), int, text and date columns"""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        kind = i % 4
+        if kind == 0:
+            values = rng.uniform(0, 1000, rows)
+            values[rng.random(rows) < 0.05] = np.nan
+            data[f'f{i}'] = values
+        elif kind == 1:
+            data[f'i{i}'] = rng.integers(0, 1000, rows)
+        elif kind == 2:
+            data[f's{i}'] = rng.choice(['north', 'south', 'east', 'west', None], rows)
+        else:
+            data[f'd{i}'] = pd.date_range('2020-01-01', periods=rows, freq='min')
+    return pd.DataFrame(data)
+
+
+EDITS = {
+    'scale one column': lambda df: df.assign(**{df.columns[0]: df.iloc[:, 0] * 1.1}),
+    'fill missing': lambda df: df.fillna({df.columns[0]: 0}),
+    'add column': lambda df: df.assign(total=df.iloc[:, 0] + df.iloc[:, 1]),
+    'edit text column': lambda df: df.assign(**{df.columns[2]: df.iloc[:, 2].str.upper()}),
+    'sort rows': lambda df: df.sort_values(df.columns[1]).reset_index(drop=True),
+    'no-op': lambda df: df.copy(deep=False),
+}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the modified-cell diff")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--cols", type=int, default=20)
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time the vectorized diff")
+    args = parser.parse_args()
+
+    orig_df = make_frame(args.rows, args.cols)
+    print(f"rows={args.rows} cols={args.cols}")
+    for name, edit in EDITS.items():
+        new_df = edit(orig_df)
+        cells, vector_time = timed(find_modified_cells, orig_df, new_df)
+        line = f"{name:>17}: vectorized {vector_time * 1000:9.1f} ms  ({len(cells):,} cells)"
+        if not args.skip_legacy:
+            legacy, legacy_time = timed(legacy_find_modified_cells, orig_df, new_df)
+            same = sorted(map(tuple, legacy)) == sorted(map(tuple, cells))
+            line += f"  legacy {legacy_time * 1000:10.1f} ms  speedup {legacy_time / vector_time:8.0f}x  same={same}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
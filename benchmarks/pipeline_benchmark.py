@@ -0,0 +1,106 @@
+"""
+Pipeline benchmark
+------------------
+Measures ingest, script execution, diffing and serialization throughput with
+the local stand-in LLM provider, so it runs offline on CI-like machines.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py --rows 200000 --repeat 3
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LLM_PROVIDER', 'local')
+
+from src.model.session_manager import SessionManager
+from src.controller.spreadsheet_controller import SpreadsheetController
+
+
+COMMANDS = [
+    "Add a column named Total that sums Quantity and Price",
+    "Uppercase column Region",
+    "Multiply column Price by 1.1",
+    "Sort by Quantity descending",
+    "Fill missing values with 0",
+]
+
+
+class _Upload:
+    """Minimal stand-in for an uploaded file"""
+
+    def __init__(self, path: str):
+        self.filename = os.path.basename(path)
+        self.file = open(path, 'rb')
+
+
+def make_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Build a synthetic sales sheet"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'Region': rng.choice(['north', 'south', 'east', 'west'], rows),
+        'Product': rng.choice([f'item-{i}' for i in range(200)], rows),
+        'Quantity': rng.integers(1, 100, rows),
+        'Price': rng.uniform(1, 500, rows).round(2),
+        'Date': pd.date_range('2020-01-01', periods=rows, freq='min'),
+    })
+    df.loc[rng.random(rows) < 0.05, 'Price'] = np.nan
+    return df
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the spreadsheet command pipeline offline")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    controller = SpreadsheetController(SessionManager())
+    timings = {'ingest': [], 'generate': [], 'execute+diff': [], 'serialize': []}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'bench.csv')
+        make_frame(args.rows).to_csv(csv_path, index=False)
+
+        for _ in range(args.repeat):
+            upload = _Upload(csv_path)
+            session_id, elapsed = timed(controller.upload_spreadsheet, upload)
+            upload.file.close()
+            timings['ingest'].append(elapsed)
+
+            session = controller.session_manager.get_session(session_id)
+            history = session.get_modification_history()
+            for command in COMMANDS:
+                df = history.get_current_state().get_data()
+                script, elapsed = timed(controller.llm_service.generate_script, df, command)
+                timings['generate'].append(elapsed)
+
+                (new_df, _), elapsed = timed(controller.script_executor.execute_script, script, df)
+                timings['execute+diff'].append(elapsed)
+
+            _, elapsed = timed(controller.view_spreadsheet, session_id)
+            timings['serialize'].append(elapsed)
+            controller.cleanup_session(session_id)
+    controller.shutdown()
+
+    print(f"rows={args.rows} repeat={args.repeat} provider={controller.llm_service.provider.name}")
+    for phase, values in timings.items():
+        print(f"{phase:>14}: median {statistics.median(values) * 1000:9.1f} ms  "
+              f"max {max(values) * 1000:9.1f} ms  ({args.rows / statistics.median(values):,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,16 +7,18 @@ Defines RESTful API endpoints for the application using FastAPI
 import os
 import threading
 from typing import Optional, Dict, Any, List
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, BackgroundTasks
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.requests import Request
 from pydantic import BaseModel
 import pathlib
 import json
+from urllib.parse import quote
 import pandas as pd
 from src.controller.spreadsheet_controller import SpreadsheetController
+from src.controller.edit_channel import EditChannel
 from src.model.session_manager import SessionManager
 from src.model.prompt_history import PromptHistory
 
@@ -37,6 +39,9 @@ class CommandRequest(BaseModel):
     sessionId: str
     command: str
 
+class QueryRequest(BaseModel):
+    query: str
+
 class PromptRequest(BaseModel):
     prompt: str
 
@@ -106,9 +111,19 @@ async def lifespan(app: FastAPI):
         prompt_file
     )
     yield
+    # Stop script worker processes
+    spreadsheet_controller.shutdown()
 
 app.router.lifespan_context = lifespan
 
+@app.middleware("http")
+async def mark_foreground(request: Request, call_next):
+    """Hold background precompute back while a request is being handled."""
+    if controllers.spreadsheet_controller is None:
+        return await call_next(request)
+    with controllers.spreadsheet_controller.precompute.foreground():
+        return await call_next(request)
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Render the main application page."""
@@ -127,6 +142,25 @@ def health_check():
         version="0.1.0"
     )
 
+@app.get("/api/metrics")
+def metrics():
+    """
+    Operational metrics endpoint
+
+    Returns:
+        Dict: Counters (e.g. which racing candidate index won), latency
+        percentiles, the circuit state of each configured model, the
+        compiled-script cache, artifact log, export cache and precompute queue
+    """
+    snapshot = controllers.spreadsheet_controller.metrics.snapshot()
+    snapshot['models'] = controllers.spreadsheet_controller.llm_service.provider.get_status()
+    snapshot['script_cache'] = controllers.spreadsheet_controller.script_executor.script_cache.stats()
+    artifact_log = controllers.spreadsheet_controller.artifact_log
+    snapshot['artifact_log'] = {'written': artifact_log.written, 'dropped': artifact_log.dropped}
+    snapshot['export_cache'] = controllers.spreadsheet_controller.exporter.stats()
+    snapshot['precompute'] = controllers.spreadsheet_controller.precompute.stats()
+    return snapshot
+
 @app.post("/upload", response_model=UploadResponse)
 async def upload_file(file: UploadFile = File(...)):
     """Handle spreadsheet file uploads."""
@@ -198,25 +232,29 @@ def redo_modification(session_id: str):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/query/{session_id}")
+def run_query(session_id: str, request: QueryRequest):
+    """Run a read-only SQL query against the spreadsheet (the sheet is the table 'df')."""
+    try:
+        return controllers.spreadsheet_controller.run_query(session_id, request.query)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/download/{session_id}")
-def download_spreadsheet(session_id: str, background_tasks: BackgroundTasks):
-    """Download the modified spreadsheet."""
+def download_spreadsheet(session_id: str, format: Optional[str] = None):
+    """Download the modified spreadsheet (streamed; the session stays open). Defaults to the uploaded file's format."""
     try:
-        # Get both file_path and original_filename
-        file_path, original_filename = controllers.spreadsheet_controller.download_spreadsheet(session_id)
-        
-        # Schedule cleanup after download
-        background_tasks.add_task(controllers.spreadsheet_controller.cleanup_session, session_id)
-        
-        # Use original filename for download
-        return FileResponse(
-            path=file_path,
-            filename=original_filename,
-            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        chunks, filename, media_type, size = controllers.spreadsheet_controller.download_spreadsheet(session_id, format)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+    # Plain ASCII name for old clients, the exact name as RFC 5987 filename*
+    fallback = filename.encode('ascii', 'replace').decode('ascii').replace('"', "'")
+    headers = {'Content-Disposition': f"attachment; filename=\"{fallback}\"; filename*=utf-8''{quote(filename)}"}
+    if size is not None:
+        headers['Content-Length'] = str(size)
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
 @app.get("/prompts")
 def get_prompts():
     """Get saved prompts"""
@@ -291,6 +329,29 @@ def process_table_changes(request: TableChangesRequest):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.websocket("/ws/{session_id}")
+async def edit_channel(websocket: WebSocket, session_id: str):
+    """Stream grid edits; answers with acknowledgements and patches instead of full grids."""
+    await websocket.accept()
+    if not controllers.session_manager.session_exists(session_id):
+        await websocket.close(code=4404, reason="Session not found or expired")
+        return
+
+    channel = EditChannel(
+        controllers.spreadsheet_controller,
+        session_id,
+        websocket.send_json,
+        debounce=float(os.getenv('EDIT_DEBOUNCE_MS', '300')) / 1000
+    )
+    try:
+        while True:
+            message = await websocket.receive_json()
+            await channel.receive(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await channel.close()
+
 # Add these new endpoints after the existing endpoints
 @app.post("/update_schema")
 def update_schema(request: SchemaRequest):
@@ -351,20 +412,12 @@ def transform_to_schema(session_id: str):
         if 'target_schema' not in session_data:
             raise ValueError("No target schema found. Please update the right spreadsheet first.")
         
-        # Get the left spreadsheet data
-        left_df = controllers.spreadsheet_controller.get_spreadsheet_df(session_id)
-        
         # Get the right spreadsheet data
         right_df = pd.DataFrame.from_dict(session_data['right_df'])
         
-        # Generate transformation prompt
-        transformation_prompt = controllers.spreadsheet_controller.generate_transformation_prompt(
-            left_df, right_df
-        )
-        
-        # Process the transformation command
-        spreadsheet_view = controllers.spreadsheet_controller.process_command(
-            session_id, transformation_prompt
+        # Apply a confident column mapping directly, otherwise have the LLM write the transformation
+        spreadsheet_view = controllers.spreadsheet_controller.transform_to_schema(
+            session_id, right_df, session_data['target_schema']
         )
         
         # Ensure the response includes a success key
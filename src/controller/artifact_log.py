@@ -0,0 +1,238 @@
+"""
+Artifact Log module
+------------------
+Append-only SQLite log of generated scripts and spreadsheet snapshots, written off the request path
+"""
+
+import json
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+
+class ArtifactLog:
+    """
+    Records artifacts in a single SQLite database from a background writer
+
+    Callers only enqueue; a writer thread commits queued artifacts in
+    batches (one transaction per batch) and periodically deletes artifacts
+    older than the retention period. When the queue is full new artifacts
+    are dropped and counted rather than slowing down requests.
+    """
+
+    def __init__(self, path: str, retention_hours: float = 72, batch_size: int = 200,
+                 flush_interval: float = 1.0, max_queue: int = 10000, prune_interval: float = 600):
+        """
+        Initialize the artifact log and start its writer
+
+        Args:
+            path: SQLite database file
+            retention_hours: Artifacts older than this are deleted (0 keeps everything)
+            batch_size: Maximum artifacts committed per transaction
+            flush_interval: Longest time an artifact waits in the queue
+            max_queue: Artifacts that may wait before new ones are dropped
+            prune_interval: Seconds between retention sweeps
+        """
+        self.path = path
+        self.retention_hours = retention_hours
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.prune_interval = prune_interval
+        self.dropped = 0
+        self.written = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._closed = False
+
+        # Create the schema up front so readers never see a missing table
+        connection = self._connect()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " kind TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " content TEXT,"
+                " metadata TEXT)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS artifacts_kind_key ON artifacts (kind, key)")
+            connection.execute("CREATE INDEX IF NOT EXISTS artifacts_created ON artifacts (created)")
+            connection.commit()
+        finally:
+            connection.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name='artifact-log', daemon=True)
+        self._writer.start()
+
+    def append(self, kind: str, key: str, content: Union[str, Callable[[], Any], None] = None,
+               metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Queue an artifact for writing
+
+        Args:
+            kind: Artifact type, e.g. 'script' or 'spreadsheet'
+            key: Identifier within the kind
+            content: Text, or a callable producing the content on the writer
+                thread (non-string results are stored as JSON)
+            metadata: JSON-serializable details
+
+        Returns:
+            bool: False if the artifact was dropped because the queue is full
+        """
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait((kind, key, time.time(), content, metadata))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def log_script(self, script_id: str, script: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Record a generated script
+
+        Args:
+            script_id: Script identifier
+            script: The script source
+            metadata: Details such as the columns and row count it ran on
+
+        Returns:
+            bool: False if the artifact was dropped
+        """
+        return self.append('script', script_id, script, metadata)
+
+    def get(self, kind: str, key: str) -> Optional[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Read the latest artifact of a kind and key (queued artifacts are not visible until written)
+
+        Args:
+            kind: Artifact type
+            key: Identifier within the kind
+
+        Returns:
+            Optional[Tuple[str, Optional[Dict[str, Any]]]]: Content and metadata, or None
+        """
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT content, metadata FROM artifacts WHERE kind = ? AND key = ? ORDER BY id DESC LIMIT 1",
+                (kind, key)
+            ).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]) if row[1] else None
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """
+        Wait until everything queued so far is written
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            bool: True if the queue was drained in time
+        """
+        if not self._writer.is_alive():
+            return self._queue.empty()
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """
+        Write the remaining artifacts and stop the writer
+
+        Args:
+            timeout: Maximum seconds to wait for the writer
+        """
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logging.warning("ArtifactLog: queue still full at shutdown; remaining artifacts are lost")
+            return
+        self._writer.join(timeout)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _write_loop(self) -> None:
+        """Writer thread: commit artifacts in batches and prune old ones"""
+        connection = self._connect()
+        last_prune = 0.0
+        try:
+            running = True
+            while running:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = ()
+                batch: List[Any] = [item]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                rows = []
+                waiters = []
+                for entry in batch:
+                    if entry is None:
+                        running = False
+                    elif isinstance(entry, threading.Event):
+                        waiters.append(entry)
+                    elif entry:
+                        rows.append(self._row(entry))
+                rows = [row for row in rows if row is not None]
+                if rows:
+                    try:
+                        with connection:
+                            connection.executemany(
+                                "INSERT INTO artifacts (kind, key, created, content, metadata) VALUES (?, ?, ?, ?, ?)",
+                                rows
+                            )
+                        self.written += len(rows)
+                    except sqlite3.Error as e:
+                        logging.warning(f"ArtifactLog: could not write {len(rows)} artifacts: {e}")
+                for waiter in waiters:
+                    waiter.set()
+
+                if self.retention_hours > 0 and time.monotonic() - last_prune > self.prune_interval:
+                    last_prune = time.monotonic()
+                    self._prune(connection)
+        finally:
+            connection.close()
+
+    def _row(self, entry: Tuple[str, str, float, Any, Optional[Dict[str, Any]]]) -> Optional[Tuple]:
+        """Serialize a queued artifact into a table row"""
+        kind, key, created, content, metadata = entry
+        try:
+            if callable(content):
+                content = content()
+            if content is not None and not isinstance(content, str):
+                content = json.dumps(content, default=str)
+            return kind, key, created, content, json.dumps(metadata, default=str) if metadata else None
+        except Exception as e:
+            logging.warning(f"ArtifactLog: could not serialize {kind} {key}: {e}")
+            return None
+
+    def _prune(self, connection: sqlite3.Connection) -> None:
+        """Delete artifacts older than the retention period"""
+        try:
+            with connection:
+                connection.execute("DELETE FROM artifacts WHERE created < ?",
+                                   (time.time() - self.retention_hours * 3600,))
+        except sqlite3.Error as e:
+            logging.warning(f"ArtifactLog: retention sweep failed: {e}")
@@ -0,0 +1,247 @@
+"""
+Block Detector module
+------------------
+Finds the rectangular tables of a sheet that holds several, separated by empty rows or columns
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Column names pandas gives header cells that were empty
+UNNAMED_COLUMN = re.compile(r'^Unnamed: \d+(_level_\d+)?$')
+
+
+def _runs(flags: np.ndarray) -> List[Tuple[int, int]]:
+    """(start, stop) of each run of True values"""
+    padded = np.concatenate(([False], flags, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return [(int(start), int(stop)) for start, stop in zip(edges[::2], edges[1::2])]
+
+
+def single_table(blocks: Optional[Dict[str, Any]]) -> bool:
+    """
+    True if a sheet is one table under its column names with nothing around it
+
+    Args:
+        blocks: BlockDetector.detect result (None counts as a single table)
+
+    Returns:
+        bool: Whether the sheet can be treated as a whole
+    """
+    if not blocks:
+        return True
+    tables = blocks['tables']
+    return not blocks['notes'] and len(tables) <= 1 and all(table['header_row'] is None for table in tables)
+
+
+class BlockDetector:
+    """
+    Detects table blocks inside a sheet
+
+    Blocks are the regions of filled cells that empty rows and columns
+    separate: the filled-cell mask is cut recursively at rows, then
+    columns, that are empty across the region being split, until no
+    region splits further. Real column names count as a filled first row,
+    so an empty column inside a named table does not split it. Each block's header is the sheet's column
+    names (for blocks in the first rows under real names) or its first
+    row when that row looks like one, optionally under a one-cell title
+    row. Blocks without a header that sit directly below a table of the
+    same columns continue it, and single-row blocks become notes (or the
+    title of the table below).
+
+    Coordinates are df.iloc positions with exclusive ends, so a table's
+    data is df.iloc[rows[0]:rows[1], cols[0]:cols[1]].
+    """
+
+    def __init__(self, max_blocks: int = 500):
+        """
+        Initialize the detector
+
+        Args:
+            max_blocks: Above this many raw blocks the sheet is treated as one table
+        """
+        self.max_blocks = max_blocks
+
+    def detect(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Find the tables of a sheet
+
+        Args:
+            df: Sheet data
+
+        Returns:
+            Dict[str, Any]: 'tables', each with 'rows' and 'cols' ranges of
+            its data, 'header_row' (None when the header is the column
+            names), 'header' and 'title'; and 'notes', single-row blocks
+            that are not a title, with 'row', 'cols' and 'text'
+        """
+        mask = self.filled_mask(df)
+        # Real column names act as a filled row above the data, so an empty
+        # column under one (a placeholder or a freshly inserted column) does
+        # not split the table it sits in; blocks of only that row are dropped
+        named = np.array([not UNNAMED_COLUMN.match(str(name)) for name in df.columns], dtype=bool)
+        if isinstance(df.columns, pd.RangeIndex):
+            named[:] = False
+        blocks = [(max(r0 - 1, 0), r1 - 1, c0, c1) for r0, r1, c0, c1 in self._cut(np.vstack([named, mask])) if r1 > 1]
+        tables: List[Dict[str, Any]] = []
+        notes: List[Dict[str, Any]] = []
+        # Last table per column span, which a headerless block below it continues
+        by_span: Dict[Tuple[int, int], Dict[str, Any]] = {}
+
+        for r0, r1, c0, c1 in sorted(blocks):
+            previous = by_span.get((c0, c1))
+            title = None
+            if c1 - c0 > 1 and r1 - r0 > 2 and mask[r0, c0:c1].sum() == 1:
+                # A lone cell above the header of a wider table is its title
+                header_row, header = self._header(df, mask, r0 + 1, r1, c0, c1, previous)
+                if header_row is not None:
+                    title = self._row_text(df, mask, r0, c0, c1)
+                    r0 += 1
+            if title is None:
+                header_row, header = self._header(df, mask, r0, r1, c0, c1, previous)
+            if header_row is None and header is None:
+                if previous is not None:
+                    previous['rows'][1] = r1
+                    continue
+                if r1 - r0 == 1:
+                    notes.append({'row': r0, 'cols': [c0, c1], 'text': self._row_text(df, mask, r0, c0, c1)})
+                    continue
+                header = [f"column_{column + 1}" for column in range(c1 - c0)]
+            table = {
+                'rows': [r0 + 1 if header_row is not None else r0, r1],
+                'cols': [c0, c1],
+                'header_row': header_row,
+                'header': header,
+                'title': title
+            }
+            tables.append(table)
+            by_span[(c0, c1)] = table
+
+        # A note right above a table (at most one empty row between them) is its title
+        for table in tables:
+            if table['title'] is not None:
+                continue
+            top = table['header_row'] if table['header_row'] is not None else table['rows'][0]
+            for note in notes:
+                if top - 2 <= note['row'] < top and note['cols'][0] < table['cols'][1] and table['cols'][0] < note['cols'][1]:
+                    table['title'] = note['text']
+                    notes.remove(note)
+                    break
+
+        tables.sort(key=lambda table: (table['rows'][0], table['cols'][0]))
+        return {'tables': tables, 'notes': notes}
+
+    def extract(self, df: pd.DataFrame, table: Dict[str, Any]) -> pd.DataFrame:
+        """
+        Get one table as its own sheet: its data under its header, empty rows dropped
+
+        Args:
+            df: Sheet data
+            table: Entry of detect()['tables']
+
+        Returns:
+            pd.DataFrame: The table with a fresh index
+        """
+        (r0, r1), (c0, c1) = table['rows'], table['cols']
+        frame = df.iloc[r0:r1, c0:c1]
+        filled = self.filled_mask(frame).any(axis=1)
+        frame = frame[filled].reset_index(drop=True)
+        frame.columns = table['header']
+        return frame
+
+    @staticmethod
+    def filled_mask(df: pd.DataFrame) -> np.ndarray:
+        """
+        Cells holding a value: not missing and not an empty string
+
+        Args:
+            df: Sheet data
+
+        Returns:
+            np.ndarray: Boolean array of df's shape
+        """
+        mask = np.empty(df.shape, dtype=bool, order='F')
+        for position in range(df.shape[1]):
+            column = df.iloc[:, position]
+            mask[:, position] = column.notna().to_numpy()
+            if pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column):
+                # Hash lookup; about half the cost of an elementwise comparison on object columns
+                mask[:, position] &= ~column.isin(['']).to_numpy()
+        return mask
+
+    def _cut(self, mask: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """Split the mask at empty rows and columns into (r0, r1, c0, c1) blocks"""
+        blocks: List[Tuple[int, int, int, int]] = []
+        regions = [(0, mask.shape[0], 0, mask.shape[1])]
+        while regions:
+            r0, r1, c0, c1 = regions.pop()
+            region = mask[r0:r1, c0:c1]
+            row_runs = _runs(region.any(axis=1))
+            if not row_runs:
+                continue
+            col_runs = _runs(region.any(axis=0))
+            if len(row_runs) > 1:
+                regions.extend((r0 + start, r0 + stop, c0, c1) for start, stop in row_runs)
+            elif len(col_runs) > 1:
+                regions.extend((r0 + row_runs[0][0], r0 + row_runs[0][1], c0 + start, c0 + stop) for start, stop in col_runs)
+            else:
+                blocks.append((r0 + row_runs[0][0], r0 + row_runs[0][1], c0 + col_runs[0][0], c0 + col_runs[0][1]))
+            if len(blocks) + len(regions) > self.max_blocks:
+                # Scattered cells rather than tables: one table over everything filled
+                rows, cols = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+                return [(int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1)]
+        return blocks
+
+    def _header(self, df: pd.DataFrame, mask: np.ndarray, r0: int, r1: int, c0: int, c1: int,
+                previous: Optional[Dict[str, Any]]) -> Tuple[Optional[int], Optional[List[str]]]:
+        """
+        Header of a block: (None, column names), (r0, first row's values) or (None, None) if it has none
+
+        A first row is a header when all its filled cells are distinct,
+        non-numeric text covering at least half the block's width, and it
+        is followed by data. Under a table of the same columns it must also
+        repeat that table's header or sit above a column that is not text.
+        """
+        if r0 == 0 and previous is None:
+            names = df.columns[c0:c1]
+            if not isinstance(df.columns, pd.RangeIndex) and not any(UNNAMED_COLUMN.match(str(name)) for name in names):
+                return None, [str(name) for name in names]
+        if r1 - r0 < 2:
+            return None, None
+
+        filled = mask[r0, c0:c1]
+        cells = df.iloc[r0, c0:c1].to_numpy(dtype=object)[filled]
+        if len(cells) * 2 < c1 - c0 or not all(isinstance(cell, str) for cell in cells):
+            return None, None
+        texts = [cell.strip() for cell in cells]
+        if len(set(texts)) < len(texts) or pd.to_numeric(pd.Series(texts), errors='coerce').notna().any():
+            return None, None
+
+        if previous is not None:
+            repeats = [text.lower() for text in texts] == [str(name).lower() for name in previous['header']]
+            if not repeats and not self._typed_below(df, mask, r0 + 1, r1, c0, c1):
+                return None, None
+        header = df.iloc[r0, c0:c1].to_numpy(dtype=object)
+        return r0, [str(value).strip() if filled[k] else f"column_{k + 1}" for k, value in enumerate(header)]
+
+    @staticmethod
+    def _typed_below(df: pd.DataFrame, mask: np.ndarray, r0: int, r1: int, c0: int, c1: int, probe: int = 20) -> bool:
+        """True if some column's first filled values below a row include numbers, dates or numeric text"""
+        stop = min(r1, r0 + probe)
+        for position in range(c0, c1):
+            values = df.iloc[r0:stop, position].to_numpy(dtype=object)[mask[r0:stop, position]]
+            if any(not isinstance(value, str) for value in values):
+                return True
+            if len(values) and pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').notna().any():
+                return True
+        return False
+
+    @staticmethod
+    def _row_text(df: pd.DataFrame, mask: np.ndarray, row: int, c0: int, c1: int) -> str:
+        """Filled cells of a row joined into one line"""
+        values = df.iloc[row, c0:c1].to_numpy(dtype=object)[mask[row, c0:c1]]
+        return ' '.join(str(value).strip() for value in values)
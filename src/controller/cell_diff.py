@@ -0,0 +1,219 @@
+"""
+Cell Diff module
+------------------
+Vectorized comparison of two DataFrames to find the cells a script modified
+"""
+
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.controller.shared_frame import buffer_key
+from src.model.modified_cells import ModifiedCells
+
+
+# numpy dtype kinds compared with plain array operators: bool, ints, floats, complex
+_NUMERIC_KINDS = 'biufc'
+# numpy dtype kinds holding NaT: timedelta, datetime
+_TIME_KINDS = 'mM'
+
+
+def _first_positions(columns: pd.Index) -> Dict[Hashable, int]:
+    """Map each column name to its first position"""
+    positions: Dict[Hashable, int] = {}
+    for position, name in enumerate(columns):
+        positions.setdefault(name, position)
+    return positions
+
+
+def _values(df: pd.DataFrame, position: int) -> Any:
+    """Column values as a numpy array for numpy dtypes, otherwise the extension array"""
+    column = df.iloc[:, position]
+    if isinstance(column.dtype, np.dtype):
+        return column.to_numpy(copy=False)
+    return column.array
+
+
+def _same_buffer(old: Any, new: Any) -> bool:
+    """True if both columns are backed by the same buffer (unchanged under copy-on-write)"""
+    if old is new:
+        return True
+    old_key = buffer_key(old)
+    return old_key is not None and old_key == buffer_key(new)
+
+
+def changed_rows(old: Any, new: Any, row_count: int) -> np.ndarray:
+    """
+    Compare the first `row_count` values of two columns
+
+    Two missing values (None, NaN, NaT, pd.NA) count as equal; a missing and
+    a present value count as different.
+
+    Args:
+        old: Original column values
+        new: Modified column values
+        row_count: Number of leading rows to compare
+
+    Returns:
+        np.ndarray: Boolean mask, True where the value changed
+    """
+    if row_count == 0:
+        return np.zeros(0, dtype=bool)
+    if len(old) == len(new) == row_count and _same_buffer(old, new):
+        return np.zeros(row_count, dtype=bool)
+
+    old = old[:row_count]
+    new = new[:row_count]
+
+    if isinstance(old, np.ndarray) and isinstance(new, np.ndarray):
+        old_kind, new_kind = old.dtype.kind, new.dtype.kind
+        if old_kind in _NUMERIC_KINDS and new_kind in _NUMERIC_KINDS:
+            if old_kind in 'fc' or new_kind in 'fc':
+                with np.errstate(invalid='ignore'):
+                    return (old != new) & ~(np.isnan(old) & np.isnan(new))
+            return old != new
+        if old_kind in _TIME_KINDS and old_kind == new_kind:
+            return (old != new) & ~(np.isnat(old) & np.isnat(new))
+
+    return _changed_objects(old, new)
+
+
+def _changed_objects(old: Any, new: Any) -> np.ndarray:
+    """Compare columns of mixed or extension types element by element, vectorized where possible"""
+    old_missing = np.asarray(pd.isna(old), dtype=bool)
+    new_missing = np.asarray(pd.isna(new), dtype=bool)
+    changed = old_missing != new_missing
+    present = ~old_missing & ~new_missing
+    if not present.any():
+        return changed
+
+    old_present = np.asarray(old, dtype=object)[present]
+    new_present = np.asarray(new, dtype=object)[present]
+    try:
+        differs = np.asarray(old_present != new_present, dtype=bool)
+        if differs.shape != old_present.shape:
+            raise ValueError("non-elementwise comparison")
+    except (TypeError, ValueError):
+        # Cells holding containers compare to arrays; fall back to one comparison per cell
+        differs = np.fromiter((_cells_differ(a, b) for a, b in zip(old_present, new_present)),
+                              dtype=bool, count=len(old_present))
+    changed[present] = differs
+    return changed
+
+
+def _cells_differ(a: Any, b: Any) -> bool:
+    """Compare two cell values that may be containers"""
+    try:
+        return bool(a != b)
+    except (TypeError, ValueError):
+        try:
+            return not np.array_equal(np.asarray(a, dtype=object), np.asarray(b, dtype=object))
+        except Exception:
+            return a is not b
+
+
+def column_changes(orig_df: pd.DataFrame, new_df: pd.DataFrame,
+                   positions: Optional[Iterable[int]] = None) -> List[Optional[np.ndarray]]:
+    """
+    Find the changed rows of every column of the modified frame
+
+    Columns are matched by name (first occurrence). Rows are compared by
+    position over the rows both frames have; rows appended or removed at the
+    end are not reported.
+
+    Args:
+        orig_df: Original DataFrame
+        new_df: Modified DataFrame
+        positions: Columns of new_df to compare; the others are reported
+            unchanged. None compares every column.
+
+    Returns:
+        List[Optional[np.ndarray]]: Per column of new_df, a boolean mask of
+        changed rows, or None for a new column (every row counts as modified)
+    """
+    orig_positions = _first_positions(orig_df.columns)
+    new_positions = _first_positions(new_df.columns)
+    row_count = min(len(orig_df), len(new_df))
+
+    # Later duplicates of a column name are not compared, like the first-match lookup always did
+    changes: List[Optional[np.ndarray]] = [np.zeros(0, dtype=bool) for _ in new_df.columns]
+    if positions is not None:
+        selected = set(positions)
+        new_positions = {name: position for name, position in new_positions.items() if position in selected}
+    for name, new_position in new_positions.items():
+        orig_position = orig_positions.get(name)
+        if orig_position is None:
+            changes[new_position] = None
+            continue
+        changes[new_position] = changed_rows(_values(orig_df, orig_position), _values(new_df, new_position), row_count)
+    return changes
+
+
+def diff_frames(orig_df: pd.DataFrame, new_df: pd.DataFrame,
+                positions: Optional[Iterable[int]] = None) -> ModifiedCells:
+    """
+    Find cells that were modified by a script
+
+    Args:
+        orig_df: Original DataFrame
+        new_df: Modified DataFrame (index reset)
+        positions: Columns of new_df that can have changed (None for all)
+
+    Returns:
+        ModifiedCells: Changed rows per column of new_df
+    """
+    return ModifiedCells(len(new_df), column_changes(orig_df, new_df, positions))
+
+
+def find_modified_cells(orig_df: pd.DataFrame, new_df: pd.DataFrame) -> List[List[int]]:
+    """
+    List the cells modified by a script as [row, col] pairs
+
+    Args:
+        orig_df: Original DataFrame
+        new_df: Modified DataFrame (index reset)
+
+    Returns:
+        List[List[int]]: [row, col] coordinates of modified cells, ordered by
+        column and then row
+    """
+    return diff_frames(orig_df, new_df).to_list()
+
+
+def unchanged_columns(orig_df: pd.DataFrame, new_df: pd.DataFrame,
+                      modified_cells: ModifiedCells) -> List[Optional[int]]:
+    """
+    Match the columns of a modified frame to the same, unchanged columns of the original
+
+    Per-column results (schema entries, profiles) of the original can be
+    reused for these columns. A column qualifies when it has the name of an
+    original column, the same dtype and no modified rows; every column is
+    reported changed when the row count changed or column names repeat.
+    Row inserts and removals that keep the count are not detected, so
+    modified_cells must mark the rows they shifted.
+
+    Args:
+        orig_df: Original DataFrame
+        new_df: Modified DataFrame
+        modified_cells: Changes of new_df relative to orig_df (from diff_frames
+            or the edit engine)
+
+    Returns:
+        List[Optional[int]]: Per column of new_df, the position of the same
+        column in orig_df, or None if it is new or changed
+    """
+    sources: List[Optional[int]] = [None] * len(new_df.columns)
+    if (len(orig_df) != len(new_df) or not orig_df.columns.is_unique or not new_df.columns.is_unique
+            or len(modified_cells.changes) != len(new_df.columns)):
+        return sources
+
+    orig_positions = _first_positions(orig_df.columns)
+    for position, name in enumerate(new_df.columns):
+        mask = modified_cells.changes[position]
+        orig_position = orig_positions.get(name)
+        if orig_position is None or mask is None or mask.any():
+            continue
+        if orig_df.dtypes.iloc[orig_position] == new_df.dtypes.iloc[position]:
+            sources[position] = orig_position
+    return sources
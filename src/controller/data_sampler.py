@@ -0,0 +1,132 @@
+"""
+Data Sampler module
+----------------
+Selects small, representative subsets of spreadsheet rows
+"""
+
+import numpy as np
+import pandas as pd
+from typing import List
+
+
+class DataSampler:
+    """
+    Picks representative rows from a DataFrame without scanning all of it
+    """
+
+    def __init__(self, candidate_pool_size: int = 2000):
+        """
+        Initialize the data sampler
+
+        Args:
+            candidate_pool_size: Maximum number of evenly spaced rows inspected
+                when looking for representative rows
+        """
+        self.candidate_pool_size = candidate_pool_size
+
+    def representative_rows(self, df: pd.DataFrame, n: int) -> List[int]:
+        """
+        Choose up to n row positions that together show as many populated
+        columns as possible
+
+        The first row is always included. Remaining rows are picked greedily
+        from an evenly spaced candidate pool, preferring rows that fill columns
+        which are still empty in the rows chosen so far, so sparse sheets are
+        not described by five rows of blanks.
+
+        Args:
+            df: The DataFrame to sample
+            n: Maximum number of rows to return
+
+        Returns:
+            List[int]: Sorted row positions
+        """
+        row_count = len(df)
+        if n <= 0 or row_count == 0:
+            return []
+        if row_count <= n:
+            return list(range(row_count))
+
+        candidates = self._evenly_spaced(row_count, self.candidate_pool_size)
+        populated = df.iloc[candidates].notna().to_numpy()
+
+        chosen = [0]
+        covered = populated[0].copy()
+        available = np.ones(len(candidates), dtype=bool)
+        available[0] = False
+
+        while len(chosen) < n and available.any():
+            # New columns filled by each candidate, ties broken by overall density
+            gain = (populated & ~covered).sum(axis=1) * populated.shape[1] + populated.sum(axis=1)
+            gain[~available] = -1
+            best = int(np.argmax(gain))
+            chosen.append(best)
+            covered |= populated[best]
+            available[best] = False
+
+        return sorted(int(candidates[i]) for i in chosen)
+
+    def stratified_sample(self, df: pd.DataFrame, size: int = 200) -> pd.DataFrame:
+        """
+        Build a small sample that exercises the shapes of data a script will meet
+
+        The sample keeps the first and last rows (so positional references to
+        the top of the sheet still work), and for every column adds a row
+        where it is empty, a row where it is filled, and the rows holding its
+        numeric minimum and maximum. Remaining space is filled with evenly
+        spaced rows. The original index labels are preserved.
+
+        Args:
+            df: The DataFrame to sample
+            size: Approximate number of rows in the sample
+
+        Returns:
+            pd.DataFrame: The sampled rows in their original order
+        """
+        row_count = len(df)
+        if row_count <= size:
+            return df
+
+        head = min(20, size // 4)
+        picked = set(range(head))
+        picked.update(range(max(row_count - 5, 0), row_count))
+
+        candidates = self._evenly_spaced(row_count, self.candidate_pool_size)
+        pool = df.iloc[candidates]
+        null_mask = pool.isna().to_numpy()
+        for col_idx in range(null_mask.shape[1]):
+            col_nulls = null_mask[:, col_idx]
+            for flag in (True, False):
+                hits = np.flatnonzero(col_nulls == flag)
+                if len(hits):
+                    picked.add(int(candidates[hits[0]]))
+
+            col_data = pool.iloc[:, col_idx]
+            if pd.api.types.is_numeric_dtype(col_data) and not pd.api.types.is_bool_dtype(col_data) and col_data.notna().any():
+                values = col_data.to_numpy(dtype=float, na_value=np.nan)
+                picked.add(int(candidates[np.nanargmin(values)]))
+                picked.add(int(candidates[np.nanargmax(values)]))
+
+        for position in self._evenly_spaced(row_count, max(size - len(picked), 0)):
+            if len(picked) >= size:
+                break
+            picked.add(int(position))
+
+        return df.iloc[sorted(picked)]
+
+    @staticmethod
+    def _evenly_spaced(row_count: int, size: int) -> np.ndarray:
+        """
+        Positions of up to `size` rows spread evenly over the frame, starting
+        with the first row and ending with the last
+
+        Args:
+            row_count: Number of rows in the frame
+            size: Maximum number of positions
+
+        Returns:
+            np.ndarray: Unique sorted row positions
+        """
+        if row_count <= size:
+            return np.arange(row_count)
+        return np.unique(np.linspace(0, row_count - 1, size).astype(np.int64))
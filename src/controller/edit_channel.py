@@ -0,0 +1,133 @@
+"""
+Edit Channel module
+------------------
+Coalesces grid edits streamed over a session's WebSocket into history states
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class EditChannel:
+    """
+    Server side of one grid connection
+
+    The grid applies edits locally and streams them as
+        {"type": "edit", "seq": n, "version": v, "changes": [...]}
+    where changes use the /table_changes formats and v is the history
+    version the grid was last loaded from. Every edit is acknowledged at
+    once with {"type": "ack", "seq": n}. Edits arriving within the debounce
+    window (measured from the first pending edit) become a single history
+    state, answered with one {"type": "patch", "through": n, ...} carrying
+    only the edited cells' stored values. If the state was changed by
+    something else (a command, undo or another tab) the pending edits are
+    not applied and {"type": "resync"} tells the grid to reload.
+    """
+
+    def __init__(self, controller: Any, session_id: str, send: Callable[[Dict[str, Any]], Awaitable[None]],
+                 debounce: float = 0.3, max_pending: int = 10000):
+        """
+        Initialize the channel
+
+        Args:
+            controller: SpreadsheetController applying the edits
+            session_id: Session the connection belongs to
+            send: Coroutine sending a message to the grid
+            debounce: Seconds edits are collected before they are applied
+            max_pending: Pending changes that trigger an immediate flush
+        """
+        self.controller = controller
+        self.session_id = session_id
+        self.send = send
+        self.debounce = debounce
+        self.max_pending = max_pending
+        self.pending: List[Dict[str, Any]] = []
+        self.last_seq: Optional[int] = None
+        # Version the grid was loaded from, and the version after this channel's own states
+        self.base_version: Optional[int] = None
+        self.head_version: Optional[int] = None
+        self._timer: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    async def receive(self, message: Dict[str, Any]) -> None:
+        """
+        Handle a message from the grid
+
+        Args:
+            message: Decoded JSON message
+        """
+        message_type = message.get('type')
+        if message_type == 'edit':
+            await self._queue_edit(message)
+        elif message_type == 'flush':
+            await self.flush()
+        elif message_type == 'ping':
+            await self.send({'type': 'pong'})
+        else:
+            await self.send({'type': 'error', 'message': f"Unknown message type: {message_type}"})
+
+    async def _queue_edit(self, message: Dict[str, Any]) -> None:
+        """Queue an edit, acknowledge it and make sure a flush is scheduled"""
+        version = message.get('version')
+        if version != self.base_version:
+            # The grid was reloaded (command, undo, resync): continue from that state
+            await self.flush()
+            self.base_version = self.head_version = version
+
+        self.pending.extend(message.get('changes') or [])
+        self.last_seq = message.get('seq')
+        await self.send({'type': 'ack', 'seq': self.last_seq})
+
+        if len(self.pending) >= self.max_pending:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        """Flush once the debounce window has passed"""
+        try:
+            await asyncio.sleep(self.debounce)
+        except asyncio.CancelledError:
+            return
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logging.warning(f"EditChannel: flush failed for session {self.session_id}: {e}")
+
+    async def flush(self) -> None:
+        """Apply all pending edits as one history state and send the patch"""
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+        async with self._flush_lock:
+            if not self.pending:
+                return
+            changes, self.pending = self.pending, []
+            through = self.last_seq
+            try:
+                # Applying edits is CPU-bound pandas work; keep the event loop free
+                result = await asyncio.to_thread(
+                    self.controller.patch_table_changes, self.session_id, changes, self.head_version
+                )
+            except Exception as e:
+                await self.send({'type': 'error', 'through': through, 'message': str(e)})
+                return
+            if result['type'] == 'patch':
+                self.head_version = result['version']
+            result['through'] = through
+            await self.send(result)
+
+    async def close(self) -> None:
+        """Apply edits still pending when the connection ends"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self.pending:
+            return
+        changes, self.pending = self.pending, []
+        try:
+            await asyncio.to_thread(self.controller.patch_table_changes, self.session_id, changes, self.head_version)
+        except Exception as e:
+            logging.warning(f"EditChannel: could not apply final edits for session {self.session_id}: {e}")
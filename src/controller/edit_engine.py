@@ -0,0 +1,363 @@
+"""
+Edit Engine module
+------------------
+Applies batches of grid edits (cell values, row and column inserts and removals) to a DataFrame
+"""
+
+import warnings
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.model.modified_cells import ModifiedCells
+
+
+# Name given to inserted columns, followed by the first free number
+NEW_COLUMN_BASE = "New Column"
+
+# Cell text accepted in boolean columns, compared stripped and lower-cased
+BOOLEAN_WORDS = {'true': True, 't': True, 'yes': True, 'y': True, '1': True, '1.0': True,
+                 'false': False, 'f': False, 'no': False, 'n': False, '0': False, '0.0': False}
+
+
+def coerce_values(dtype: Any, values: np.ndarray) -> Tuple[Any, Any]:
+    """
+    Convert edited cell values to a column's dtype
+
+    Grid values arrive as strings or JSON primitives. They are parsed in one
+    vectorized pass for the column's kind of dtype, and the dtype is widened
+    only as far as the values require: an int64 column receiving a blank
+    becomes Int64 and one receiving 2.5 becomes float64, a category gains
+    the new categories, and only values the column's kind cannot represent
+    at all (text in a numeric or datetime column) make it object. Blank
+    text is a missing value in typed columns; object columns take the
+    values as sent.
+
+    Args:
+        dtype: The column's dtype
+        values: Object array of edited values
+
+    Returns:
+        Tuple[Any, Any]: The typed values and the dtype the column needs to hold them
+    """
+    if isinstance(dtype, np.dtype) and dtype == object:
+        return values, dtype
+
+    raw = pd.Series(values, dtype=object)
+    stripped = raw.astype(str).str.strip()
+    blank = (raw.isna() | (stripped == "")).to_numpy()
+    text = stripped.astype(object).where(~blank)
+
+    if isinstance(dtype, pd.CategoricalDtype):
+        return _coerce_categorical(dtype, values, blank)
+    if isinstance(dtype, pd.StringDtype):
+        return pd.array(raw.astype(str).astype(object).where(~blank).to_numpy(), dtype=dtype), dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return _coerce_boolean(dtype, stripped, blank, values)
+    if pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_float_dtype(dtype):
+        return _coerce_numeric(dtype, text, blank, values)
+    if pd.api.types.is_datetime64_any_dtype(dtype) or pd.api.types.is_timedelta64_dtype(dtype):
+        return _coerce_temporal(dtype, text, blank, values)
+    try:
+        return pd.array(text.to_numpy(), dtype=dtype), dtype
+    except (TypeError, ValueError):
+        return values, np.dtype(object)
+
+
+def _coerce_numeric(dtype: Any, text: pd.Series, blank: np.ndarray, values: np.ndarray) -> Tuple[Any, Any]:
+    """Parse numbers for an integer or float column"""
+    numbers = pd.to_numeric(text, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    if (~blank & np.isnan(numbers)).any():
+        return values, np.dtype(object)
+    extension = not isinstance(dtype, np.dtype)
+
+    if pd.api.types.is_float_dtype(dtype):
+        return pd.array(numbers, dtype=dtype) if extension else numbers.astype(dtype), dtype
+
+    present = numbers[~blank]
+    if not (np.isfinite(present) & (present == np.round(present))).all():
+        target = pd.Float64Dtype() if extension else np.dtype(np.float64)
+        return (pd.array(numbers, dtype=target) if extension else numbers), target
+
+    bounds = np.iinfo(dtype.numpy_dtype if extension else dtype)
+    target = dtype
+    if len(present) and (present.min() < bounds.min or present.max() > bounds.max):
+        target = pd.Int64Dtype() if extension else np.dtype(np.int64)
+        if present.min() < -2 ** 63 or present.max() >= 2 ** 63:
+            return numbers, np.dtype(np.float64)
+    if blank.any() and not extension:
+        # Only a nullable integer column holds a missing value without turning into floats
+        target = pd.Int64Dtype()
+    if isinstance(target, np.dtype):
+        return numbers.astype(target), target
+    return pd.array(numbers, dtype=target), target
+
+
+def _coerce_boolean(dtype: Any, stripped: pd.Series, blank: np.ndarray, values: np.ndarray) -> Tuple[Any, Any]:
+    """Parse true/false words for a boolean column"""
+    truth = stripped.str.lower().map(BOOLEAN_WORDS).astype(object).where(~blank)
+    if (~blank & truth.isna().to_numpy()).any():
+        return values, np.dtype(object)
+    if blank.any() or not isinstance(dtype, np.dtype):
+        target = dtype if not isinstance(dtype, np.dtype) else pd.BooleanDtype()
+        return pd.array(truth.to_numpy(), dtype=target), target
+    return truth.to_numpy(dtype=bool), dtype
+
+
+def _coerce_temporal(dtype: Any, text: pd.Series, blank: np.ndarray, values: np.ndarray) -> Tuple[Any, Any]:
+    """Parse datetimes or durations for a datetime64 or timedelta64 column"""
+    try:
+        if pd.api.types.is_timedelta64_dtype(dtype):
+            parsed = pd.to_timedelta(text, errors='coerce')
+        else:
+            with warnings.catch_warnings():
+                # Raised when no single format fits the values; they are then parsed one by one anyway
+                warnings.simplefilter('ignore', UserWarning)
+                parsed = pd.to_datetime(text, errors='coerce')
+                # The format is inferred from the first value; parse stragglers one by one
+                retry = ~blank & parsed.isna().to_numpy()
+                if retry.any():
+                    parsed = parsed.where(~retry, pd.to_datetime(text.where(retry), errors='coerce', format='mixed'))
+            tz = getattr(dtype, 'tz', None)
+            if not pd.api.types.is_datetime64_any_dtype(parsed.dtype):
+                # Values with different UTC offsets only share a dtype in a tz-aware column
+                if tz is None:
+                    return values, np.dtype(object)
+                parsed = pd.to_datetime(text, errors='coerce', utc=True, format='mixed')
+            if parsed.dt.tz is None and tz is not None:
+                parsed = parsed.dt.tz_localize(tz)
+            elif parsed.dt.tz is not None:
+                if tz is None:
+                    return values, np.dtype(object)
+                parsed = parsed.dt.tz_convert(tz)
+        if (~blank & parsed.isna().to_numpy()).any():
+            return values, np.dtype(object)
+        return parsed.astype(dtype).array, dtype
+    except (TypeError, ValueError, OverflowError):
+        return values, np.dtype(object)
+
+
+def _coerce_categorical(dtype: pd.CategoricalDtype, values: np.ndarray, blank: np.ndarray) -> Tuple[Any, Any]:
+    """Parse values for the categories' dtype and add categories for new values"""
+    categories = dtype.categories
+    typed, category_dtype = coerce_values(categories.dtype, values)
+    if category_dtype != categories.dtype:
+        categories = categories.astype(category_dtype)
+    present = pd.Index(typed)[~blank].unique()
+    new = present[~present.isin(categories)]
+    if len(new):
+        dtype = pd.CategoricalDtype(categories.append(new), ordered=dtype.ordered)
+    return typed, dtype
+
+
+class EditEngine:
+    """
+    Applies the changes sent by the grid in one vectorized pass per step
+
+    Consecutive cell edits are merged, de-duplicated (the last edit of a
+    cell wins) and written column by column with array indexers, so a large
+    clipboard paste costs one assignment per column. Each row or column
+    insert or removal is a single reindex or concat, however many rows or
+    columns it covers. Positions in later changes refer to the layout after
+    the earlier ones, as in the grid.
+
+    Change formats:
+        {"type": "cells", "rows": [...], "cols": [...], "values": [...]}
+            parallel arrays, one entry per edited cell
+        {"type": "cell", "changes": [{"row", "col", "newValue", ...}, ...]}
+            the original per-cell format, still accepted
+        {"type": "row" | "col", "action": "create" | "remove", "index": i, "amount": n}
+    """
+
+    def apply(self, df: pd.DataFrame,
+              changes: Iterable[Dict[str, Any]]) -> Tuple[pd.DataFrame, ModifiedCells, List[Dict[str, Any]]]:
+        """
+        Apply a batch of changes
+
+        Args:
+            df: The current sheet (not modified)
+            changes: Change dicts in the order the user made them
+
+        Returns:
+            Tuple[pd.DataFrame, ModifiedCells, List[Dict[str, Any]]]: The new
+            sheet (with a fresh RangeIndex), the cells whose values were
+            edited at their final positions, and the columns whose dtype had
+            to change as {"column", "position", "from", "to"}
+        """
+        # Shallow copy: copy-on-write copies only the columns that get edited
+        df = df.copy(deep=False).reset_index(drop=True)
+        # Per column, a mask of edited rows (None while nothing in the column was edited)
+        marks: List[Optional[np.ndarray]] = [None] * len(df.columns)
+        # Per column, its dtype before the batch (None for inserted columns); moves with marks
+        origins: List[Any] = list(df.dtypes)
+
+        pending: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        for change in changes:
+            change_type = change.get('type')
+            if change_type in ('cells', 'cell'):
+                pending.append(self._cell_arrays(change))
+                continue
+            if pending:
+                df = self._apply_cells(df, pending, marks)
+                pending = []
+            if change_type == 'row':
+                df = self._apply_rows(df, change, marks)
+            elif change_type == 'col':
+                df = self._apply_columns(df, change, marks, origins)
+        if pending:
+            df = self._apply_cells(df, pending, marks)
+
+        row_count = len(df.index)
+        masks = [np.zeros(row_count, dtype=bool) if mask is None else mask for mask in marks]
+        dtype_changes = [
+            {'column': str(df.columns[position]), 'position': position, 'from': str(before), 'to': str(after)}
+            for position, (before, after) in enumerate(zip(origins, df.dtypes))
+            if before is not None and str(before) != str(after)
+        ]
+        return df, ModifiedCells(row_count, masks), dtype_changes
+
+    def _cell_arrays(self, change: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Rows, columns and values of a cell change in either format"""
+        if change.get('type') == 'cells':
+            rows, cols, values = change.get('rows', []), change.get('cols', []), change.get('values', [])
+            if not len(rows) == len(cols) == len(values):
+                raise ValueError("Cell change arrays 'rows', 'cols' and 'values' must have the same length")
+        else:
+            cells = change.get('changes', [])
+            rows = [cell['row'] for cell in cells]
+            cols = [cell['col'] for cell in cells]
+            values = [cell.get('newValue') for cell in cells]
+        value_array = np.empty(len(values), dtype=object)
+        value_array[:] = values
+        return np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64), value_array
+
+    def _apply_cells(self, df: pd.DataFrame, pending: List[Tuple[np.ndarray, np.ndarray, np.ndarray]],
+                     marks: List[Optional[np.ndarray]]) -> pd.DataFrame:
+        """Write a run of cell edits, one assignment per column"""
+        rows = np.concatenate([batch[0] for batch in pending])
+        cols = np.concatenate([batch[1] for batch in pending])
+        values = np.concatenate([batch[2] for batch in pending])
+
+        row_count, column_count = df.shape
+        in_range = (rows >= 0) & (rows < row_count) & (cols >= 0) & (cols < column_count)
+        rows, cols, values = rows[in_range], cols[in_range], values[in_range]
+        if not len(rows):
+            return df
+
+        # Keep the last edit of each cell; sort by column, then row
+        keys = cols * row_count + rows
+        _, last = np.unique(keys[::-1], return_index=True)
+        last = len(keys) - 1 - last
+        rows, cols, values = rows[last], cols[last], values[last]
+
+        starts = np.flatnonzero(np.r_[True, cols[1:] != cols[:-1]])
+        ends = np.r_[starts[1:], len(cols)]
+        for start, end in zip(starts, ends):
+            col = int(cols[start])
+            column = df.iloc[:, col]
+            col_rows, col_values = rows[start:end], values[start:end]
+
+            # Compare in the column's dtype so "5" over 5 is not an edit
+            typed, dtype = coerce_values(column.dtype, col_values)
+            changed = self._changed(column.iloc[col_rows].to_numpy(dtype=object), np.asarray(typed, dtype=object))
+            if not changed.any():
+                continue
+            if not changed.all():
+                # Only the values actually written decide how far the dtype widens
+                col_rows, col_values = col_rows[changed], col_values[changed]
+                typed, dtype = coerce_values(column.dtype, col_values)
+
+            df.isetitem(col, self._write(column, col_rows, col_values, typed, dtype))
+            if marks[col] is None:
+                marks[col] = np.zeros(row_count, dtype=bool)
+            marks[col][col_rows] = True
+        return df
+
+    @staticmethod
+    def _changed(current: np.ndarray, new: np.ndarray) -> np.ndarray:
+        """Mask of edits that change the cell; blanking an empty cell is not a change"""
+        current_missing = pd.isna(current)
+        new_missing = pd.isna(new)
+        new_blank = new_missing.copy()
+        new_blank[~new_missing] = np.asarray(new[~new_missing] == "", dtype=bool)
+        present = ~current_missing & ~new_missing
+        equal = np.zeros(len(current), dtype=bool)
+        if present.any():
+            equal[present] = np.asarray(current[present] == new[present], dtype=bool)
+        return ~((current_missing & new_blank) | equal)
+
+    @staticmethod
+    def _write(column: pd.Series, rows: np.ndarray, values: np.ndarray, typed: Any, dtype: Any) -> pd.Series:
+        """Copy of a column, widened to dtype if needed, with typed values written at row positions"""
+        try:
+            updated = column.copy() if dtype == column.dtype else column.astype(dtype)
+            updated.iloc[rows] = typed
+        except (TypeError, ValueError):
+            # Values the dtype cannot hold after all: store the column as objects
+            updated = column.astype(object)
+            updated.iloc[rows] = values
+        return updated
+
+    def _apply_rows(self, df: pd.DataFrame, change: Dict[str, Any],
+                    marks: List[Optional[np.ndarray]]) -> pd.DataFrame:
+        """Insert or remove a run of rows with one reindex"""
+        row_count = len(df.index)
+        index = min(max(int(change.get('index') or 0), 0), row_count)
+        amount = max(int(change.get('amount', 1)), 0)
+        action = change.get('action')
+
+        if action == 'create' and amount:
+            # Empty rows are missing values, which int and bool columns hold only as nullable dtypes
+            for position, dtype in enumerate(df.dtypes):
+                if isinstance(dtype, np.dtype) and dtype.kind in 'iub':
+                    df.isetitem(position, df.iloc[:, position].astype('boolean' if dtype.kind == 'b' else 'Int64'))
+            # Label -1 does not exist, so reindexing fills the new rows with missing values
+            labels = np.concatenate((np.arange(index), np.full(amount, -1), np.arange(index, row_count)))
+            df = df.reindex(labels).reset_index(drop=True)
+            for col, mask in enumerate(marks):
+                if mask is not None:
+                    marks[col] = np.insert(mask, index, np.zeros(amount, dtype=bool))
+        elif action == 'remove' and amount:
+            keep = np.ones(row_count, dtype=bool)
+            keep[index:index + amount] = False
+            df = df.iloc[keep].reset_index(drop=True)
+            for col, mask in enumerate(marks):
+                if mask is not None:
+                    marks[col] = mask[keep]
+        return df
+
+    def _apply_columns(self, df: pd.DataFrame, change: Dict[str, Any],
+                       marks: List[Optional[np.ndarray]], origins: List[Any]) -> pd.DataFrame:
+        """Insert or remove a run of columns with one concat or selection"""
+        column_count = len(df.columns)
+        index = min(max(int(change.get('index') or 0), 0), column_count)
+        amount = max(int(change.get('amount', 1)), 0)
+        action = change.get('action')
+
+        if action == 'create' and amount:
+            names = self._new_column_names(df.columns, amount)
+            empty = pd.DataFrame({name: pd.Series(None, index=df.index, dtype=object) for name in names})
+            df = pd.concat([df.iloc[:, :index], empty, df.iloc[:, index:]], axis=1)
+            marks[index:index] = [None] * amount
+            origins[index:index] = [None] * amount
+        elif action == 'remove' and amount:
+            keep = np.ones(column_count, dtype=bool)
+            keep[index:index + amount] = False
+            df = df.iloc[:, keep]
+            del marks[index:index + amount]
+            del origins[index:index + amount]
+        return df
+
+    @staticmethod
+    def _new_column_names(columns: pd.Index, amount: int) -> List[str]:
+        """Unused names 'New Column 1', 'New Column 2', ..."""
+        taken = set(columns)
+        names = []
+        number = 1
+        while len(names) < amount:
+            name = f"{NEW_COLUMN_BASE} {number}"
+            if name not in taken:
+                names.append(name)
+            number += 1
+        return names
@@ -0,0 +1,353 @@
+"""
+Execution Pool module
+------------------
+Runs generated scripts on pre-warmed worker processes with timeouts, memory caps and cancellation
+
+DataFrames cross the process boundary through shared memory (see shared_frame):
+workers map the input columns read-only, copy-on-write copies only the columns
+a script modifies, and only those columns are sent back.
+"""
+
+import os
+import time
+import queue
+import pickle
+import signal
+import threading
+import multiprocessing
+from typing import Optional, Any, Tuple
+
+import pandas as pd
+
+from src.controller.shared_frame import publish_frame, load_frame, discard_frame
+from src.controller.script_sandbox import script_digest
+
+
+class ScriptExecutionError(RuntimeError):
+    """
+    Raised when a script fails inside a worker
+
+    Attributes:
+        error_type: Name of the exception class raised by the script
+        details: Failing script line and exception message
+    """
+
+    def __init__(self, message: str, error_type: str = 'RuntimeError', details: Optional[str] = None):
+        super().__init__(message)
+        self.error_type = error_type
+        self.details = details or message
+
+
+class ScriptTimeoutError(ScriptExecutionError):
+    """
+    Raised when a script exceeds its wall-clock timeout
+    """
+
+
+class ScriptCancelledError(ScriptExecutionError):
+    """
+    Raised when a script is cancelled by the caller
+    """
+
+
+class _ScriptInterrupted(BaseException):
+    """Raised inside a worker when the parent asks the running script to stop"""
+
+
+def _worker_main(conn, memory_limit_mb: int, min_shared_bytes: int, code_cache_size: int = 64) -> None:
+    """
+    Worker process loop: receive (script, frame) tasks and send back results
+
+    Args:
+        conn: Duplex pipe to the parent
+        memory_limit_mb: Address space cap for the worker (0 disables it)
+        min_shared_bytes: Results smaller than this are sent inline
+        code_cache_size: Number of compiled scripts kept, keyed by script hash
+    """
+    # Pre-warm: pay the pandas/numpy import cost once per worker, not per script
+    import numpy  # noqa: F401
+    from collections import OrderedDict
+    from src.controller.script_sandbox import run_script, format_script_error, enable_copy_on_write, SCRIPT_FILENAME
+    from src.controller.shared_frame import attach_frame, column_arrays, release_segment
+
+    # Input columns are read-only shared memory; scripts get copies only of what they modify
+    enable_copy_on_write()
+
+    if memory_limit_mb > 0:
+        try:
+            import resource
+            limit = memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            # Not supported on this platform
+            pass
+
+    running = threading.Event()
+
+    def interrupt(signum, frame):
+        # Only interrupt script code, never the message loop itself
+        if running.is_set():
+            raise _ScriptInterrupted()
+
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, interrupt)
+    # The parent handles Ctrl+C; workers are stopped through the pipe
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Repeated scripts are compiled once per worker
+    compiled: "OrderedDict[str, Any]" = OrderedDict()
+
+    while True:
+        try:
+            message = conn.recv_bytes()
+        except (EOFError, OSError):
+            break
+        if not message:
+            break
+
+        digest, script, meta = pickle.loads(message)
+        df, segment = attach_frame(meta)
+        result_segment = None
+        try:
+            code = compiled.get(digest)
+            if code is None:
+                code = compile(script, SCRIPT_FILENAME, 'exec')
+                compiled[digest] = code
+                if len(compiled) > code_cache_size:
+                    compiled.popitem(last=False)
+            else:
+                compiled.move_to_end(digest)
+            running.set()
+            try:
+                # The sandbox gets a shallow copy; df keeps the shared buffers referenced
+                result = run_script(code, df, deep_copy=False)
+            finally:
+                running.clear()
+            result_meta, result_segment = publish_frame(result, min_shared_bytes, column_arrays(df))
+            del result
+            reply = ('ok', result_meta)
+        except _ScriptInterrupted:
+            reply = ('cancelled', None)
+        except MemoryError:
+            reply = ('error', ('MemoryError', f"Script exceeded the worker memory limit of {memory_limit_mb} MB", None))
+        except Exception as e:
+            reply = ('error', (type(e).__name__, str(e), format_script_error(script)))
+        del df, meta
+
+        try:
+            conn.send_bytes(pickle.dumps(reply, protocol=pickle.HIGHEST_PROTOCOL))
+        except MemoryError:
+            conn.send_bytes(pickle.dumps(('error', ('MemoryError', "Script result exceeded the worker memory limit", None))))
+        del reply
+
+        # The parent unlinks both segments; the worker only drops its mappings
+        if result_segment is not None:
+            release_segment(result_segment)
+        if segment is not None:
+            release_segment(segment)
+
+
+class _Worker:
+    """A worker process and the parent's end of its pipe"""
+
+    def __init__(self, context, memory_limit_mb: int, min_shared_bytes: int):
+        self.conn, child_conn = context.Pipe(duplex=True)
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_limit_mb, min_shared_bytes),
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop(self) -> None:
+        """Terminate the worker process"""
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(timeout=5)
+
+
+class ScriptExecutionPool:
+    """
+    Pool of worker processes that execute generated scripts
+
+    Scripts run outside the API process so a long loop cannot hold the
+    server's GIL and a crash or memory blow-up only takes down one worker,
+    which is replaced.
+    """
+
+    def __init__(self, size: int = 2, timeout: float = 120.0, memory_limit_mb: int = 0, cancel_grace: float = 2.0,
+                 min_shared_bytes: int = 1 << 20):
+        """
+        Initialize the pool and start its workers
+
+        Args:
+            size: Number of worker processes
+            timeout: Default wall-clock timeout per script in seconds
+            memory_limit_mb: Address space cap per worker (0 disables it)
+            cancel_grace: Seconds a script gets to stop after a cooperative
+                interrupt before its worker is killed
+            min_shared_bytes: Frames with less numeric data than this are
+                pickled instead of placed in shared memory
+        """
+        self.size = max(size, 1)
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.cancel_grace = cancel_grace
+        self.min_shared_bytes = min_shared_bytes
+        self.context = multiprocessing.get_context('spawn')
+        self.idle: "queue.Queue[_Worker]" = queue.Queue()
+        self.closed = False
+        # Orders returning workers against shutdown, so none is queued after it drains
+        self.lock = threading.Lock()
+        for _ in range(self.size):
+            self.idle.put(self._start_worker())
+
+    def run(self, script: str, df: pd.DataFrame, timeout: Optional[float] = None,
+            cancel_event: Optional[threading.Event] = None, digest: Optional[str] = None) -> pd.DataFrame:
+        """
+        Execute a script against a DataFrame on a worker
+
+        Args:
+            script: The Python script to run
+            df: The DataFrame exposed to the script as 'df'
+            timeout: Wall-clock timeout in seconds (defaults to the pool timeout)
+            cancel_event: Event that cancels the script when set
+            digest: SHA-256 of the script, the key of the workers' code caches
+                (computed when not given)
+
+        Returns:
+            pd.DataFrame: The value of 'df' after the script ran
+
+        Raises:
+            ScriptExecutionError: If the script raised or its worker died
+            ScriptTimeoutError: If the script ran past the timeout
+            ScriptCancelledError: If cancel_event was set
+        """
+        if self.closed:
+            raise ScriptExecutionError("Script execution pool is shut down")
+
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        try:
+            worker = self.idle.get(timeout=timeout)
+        except queue.Empty:
+            raise ScriptTimeoutError(f"No script worker became available within {timeout:.0f} seconds", 'TimeoutError')
+
+        healthy = True
+        meta, segment = publish_frame(df, self.min_shared_bytes)
+        try:
+            digest = digest or script_digest(script)
+            worker.conn.send_bytes(pickle.dumps((digest, script, meta), protocol=pickle.HIGHEST_PROTOCOL))
+            status, payload = self._wait_for_reply(worker, deadline, cancel_event)
+        except ScriptExecutionError as e:
+            healthy = not isinstance(e, (ScriptTimeoutError, ScriptCancelledError)) or worker.process.is_alive()
+            raise
+        except (EOFError, OSError, BrokenPipeError):
+            healthy = False
+            raise ScriptExecutionError("Script worker crashed (possibly out of memory)", 'WorkerCrashed')
+        finally:
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+            self._release(worker, healthy and worker.process.is_alive())
+
+        if status == 'ok':
+            # Unchanged columns are taken from df itself; changed ones are copied out once
+            return load_frame(payload, df)
+        if status == 'cancelled':
+            raise ScriptCancelledError("Script was cancelled", 'Cancelled')
+        error_type, message, details = payload
+        raise ScriptExecutionError(message, error_type, details)
+
+    def _wait_for_reply(self, worker: _Worker, deadline: float,
+                        cancel_event: Optional[threading.Event]) -> Tuple[str, Any]:
+        """
+        Wait for a worker's reply, interrupting it on timeout or cancellation
+
+        Args:
+            worker: The busy worker
+            deadline: Monotonic time at which the script times out
+            cancel_event: Optional cancellation event
+
+        Returns:
+            Tuple[str, Any]: Reply status and payload
+        """
+        while True:
+            if worker.conn.poll(min(max(deadline - time.monotonic(), 0), 0.1)):
+                return pickle.loads(worker.conn.recv_bytes())
+
+            if not worker.process.is_alive():
+                raise EOFError("worker exited")
+
+            if cancel_event is not None and cancel_event.is_set():
+                self._interrupt(worker)
+                raise ScriptCancelledError("Script was cancelled", 'Cancelled')
+
+            if time.monotonic() >= deadline:
+                self._interrupt(worker)
+                raise ScriptTimeoutError("Script execution timed out", 'TimeoutError')
+
+    def _interrupt(self, worker: _Worker) -> None:
+        """
+        Stop the script running on a worker
+
+        Sends a cooperative interrupt first; if the worker does not reply within
+        the grace period (e.g. stuck inside a C extension) it is killed.
+
+        Args:
+            worker: The busy worker
+        """
+        if hasattr(signal, 'SIGUSR1') and worker.process.is_alive():
+            os.kill(worker.process.pid, signal.SIGUSR1)
+            if worker.conn.poll(self.cancel_grace):
+                # Discard the reply (cancelled, or a result that raced the interrupt)
+                status, payload = pickle.loads(worker.conn.recv_bytes())
+                if status == 'ok':
+                    discard_frame(payload)
+                return
+        worker.stop()
+
+    def _release(self, worker: _Worker, healthy: bool) -> None:
+        """
+        Return a worker after a script, replacing it if it is broken
+
+        After shutdown the worker is stopped instead of queued.
+
+        Args:
+            worker: The worker that ran the script
+            healthy: Whether it can run another script
+        """
+        if not healthy:
+            worker.stop()
+        with self.lock:
+            if not self.closed:
+                self.idle.put(worker if healthy else self._start_worker())
+                return
+        if healthy:
+            self._close(worker)
+
+    @staticmethod
+    def _close(worker: _Worker) -> None:
+        """Ask an idle worker to exit, then stop it"""
+        try:
+            worker.conn.send_bytes(b'')
+        except OSError:
+            pass
+        worker.stop()
+
+    def _start_worker(self) -> _Worker:
+        """Start a worker process"""
+        return _Worker(self.context, self.memory_limit_mb, self.min_shared_bytes)
+
+    def shutdown(self) -> None:
+        """Stop all idle workers; busy ones are stopped when they are returned"""
+        with self.lock:
+            self.closed = True
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close(worker)
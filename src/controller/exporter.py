@@ -0,0 +1,380 @@
+"""
+Exporter module
+------------------
+Streams spreadsheet downloads (XLSX, CSV, Parquet, Feather, JSON Lines) and
+caches them per history state version
+"""
+
+import importlib
+import io
+import queue
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+
+# Media types of the export formats
+MEDIA_TYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv; charset=utf-8',
+    'csv.gz': 'application/gzip',
+    'csv.zst': 'application/zstd',
+    'parquet': 'application/vnd.apache.parquet',
+    'feather': 'application/vnd.apache.arrow.file',
+    'jsonl': 'application/jsonl',
+}
+
+# Optional packages needed to write a format
+FORMAT_PACKAGES = {'xlsx': 'xlsxwriter', 'parquet': 'pyarrow', 'feather': 'pyarrow', 'csv.zst': 'zstandard'}
+
+# Ends a producer's output
+_DONE = object()
+
+
+class ExportAborted(Exception):
+    """Raised in a producer thread when the download was abandoned"""
+
+
+class _QueueWriter(io.RawIOBase):
+    """Write-only, unseekable file object handing buffered bytes to a consumer queue"""
+
+    def __init__(self, chunks: "queue.Queue[Any]", abort: threading.Event, buffer_size: int):
+        super().__init__()
+        self.chunks = chunks
+        self.abort = abort
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        self.buffer += data
+        if len(self.buffer) >= self.buffer_size:
+            self.push()
+        return len(data)
+
+    def push(self) -> None:
+        """Hand the buffered bytes to the consumer, waiting while it is behind"""
+        if not self.buffer:
+            return
+        chunk, self.buffer = bytes(self.buffer), bytearray()
+        while True:
+            if self.abort.is_set():
+                raise ExportAborted()
+            try:
+                self.chunks.put(chunk, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+
+class SpreadsheetExporter:
+    """
+    Produces download files as a stream of byte chunks
+
+    CSV and JSON Lines are written in row chunks; compressed CSV passes the
+    chunks through an incremental gzip or zstd compressor. XLSX is written
+    by xlsxwriter in constant_memory mode, Parquet as one row group and
+    Feather (Arrow IPC file format) as one record batch per row chunk. Those
+    writers run on a producer thread and their output goes straight into
+    the response stream through a bounded queue. Nothing is written to the
+    downloads directory.
+
+    A completed export is kept in an LRU cache keyed by session, history
+    version and format (up to a total size), so downloading an unchanged
+    state again streams the cached bytes.
+    """
+
+    def __init__(self, chunk_rows: int = 50000, cache_bytes: int = 256 * 1024 * 1024,
+                 stream_chunk_bytes: int = 256 * 1024):
+        """
+        Initialize the exporter
+
+        Args:
+            chunk_rows: Rows converted per step (and per Parquet row group)
+            cache_bytes: Total size of cached exports (0 disables the cache)
+            stream_chunk_bytes: Approximate size of the chunks streamed to the client
+        """
+        self.chunk_rows = chunk_rows
+        self.cache_bytes = cache_bytes
+        self.stream_chunk_bytes = stream_chunk_bytes
+        self.cache: "OrderedDict[Tuple[Hashable, int, str], bytes]" = OrderedDict()
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def export(self, session_id: str, version: int, df: pd.DataFrame, fmt: str) -> Tuple[Iterator[bytes], Optional[int]]:
+        """
+        Export a sheet
+
+        Problems found before streaming starts (a missing optional package,
+        duplicate column names in a format that needs unique ones) raise
+        here rather than breaking the download halfway.
+
+        Args:
+            session_id: Session the sheet belongs to
+            version: History version of the sheet
+            df: The sheet
+            fmt: One of MEDIA_TYPES
+
+        Returns:
+            Tuple[Iterator[bytes], Optional[int]]: The file's chunks and its
+            size if known in advance (cached exports)
+
+        Raises:
+            ValueError: If the format is unsupported or cannot hold the sheet
+        """
+        if fmt not in MEDIA_TYPES:
+            raise ValueError(f"Unsupported format: {fmt}")
+        key = (session_id, version, fmt)
+        with self._lock:
+            content = self.cache.get(key)
+            if content is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self._slices(content), len(content)
+            self.misses += 1
+
+        package = FORMAT_PACKAGES.get(fmt)
+        if package:
+            try:
+                importlib.import_module(package)
+            except ImportError:
+                raise ValueError(f"Exporting {fmt} requires the '{package}' package")
+        if fmt in ('parquet', 'feather', 'jsonl') and not df.columns.is_unique:
+            raise ValueError(f"Exporting {fmt} requires unique column names")
+
+        if fmt == 'xlsx':
+            chunks = self._stream_xlsx(df)
+        elif fmt == 'csv':
+            chunks = self._stream_csv(df)
+        elif fmt == 'csv.gz':
+            # wbits 31: zlib stream with a gzip header and trailer
+            chunks = self._compressed(self._stream_csv(df), zlib.compressobj(6, zlib.DEFLATED, 31))
+        elif fmt == 'csv.zst':
+            import zstandard
+            chunks = self._compressed(self._stream_csv(df), zstandard.ZstdCompressor(level=3).compressobj())
+        elif fmt == 'jsonl':
+            chunks = self._stream_jsonl(df)
+        else:
+            frame, schema = self._arrow_frame(df)
+            chunks = self._stream_parquet(frame, schema) if fmt == 'parquet' else self._stream_feather(frame, schema)
+        return self._caching(key, chunks), None
+
+    def discard(self, session_id: str) -> None:
+        """
+        Drop a session's cached exports
+
+        Args:
+            session_id: Session ID
+        """
+        with self._lock:
+            for key in [key for key in self.cache if key[0] == session_id]:
+                self.cached_bytes -= len(self.cache.pop(key))
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get cache counters
+
+        Returns:
+            Dict[str, int]: Entries, bytes, hits and misses
+        """
+        with self._lock:
+            return {'entries': len(self.cache), 'bytes': self.cached_bytes, 'hits': self.hits, 'misses': self.misses}
+
+    def _slices(self, content: bytes) -> Iterator[bytes]:
+        """Stream cached content in chunks"""
+        view = memoryview(content)
+        for start in range(0, len(content), self.stream_chunk_bytes):
+            yield bytes(view[start:start + self.stream_chunk_bytes])
+
+    def _caching(self, key: Tuple[Hashable, int, str], chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Pass chunks through and cache the whole file once it completed"""
+        parts: Optional[List[bytes]] = []
+        size = 0
+        for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                parts = parts if size <= self.cache_bytes else None
+                if parts is not None:
+                    parts.append(chunk)
+            yield chunk
+        if parts is None:
+            return
+
+        content = b''.join(parts)
+        with self._lock:
+            if key not in self.cache:
+                self.cache[key] = content
+                self.cached_bytes += len(content)
+            while self.cached_bytes > self.cache_bytes and self.cache:
+                _, evicted = self.cache.popitem(last=False)
+                self.cached_bytes -= len(evicted)
+
+    def _stream_csv(self, df: pd.DataFrame) -> Iterator[bytes]:
+        """CSV text in row chunks"""
+        if len(df.index) == 0:
+            yield df.to_csv(index=False).encode('utf-8')
+            return
+        for start in range(0, len(df.index), self.chunk_rows):
+            chunk = df.iloc[start:start + self.chunk_rows]
+            yield chunk.to_csv(index=False, header=start == 0).encode('utf-8')
+
+    def _stream_jsonl(self, df: pd.DataFrame) -> Iterator[bytes]:
+        """One JSON object per row, in row chunks"""
+        for start in range(0, len(df.index), self.chunk_rows):
+            chunk = df.iloc[start:start + self.chunk_rows]
+            text = chunk.to_json(orient='records', lines=True, date_format='iso', force_ascii=False)
+            yield (text if text.endswith('\n') else text + '\n').encode('utf-8')
+
+    @staticmethod
+    def _compressed(chunks: Iterator[bytes], compressor: Any) -> Iterator[bytes]:
+        """Pass chunks through an incremental compressor"""
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    @staticmethod
+    def _arrow_frame(df: pd.DataFrame) -> Tuple[pd.DataFrame, Any]:
+        """
+        Prepare a sheet for Arrow
+
+        Object columns holding values of mixed types (e.g. numbers typed into
+        a text column) have no Arrow type and are written as text. Column
+        names become strings.
+
+        Returns:
+            Tuple[pd.DataFrame, pa.Schema]: The prepared sheet and its schema
+        """
+        import pyarrow as pa
+
+        frame = df.copy(deep=False)
+        frame.columns = [str(column) for column in df.columns]
+        for position in range(frame.shape[1]):
+            column = frame.iloc[:, position]
+            if column.dtype == object and pd.api.types.infer_dtype(column, skipna=True).startswith('mixed'):
+                frame.isetitem(position, column.where(column.isna(), column.astype(str)))
+        try:
+            schema = pa.Schema.from_pandas(frame, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # Values Arrow cannot convert at all: write every object column as text
+            for position in range(frame.shape[1]):
+                column = frame.iloc[:, position]
+                if column.dtype == object:
+                    frame.isetitem(position, column.where(column.isna(), column.astype(str)))
+            schema = pa.Schema.from_pandas(frame, preserve_index=False)
+        return frame, schema
+
+    def _arrow_tables(self, frame: pd.DataFrame, schema: Any, abort: threading.Event) -> Iterator[Any]:
+        """Arrow tables of chunk_rows rows"""
+        import pyarrow as pa
+
+        for start in range(0, max(len(frame.index), 1), self.chunk_rows):
+            if abort.is_set():
+                raise ExportAborted()
+            chunk = frame.iloc[start:start + self.chunk_rows]
+            yield pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+
+    def _stream_parquet(self, frame: pd.DataFrame, schema: Any) -> Iterator[bytes]:
+        """Parquet bytes, one row group per row chunk"""
+        import pyarrow.parquet as pq
+
+        def write(sink: _QueueWriter, abort: threading.Event) -> None:
+            with pq.ParquetWriter(sink, schema, compression='snappy') as parquet:
+                for table in self._arrow_tables(frame, schema, abort):
+                    parquet.write_table(table, row_group_size=self.chunk_rows)
+
+        return self._produce('parquet-export', write)
+
+    def _stream_feather(self, frame: pd.DataFrame, schema: Any) -> Iterator[bytes]:
+        """Feather v2 (Arrow IPC file format) bytes, one record batch per row chunk"""
+        import pyarrow as pa
+
+        compression = 'lz4' if pa.Codec.is_available('lz4') else None
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+
+        def write(sink: _QueueWriter, abort: threading.Event) -> None:
+            with pa.ipc.new_file(sink, schema, options=options) as feather:
+                for table in self._arrow_tables(frame, schema, abort):
+                    feather.write_table(table)
+
+        return self._produce('feather-export', write)
+
+    def _stream_xlsx(self, df: pd.DataFrame) -> Iterator[bytes]:
+        """XLSX bytes produced by xlsxwriter"""
+        import xlsxwriter
+
+        def write(sink: _QueueWriter, abort: threading.Event) -> None:
+            workbook = xlsxwriter.Workbook(sink, {
+                'constant_memory': True,
+                'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+                'nan_inf_to_errors': True,
+                'remove_timezone': True,
+            })
+            worksheet = workbook.add_worksheet()
+            worksheet.write_row(0, 0, [str(column) for column in df.columns])
+            row = 1
+            for start in range(0, len(df.index), self.chunk_rows):
+                values = df.iloc[start:start + self.chunk_rows].to_numpy(dtype=object, copy=True)
+                # Missing values (including NaT, which is a datetime) become empty cells
+                values[pd.isna(values)] = None
+                for record in values:
+                    try:
+                        worksheet.write_row(row, 0, record)
+                    except TypeError:
+                        self._write_cells(worksheet, row, record)
+                    row += 1
+                if abort.is_set():
+                    raise ExportAborted()
+            workbook.close()
+
+        return self._produce('xlsx-export', write)
+
+    def _produce(self, name: str, write: Callable[[_QueueWriter, threading.Event], None]) -> Iterator[bytes]:
+        """Run a file writer on a background thread and stream what it writes"""
+        chunks: "queue.Queue[Any]" = queue.Queue(maxsize=8)
+        abort = threading.Event()
+
+        def produce() -> None:
+            sink = _QueueWriter(chunks, abort, self.stream_chunk_bytes)
+            try:
+                write(sink, abort)
+                sink.push()
+                chunks.put(_DONE)
+            except ExportAborted:
+                pass
+            except BaseException as e:
+                try:
+                    chunks.put(e, timeout=5)
+                except queue.Full:
+                    pass
+
+        producer = threading.Thread(target=produce, name=name, daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = chunks.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Stops the producer if the download was abandoned
+            abort.set()
+
+    @staticmethod
+    def _write_cells(worksheet: Any, row: int, record: Any) -> None:
+        """Write a row cell by cell, as text where xlsxwriter has no cell type for a value"""
+        for col, value in enumerate(record):
+            try:
+                worksheet.write(row, col, value)
+            except TypeError:
+                worksheet.write_string(row, col, str(value))
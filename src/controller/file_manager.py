@@ -5,10 +5,12 @@ Handles file operations for uploads and downloads
 """
 
 import os
+import shutil
 import uuid
 from werkzeug.utils import secure_filename
 from typing import Optional, Any
 from werkzeug.datastructures import FileStorage
+from src.model.spreadsheet_parser import SpreadsheetParser, FILE_FORMATS
 
 
 class FileManager:
@@ -35,7 +37,7 @@ class FileManager:
         os.makedirs(self.download_dir, exist_ok=True)
         os.makedirs(self.json_dir, exist_ok=True)
         
-        self.allowed_extensions = {'xlsx', 'xls', 'csv'}
+        self.allowed_extensions = set(FILE_FORMATS)
     
     def save_uploaded_file(self, file, file_id: Optional[str] = None) -> str:
         """
@@ -56,7 +58,7 @@ class FileManager:
         
         # Validate file
         if filename is None or not self.validate_file_type(filename):
-            raise ValueError(f"Unsupported file format. Supported formats: {', '.join(self.allowed_extensions)}")
+            raise ValueError(f"Unsupported file format. Supported formats: {', '.join(sorted(self.allowed_extensions))}")
         
         # We skip file size validation for FastAPI since it's hard to get the size without reading the file
         if not is_fastapi and hasattr(file, 'content_length') and file.content_length and file.content_length > self.max_file_size:
@@ -66,8 +68,8 @@ class FileManager:
         if file_id is None:
             file_id = str(uuid.uuid4())
             
-        file_ext = os.path.splitext(secure_filename(filename))[1]
-        output_filename = f"{file_id}{file_ext}"
+        file_ext = SpreadsheetParser.file_extension(secure_filename(filename))
+        output_filename = f"{file_id}.{file_ext}"
         
         # Save file
         file_path = os.path.join(self.upload_dir, output_filename)
@@ -79,8 +81,8 @@ class FileManager:
                 with open(file_path, "wb") as buffer:
                     # Move to the beginning of the file
                     file.file.seek(0)
-                    # Write the file
-                    buffer.write(file.file.read())
+                    # Copy in blocks rather than reading the whole upload into memory
+                    shutil.copyfileobj(file.file, buffer, 1024 * 1024)
             except Exception as e:
                 raise ValueError(f"Failed to save file: {str(e)}")
         else:
@@ -146,8 +148,7 @@ class FileManager:
         Returns:
             bool: True if the file has an allowed extension
         """
-        ext = os.path.splitext(filename)[1].lower()[1:]  # Remove the dot
-        return ext in self.allowed_extensions
+        return SpreadsheetParser.file_extension(filename) in self.allowed_extensions
     
     def save_json_data(self, data: Any, filename: str) -> str:
         """
@@ -0,0 +1,78 @@
+"""
+Metrics module
+------------------
+In-process counters and latency summaries for operational visibility
+"""
+
+import threading
+from collections import deque
+from typing import Dict, Any, Deque
+
+import numpy as np
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of named counters and latency samples
+    """
+
+    def __init__(self, window: int = 1000):
+        """
+        Initialize the registry
+
+        Args:
+            window: Number of most recent samples kept per latency metric
+        """
+        self.window = window
+        self.counters: Dict[str, int] = {}
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.lock = threading.Lock()
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        """
+        Increment a counter
+
+        Args:
+            name: Counter name
+            amount: Amount to add
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Record a latency sample
+
+        Args:
+            name: Metric name
+            seconds: Observed duration in seconds
+        """
+        with self.lock:
+            if name not in self.latencies:
+                self.latencies[name] = deque(maxlen=self.window)
+            self.latencies[name].append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the current values of all metrics
+
+        Returns:
+            Dict[str, Any]: Counters and p50/p95/p99 latencies in milliseconds
+        """
+        with self.lock:
+            counters = dict(self.counters)
+            latencies = {name: list(samples) for name, samples in self.latencies.items()}
+
+        summary = {}
+        for name, samples in latencies.items():
+            if not samples:
+                continue
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            summary[name] = {
+                'count': len(samples),
+                'p50_ms': round(p50 * 1000, 2),
+                'p95_ms': round(p95 * 1000, 2),
+                'p99_ms': round(p99 * 1000, 2)
+            }
+
+        return {'counters': counters, 'latencies': summary}
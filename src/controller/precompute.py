@@ -0,0 +1,248 @@
+"""
+Precompute module
+------------------
+Low-priority background work (exports, schemas, column profiles) run after each new history state
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.controller.metrics import MetricsRegistry
+
+
+class PrecomputeCancelled(Exception):
+    """Raised at a checkpoint when a newer state replaced the job or the scheduler stopped"""
+
+
+class PrecomputeJob:
+    """
+    Tasks building artifacts for one history state of a session
+
+    Tasks receive the job and call checkpoint() between steps of their
+    work; that is where cancellation, foreground activity and the CPU
+    limit take effect.
+    """
+
+    def __init__(self, scheduler: "PrecomputeScheduler", session_id: str, version: int,
+                 tasks: List[Tuple[str, Callable[["PrecomputeJob"], None]]], not_before: float):
+        self.scheduler = scheduler
+        self.session_id = session_id
+        self.version = version
+        self.tasks = tasks
+        self.not_before = not_before
+        self.cancelled = threading.Event()
+        self._step_started = time.monotonic()
+
+    def checkpoint(self) -> None:
+        """
+        Pause between steps of work
+
+        Sleeps long enough to keep the work within the CPU limit, then
+        waits until no foreground request is running.
+
+        Raises:
+            PrecomputeCancelled: If the job was cancelled
+        """
+        worked = time.monotonic() - self._step_started
+        self.scheduler._throttle(worked, self.cancelled)
+        self.scheduler._wait_for_idle(self.cancelled)
+        if self.cancelled.is_set():
+            raise PrecomputeCancelled()
+        self._step_started = time.monotonic()
+
+
+class PrecomputeScheduler:
+    """
+    Per-session queue of background precompute jobs
+
+    Each session has at most one job: submitting a newer state replaces a
+    pending job and cancels a running one at its next checkpoint. Jobs run
+    on a single worker thread, in the order sessions submitted them, under
+    three limits so precompute never competes with requests:
+
+    - the worker thread runs at the lowest OS scheduling priority (nice 19,
+      where the platform allows per-thread priorities);
+    - work only starts or continues once no foreground request has been
+      active for idle_delay seconds;
+    - after every step the worker sleeps so that its busy time stays under
+      max_cpu of one core.
+    """
+
+    def __init__(self, max_cpu: float = 0.5, idle_delay: float = 0.5, enabled: bool = True,
+                 metrics: Optional[MetricsRegistry] = None):
+        """
+        Initialize the scheduler and start its worker
+
+        Args:
+            max_cpu: Fraction of one core the worker may keep busy (0-1]
+            idle_delay: Seconds without foreground requests before work starts
+                (also the delay between a submit and the start of its job)
+            enabled: When False, submit() does nothing
+            metrics: Registry receiving completed/cancelled/failed counters
+        """
+        self.max_cpu = min(max(max_cpu, 0.01), 1.0)
+        self.idle_delay = idle_delay
+        self.enabled = enabled
+        self.metrics = metrics or MetricsRegistry()
+        self._jobs: "OrderedDict[str, PrecomputeJob]" = OrderedDict()
+        self._running: Optional[PrecomputeJob] = None
+        self._foreground = 0
+        self._last_foreground = 0.0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        if enabled:
+            self._worker = threading.Thread(target=self._run, name='precompute', daemon=True)
+            self._worker.start()
+
+    def submit(self, session_id: str, version: int, tasks: List[Tuple[str, Callable[[PrecomputeJob], None]]]) -> None:
+        """
+        Queue the tasks for a session's new state, replacing older work
+
+        Args:
+            session_id: Session ID
+            version: History version the tasks build artifacts for
+            tasks: (name, function) pairs run in order
+        """
+        if not self.enabled or not tasks:
+            return
+        with self._condition:
+            self._cancel_locked(session_id)
+            job = PrecomputeJob(self, session_id, version, tasks, time.monotonic() + self.idle_delay)
+            self._jobs[session_id] = job
+            self._condition.notify_all()
+
+    def cancel(self, session_id: str) -> None:
+        """
+        Drop a session's pending job and cancel its running one
+
+        Args:
+            session_id: Session ID
+        """
+        with self._condition:
+            self._cancel_locked(session_id)
+            self._condition.notify_all()
+
+    def _cancel_locked(self, session_id: str) -> None:
+        """Cancel a session's jobs; the condition lock is held"""
+        pending = self._jobs.pop(session_id, None)
+        if pending is not None:
+            self.metrics.increment('precompute.replaced')
+        if self._running is not None and self._running.session_id == session_id:
+            self._running.cancelled.set()
+
+    @contextmanager
+    def foreground(self) -> Iterator[None]:
+        """Mark a foreground request as running for the duration of the block"""
+        with self._condition:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._foreground -= 1
+                self._last_foreground = time.monotonic()
+                self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the scheduler state
+
+        Returns:
+            Dict[str, Any]: Pending jobs, the running job and foreground requests
+        """
+        with self._condition:
+            running = self._running
+            return {
+                'enabled': self.enabled,
+                'pending': len(self._jobs),
+                'running': f"{running.session_id}@{running.version}" if running else None,
+                'foreground': self._foreground
+            }
+
+    def shutdown(self) -> None:
+        """Cancel all work and stop the worker"""
+        with self._condition:
+            self._closed = True
+            self._jobs.clear()
+            if self._running is not None:
+                self._running.cancelled.set()
+            self._condition.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+
+    def _run(self) -> None:
+        """Worker loop: take the oldest job that is due and run its tasks"""
+        self._lower_priority()
+        while True:
+            with self._condition:
+                job = self._next_job()
+                if job is None:
+                    return
+                self._running = job
+            try:
+                self._run_job(job)
+            finally:
+                with self._condition:
+                    self._running = None
+
+    def _next_job(self) -> Optional[PrecomputeJob]:
+        """Wait for a job that is due; the condition lock is held"""
+        while not self._closed:
+            if self._jobs:
+                session_id, job = next(iter(self._jobs.items()))
+                wait = job.not_before - time.monotonic()
+                if wait <= 0:
+                    del self._jobs[session_id]
+                    return job
+                self._condition.wait(wait)
+            else:
+                self._condition.wait()
+        return None
+
+    def _run_job(self, job: PrecomputeJob) -> None:
+        """Run a job's tasks, stopping at the first checkpoint after cancellation"""
+        for name, task in job.tasks:
+            started = time.perf_counter()
+            try:
+                job.checkpoint()
+                task(job)
+            except PrecomputeCancelled:
+                self.metrics.increment('precompute.cancelled')
+                return
+            except Exception as e:
+                self.metrics.increment(f'precompute.{name}.failed')
+                logging.warning(f"Precompute: {name} failed for session {job.session_id}: {e}")
+                continue
+            self.metrics.increment(f'precompute.{name}.completed')
+            self.metrics.observe(f'precompute.{name}', time.perf_counter() - started)
+
+    def _throttle(self, worked: float, cancelled: threading.Event) -> None:
+        """Sleep off a step's busy time beyond the CPU limit"""
+        if self.max_cpu < 1.0 and worked > 0:
+            cancelled.wait(worked * (1 - self.max_cpu) / self.max_cpu)
+
+    def _wait_for_idle(self, cancelled: threading.Event) -> None:
+        """Block while foreground requests are running or just finished"""
+        with self._condition:
+            while not cancelled.is_set() and not self._closed:
+                if self._foreground:
+                    self._condition.wait(self.idle_delay)
+                    continue
+                remaining = self._last_foreground + self.idle_delay - time.monotonic()
+                if remaining <= 0:
+                    return
+                self._condition.wait(remaining)
+
+    @staticmethod
+    def _lower_priority() -> None:
+        """Give the worker thread the lowest CPU scheduling priority (per-thread on Linux)"""
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError) as e:
+            logging.info(f"Precompute: could not lower worker priority: {e}")
@@ -4,25 +4,85 @@ Schema Generator module
 Generates JSON schema from spreadsheet data and vice versa
 """
 
+import re
+import warnings
 import pandas as pd
+import numpy as np
 import json
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+
+from src.controller.edit_engine import BOOLEAN_WORDS
+from src.controller.block_detector import single_table
+
+# Text that may hold a date: digits with date separators, or month names
+DATE_LIKE = re.compile(r'\d{1,4}[-/.:]\d{1,2}|\d{1,2}\s+[A-Za-z]{3}|[A-Za-z]{3,9}\.?\s+\d{1,2}')
+# Text values checked as numbers, booleans or dates before the whole column is converted
+TEXT_PROBE_SIZE = 50
+
+
+def sample_positions(row_count: int, max_rows: Optional[int]) -> Optional[np.ndarray]:
+    """
+    Row positions spread over a frame, at most max_rows (None when every row is used)
+
+    One position is drawn at random (with a fixed seed) from each of
+    max_rows equal strides, so periodic data such as alternating values is
+    not aliased the way a fixed stride would be. The first and last rows
+    are always included.
+
+    Args:
+        row_count: Number of rows in the frame
+        max_rows: Maximum number of positions (None or 0 for no limit)
+
+    Returns:
+        Optional[np.ndarray]: Sorted, distinct row positions
+    """
+    if not max_rows or row_count <= max_rows:
+        return None
+    stride = row_count / max_rows
+    jitter = np.random.default_rng(row_count).random(max_rows)
+    positions = ((np.arange(max_rows) + jitter) * stride).astype(np.int64)
+    positions[0] = 0
+    positions[-1] = row_count - 1
+    return positions
+
 
 class SchemaGenerator:
     """
     Generates and maintains a schema representation of spreadsheet data
     """
     
-    def __init__(self):
-        """Initialize the schema generator"""
-        self.last_schema = None
+    def __init__(self, sample_rows: Optional[int] = None, max_categories: int = 20):
+        """
+        Initialize the schema generator
+
+        Args:
+            sample_rows: Infer column types from at most this many rows spread
+                over the frame (None or 0 uses every row)
+            max_categories: Text columns with at most this many distinct values
+                (and values repeating on average) are reported as categorical
+        """
+        self.sample_rows = sample_rows or None
+        self.max_categories = max_categories
         
-    def generate_schema(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def generate_schema(self, df: pd.DataFrame, previous: Optional[Dict[str, Any]] = None,
+                        sources: Optional[List[Optional[int]]] = None) -> Dict[str, Any]:
         """
         Generate a JSON schema from a pandas DataFrame
+
+        Types are inferred column by column with vectorized checks, on a
+        sample of sample_rows rows when the frame is larger. Besides the
+        dtype, object and string columns are checked for numbers, booleans
+        and dates stored as text ("stored_as_text") and for low-cardinality
+        values ("categorical" with the "categories").
+
+        Given the schema of an earlier version of the frame, columns that
+        did not change are copied from it instead of being inferred again.
         
         Args:
             df: The pandas DataFrame to analyze
+            previous: Schema of the frame df was derived from
+            sources: Per column of df, the position of the same unchanged
+                column in previous (None to infer it)
             
         Returns:
             Dict[str, Any]: JSON schema representing the structure and sample data
@@ -30,36 +90,23 @@ class SchemaGenerator:
         if df.empty:
             return {"columns": [], "sample_data": []}
         
+        positions = sample_positions(len(df), self.sample_rows)
+        previous_columns = previous.get("columns", []) if previous and sources else []
+
         # Extract column info
         columns = []
-        for col_name in df.columns:
-            # Get column data type
-            col_data = df[col_name].dropna()
-            if len(col_data) == 0:
-                dtype = "unknown"
-            elif pd.api.types.is_numeric_dtype(col_data):
-                if all(col_data.apply(lambda x: float(x).is_integer() if pd.notnull(x) else True)):
-                    dtype = "integer"
-                else:
-                    dtype = "float"
-            elif pd.api.types.is_datetime64_dtype(col_data):
-                dtype = "datetime"
+        for col_idx in range(len(df.columns)):
+            source = sources[col_idx] if previous_columns else None
+            if source is not None and source < len(previous_columns):
+                columns.append(previous_columns[source])
             else:
-                dtype = "string"
-            
-            # Get sample values (up to 3)
-            sample_values = df[col_name].dropna().head(3).tolist()
-            
-            columns.append({
-                "name": str(col_name),
-                "type": dtype,
-                "sample_values": sample_values
-            })
+                columns.append(self._column_schema(df, col_idx, positions))
         
         # Get sample rows (up to 5)
-        sample_data = []
-        for _, row in df.head(5).iterrows():
-            sample_data.append(row.to_dict())
+        sample_data = [
+            {str(name): self._to_json_value(None if self._is_missing(value) else value) for name, value in zip(df.columns, row)}
+            for row in df.iloc[:5].to_numpy(dtype=object).tolist()
+        ]
         
         schema = {
             "columns": columns,
@@ -67,22 +114,280 @@ class SchemaGenerator:
             "row_count": len(df),
             "column_count": len(df.columns)
         }
-        
-        self.last_schema = schema
+        if positions is not None:
+            schema["sampled_rows"] = len(positions)
         return schema
-    
-    def get_transformation_prompt(self, source_df: pd.DataFrame, target_schema: Dict[str, Any]) -> str:
+
+    def _column_schema(self, df: pd.DataFrame, col_idx: int, positions: Optional[np.ndarray]) -> Dict[str, Any]:
+        """Schema entry of one column, inferred from the sampled rows"""
+        col_data = self._column(df, col_idx, positions)
+        non_null = col_data[col_data.notna().to_numpy()]
+        dtype, stored_as_text = self._infer_type(non_null)
+
+        # Get sample values (up to 3), preferring the first rows
+        head = df.iloc[:1000, col_idx]
+        sample_values = head[head.notna().to_numpy()].head(3)
+        if len(sample_values) == 0:
+            sample_values = non_null.head(3)
+
+        column: Dict[str, Any] = {
+            "name": str(df.columns[col_idx]),
+            "type": dtype,
+            "dtype": str(col_data.dtype),
+            "sample_values": [self._to_json_value(v) for v in sample_values]
+        }
+        if stored_as_text:
+            column["stored_as_text"] = True
+        categories = self._categories(non_null, dtype)
+        if categories is not None:
+            column["categorical"] = True
+            column["categories"] = categories
+        return column
+
+    @staticmethod
+    def _column(df: pd.DataFrame, col_idx: int, positions: Optional[np.ndarray]) -> pd.Series:
+        """One column, limited to the sampled rows"""
+        column = df.iloc[:, col_idx]
+        return column if positions is None else column.iloc[positions]
+
+    @staticmethod
+    def _is_missing(value: Any) -> bool:
+        """Whether a scalar cell value is missing (lists and dicts never are)"""
+        return not isinstance(value, (list, dict, set, tuple, np.ndarray)) and bool(pd.isna(value))
+
+    def generate_column_profiles(self, df: pd.DataFrame, max_examples: int = 3, max_rows: int = 100000,
+                                 previous: Optional[List[Dict[str, Any]]] = None,
+                                 sources: Optional[List[Optional[int]]] = None) -> List[Dict[str, Any]]:
+        """
+        Summarize every column of a DataFrame for use in LLM prompts
+
+        Args:
+            df: The pandas DataFrame to analyze
+            max_examples: Maximum number of example values per column
+            max_rows: Profile at most this many rows spread over the frame; larger
+                frames get approximate null rates and cardinalities
+            previous: Profiles of the frame df was derived from; unchanged
+                columns are copied from them
+            sources: Per column of df, the position of the same unchanged
+                column in previous (None to profile it)
+
+        Returns:
+            List[Dict[str, Any]]: One profile per column with dtype, null rate,
+            cardinality and the most frequent example values
+        """
+        approximate = len(df) > max_rows
+        positions = sample_positions(len(df), max_rows)
+        previous = previous if sources else None
+
+        profiles = []
+        for col_idx in range(len(df.columns)):
+            source = sources[col_idx] if previous else None
+            if source is not None and source < len(previous):
+                profiles.append(previous[source])
+                continue
+
+            col_data = self._column(df, col_idx, positions)
+            non_null = col_data.dropna()
+
+            try:
+                counts = non_null.value_counts()
+                cardinality = int(len(counts))
+                examples = [self._to_json_value(v) for v in counts.index[:max_examples]]
+            except TypeError:
+                # Unhashable values (lists, dicts) cannot be counted
+                cardinality = None
+                examples = [self._to_json_value(v) for v in non_null.head(max_examples)]
+
+            col_type, stored_as_text = self._infer_type(non_null)
+            profile: Dict[str, Any] = {
+                "name": str(df.columns[col_idx]),
+                "dtype": str(col_data.dtype),
+                "type": col_type,
+                "null_rate": round(1 - len(non_null) / len(col_data), 4) if len(col_data) else 0.0,
+                "cardinality": cardinality,
+                "examples": examples,
+                "approximate": approximate
+            }
+            if stored_as_text:
+                profile["stored_as_text"] = True
+
+            if pd.api.types.is_numeric_dtype(non_null) and not pd.api.types.is_bool_dtype(non_null) and len(non_null):
+                profile["min"] = self._to_json_value(non_null.min())
+                profile["max"] = self._to_json_value(non_null.max())
+
+            profiles.append(profile)
+
+        return profiles
+
+    def _infer_type(self, col_data: pd.Series) -> Tuple[str, bool]:
+        """
+        Infer the schema type name of a column with nulls already removed
+
+        Numeric columns holding only whole numbers are integers. Object and
+        string columns are checked, in this order, for Python numbers,
+        booleans and dates, then for text that parses as numbers, boolean
+        words (true/false, yes/no, ...) or dates.
+
+        Args:
+            col_data: Non-null values of the column
+
+        Returns:
+            Tuple[str, bool]: One of integer, float, boolean, datetime,
+            duration, string or unknown, and whether the values are text
+            that parses as that type
+        """
+        if len(col_data) == 0:
+            return "unknown", False
+        if isinstance(col_data.dtype, pd.CategoricalDtype):
+            col_data = pd.Series(col_data.cat.categories)
+            if len(col_data) == 0:
+                return "unknown", False
+        if pd.api.types.is_bool_dtype(col_data):
+            return "boolean", False
+        if pd.api.types.is_numeric_dtype(col_data):
+            return self._number_type(col_data.to_numpy(dtype=float, na_value=np.nan)), False
+        if pd.api.types.is_datetime64_any_dtype(col_data):
+            return "datetime", False
+        if pd.api.types.is_timedelta64_dtype(col_data):
+            return "duration", False
+
+        inferred = pd.api.types.infer_dtype(col_data, skipna=True)
+        if inferred in ('integer', 'floating', 'mixed-integer-float', 'decimal'):
+            return self._number_type(pd.to_numeric(col_data, errors='coerce').to_numpy(dtype=float)), False
+        if inferred == 'boolean':
+            return "boolean", False
+        if inferred in ('datetime', 'datetime64', 'date'):
+            return "datetime", False
+        if inferred in ('timedelta', 'timedelta64'):
+            return "duration", False
+        if inferred != 'string':
+            return "string", False
+        return self._text_type(col_data)
+
+    @staticmethod
+    def _number_type(values: np.ndarray) -> str:
+        """integer if every finite value is whole and nothing is infinite, else float"""
+        return "integer" if np.all(np.mod(values, 1) == 0) else "float"
+
+    def _text_type(self, col_data: pd.Series) -> Tuple[str, bool]:
+        """
+        Type of text values: numbers, boolean words or dates as text, else string
+
+        Each check runs on the first TEXT_PROBE_SIZE values first, so free
+        text is rejected without converting the whole column.
+        """
+        probe = col_data.iloc[:TEXT_PROBE_SIZE].astype(str).str.strip()
+        if (probe == '').any():
+            return "string", False
+        text: Optional[pd.Series] = None
+
+        def full_text() -> pd.Series:
+            return probe if len(probe) == len(col_data) else col_data.astype(str).str.strip()
+
+        if pd.to_numeric(probe, errors='coerce').notna().all():
+            text = full_text()
+            numbers = pd.to_numeric(text, errors='coerce')
+            if numbers.notna().all():
+                return self._number_type(numbers.to_numpy(dtype=float)), True
+
+        words = list(BOOLEAN_WORDS)
+        if probe.str.lower().isin(words).all():
+            text = text if text is not None else full_text()
+            if text.str.lower().isin(words).all():
+                return "boolean", True
+
+        if probe.str.contains(DATE_LIKE).all() and self._parses_as_dates(probe):
+            text = text if text is not None else full_text()
+            if (text != '').all() and self._parses_as_dates(text):
+                return "datetime", True
+        return "string", False
+
+    @staticmethod
+    def _parses_as_dates(text: pd.Series) -> bool:
+        """Whether every value parses as a date (with the format pandas infers from the first)"""
+        with warnings.catch_warnings():
+            # "Could not infer format" warnings for day-first or free-form dates
+            warnings.simplefilter('ignore', UserWarning)
+            try:
+                parsed = pd.to_datetime(text, errors='coerce')
+            except (ValueError, TypeError, OverflowError):
+                return False
+        return bool(parsed.notna().all())
+
+    def _categories(self, col_data: pd.Series, col_type: str) -> Optional[List[Any]]:
+        """
+        Distinct values of a low-cardinality column
+
+        Categorical dtypes always qualify (when they have few enough
+        categories); text columns when they have at most max_categories
+        distinct values, each appearing twice on average.
+
+        Args:
+            col_data: Non-null values of the column
+            col_type: Inferred type of the column
+
+        Returns:
+            Optional[List[Any]]: Sorted categories, or None if the column is not categorical
+        """
+        if isinstance(col_data.dtype, pd.CategoricalDtype):
+            categories = col_data.cat.categories
+            if len(categories) > self.max_categories:
+                return None
+            return [self._to_json_value(v) for v in categories]
+        if col_type != 'string' or len(col_data) == 0:
+            return None
+        try:
+            distinct = pd.unique(col_data.to_numpy())
+        except TypeError:
+            # Unhashable values (lists, dicts)
+            return None
+        if len(distinct) > self.max_categories or len(distinct) * 2 > len(col_data):
+            return None
+        try:
+            distinct = sorted(distinct)
+        except TypeError:
+            distinct = list(distinct)
+        return [self._to_json_value(v) for v in distinct]
+
+    @staticmethod
+    def _to_json_value(value: Any) -> Any:
+        """
+        Convert a pandas/numpy scalar into a JSON serializable value
+
+        Args:
+            value: The scalar to convert
+
+        Returns:
+            Any: A plain Python value
+        """
+        if isinstance(value, (pd.Timestamp, pd.Timedelta)):
+            return str(value)
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, (str, int, float, bool)) or value is None:
+            return value
+        return str(value)
+
+    def get_transformation_prompt(self, source_df: pd.DataFrame, target_schema: Dict[str, Any],
+                                  source_schema: Optional[Dict[str, Any]] = None,
+                                  mapping: Optional[Dict[str, Any]] = None,
+                                  blocks: Optional[Dict[str, Any]] = None) -> str:
         """
         Generate a prompt for LLM to transform source data to match target schema
         
         Args:
             source_df: The source pandas DataFrame
             target_schema: The target JSON schema
+            source_schema: Schema of source_df if already computed
+            mapping: SchemaMapping.to_dict() of a plan not confident enough to apply directly,
+                or {'confidence', 'tables'} with one plan per table block
+            blocks: Table blocks of source_df (BlockDetector.detect)
             
         Returns:
             str: A prompt for the LLM
         """
-        source_schema = self.generate_schema(source_df)
+        if source_schema is None:
+            source_schema = self.generate_schema(source_df)
         
         prompt = """
         I need to transform a source spreadsheet to match a target schema.
@@ -115,4 +420,49 @@ class SchemaGenerator:
             target_schema=json.dumps(target_schema, indent=2)
         )
         
+        if blocks is not None and not single_table(blocks):
+            prompt += self._tables_hint(blocks)
+        
+        if mapping is not None:
+            prompt += self._mapping_hint(mapping)
+        
         return prompt
+
+    @staticmethod
+    def _tables_hint(blocks: Dict[str, Any]) -> str:
+        """Prompt section giving the detected table blocks as data the script can loop over"""
+        tables = [
+            {'rows': table['rows'], 'cols': table['cols'], 'header': table['header'], 'title': table['title']}
+            for table in blocks['tables']
+        ]
+        return (
+            "\n        SOURCE TABLES: the source holds these tables, separated by empty rows or columns. "
+            "'rows' and 'cols' are df.iloc ranges (end exclusive) of each table's data and 'header' its column names. "
+            "Copy this list into the script as TABLES, loop over it, transform each table and combine the results:\n"
+            f"        {json.dumps(tables, default=str)}\n"
+        )
+
+    @classmethod
+    def _mapping_hint(cls, mapping: Dict[str, Any]) -> str:
+        """Prompt section listing the column matches found without the LLM"""
+        if 'tables' in mapping:
+            return "".join(
+                f"\n        TABLE rows {table['rows'][0]}:{table['rows'][1]}, cols {table['cols'][0]}:{table['cols'][1]}"
+                + cls._mapping_hint(table)
+                for table in mapping['tables']
+            )
+        lines = []
+        for column in mapping.get('columns', []):
+            if column['source'] is None:
+                lines.append(f"- {column['target']}: no matching source column found")
+            else:
+                lines.append(
+                    f"- {column['target']} <- {column['source']} "
+                    f"(as {column['type']}, confidence {column['confidence']:.2f})"
+                )
+        if mapping.get('dropped'):
+            lines.append(f"- unused source columns: {', '.join(str(name) for name in mapping['dropped'])}")
+        return (
+            "\n        SUGGESTED COLUMN MAPPING (from names, types and values; verify the low-confidence ones):\n"
+            + "\n".join(f"        {line}" for line in lines) + "\n"
+        )
@@ -0,0 +1,425 @@
+"""
+Schema Mapper module
+------------------
+Matches source columns to a target schema and applies the rename, cast and reorder plan without an LLM
+"""
+
+import re
+import warnings
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.controller.edit_engine import BOOLEAN_WORDS
+from src.controller.schema_generator import sample_positions
+
+
+# Weights of the name, type and value evidence in a column match score
+NAME_WEIGHT = 0.6
+TYPE_WEIGHT = 0.25
+VALUE_WEIGHT = 0.15
+
+# How well a source column of one type can fill a target column of another
+# (same type: 1.0, target string: 0.7, unknown on either side: 0.5, otherwise 0.1)
+TYPE_COMPATIBILITY = {
+    ('integer', 'float'): 0.9,
+    ('float', 'integer'): 0.6,
+    ('boolean', 'integer'): 0.4,
+    ('integer', 'boolean'): 0.4,
+    ('datetime', 'duration'): 0.0,
+    ('duration', 'datetime'): 0.0,
+    ('boolean', 'datetime'): 0.0,
+    ('datetime', 'boolean'): 0.0,
+}
+
+# Text columns with more distinct values than this carry no value-overlap evidence
+MAX_TEXT_FINGERPRINT = 50
+# Number and date ranges of fewer values than this carry no value-overlap evidence
+MIN_RANGE_VALUES = 3
+
+
+def _name_tokens(name: Any) -> List[str]:
+    """Lower-case word tokens of a column name (camelCase, snake_case and spaces split)"""
+    text = re.sub(r'([a-z0-9])([A-Z])', r'\1 \2', str(name))
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+
+def name_similarity(source: Any, target: Any) -> float:
+    """
+    Similarity of two column names in [0, 1]
+
+    Names equal after normalization score 1. Otherwise the best of the
+    character similarity of the normalized names and the share of tokens
+    that match exactly or as abbreviations (cust ~ customer, qty ~
+    quantity), slightly
+    below 1.
+
+    Args:
+        source: Source column name
+        target: Target column name
+
+    Returns:
+        float: Similarity
+    """
+    source_tokens, target_tokens = _name_tokens(source), _name_tokens(target)
+    if not source_tokens or not target_tokens:
+        return 1.0 if str(source).strip() == str(target).strip() else 0.0
+    if source_tokens == target_tokens:
+        return 1.0
+
+    joined_source, joined_target = ''.join(source_tokens), ''.join(target_tokens)
+    if joined_source == joined_target:
+        return 0.95
+    ratio = SequenceMatcher(None, joined_source, joined_target).ratio()
+
+    def matches(a: str, b: str) -> bool:
+        if a == b:
+            return True
+        short, long = sorted((a, b), key=len)
+        if len(short) < 3 or short[0] != long[0]:
+            return False
+        # Prefix (cust ~ customer) or abbreviation keeping letters in order (qty ~ quantity)
+        remaining = iter(long)
+        return long.startswith(short) or all(char in remaining for char in short)
+
+    matched = sum(1 for token in source_tokens if any(matches(token, other) for other in target_tokens))
+    token_score = matched / max(len(source_tokens), len(target_tokens))
+    return max(ratio, 0.9 * token_score)
+
+
+def type_compatibility(source_type: str, target_type: str) -> float:
+    """How well a source column type can fill a target column type, in [0, 1]"""
+    if source_type == target_type:
+        return 1.0
+    if 'unknown' in (source_type, target_type):
+        return 0.5
+    if target_type == 'string':
+        return 0.7
+    return TYPE_COMPATIBILITY.get((source_type, target_type), 0.1)
+
+
+def cast_column(column: pd.Series, target_type: str) -> Tuple[pd.Series, int]:
+    """
+    Convert a column to a schema type with vectorized conversions
+
+    Args:
+        column: Source column
+        target_type: integer, float, boolean, datetime, duration, string or unknown
+
+    Returns:
+        Tuple[pd.Series, int]: The converted column and the number of
+        present values that could not be represented (now missing, or not
+        whole numbers for integer targets)
+    """
+    present = column.notna().to_numpy()
+    if target_type in ('integer', 'float'):
+        if pd.api.types.is_bool_dtype(column):
+            column = column.astype('Int64' if not present.all() else 'int64')
+        numbers = column if pd.api.types.is_numeric_dtype(column) else pd.to_numeric(column, errors='coerce')
+        lost = int(np.count_nonzero(present & numbers.isna().to_numpy()))
+        if target_type == 'float' or pd.api.types.is_integer_dtype(numbers):
+            return (numbers.astype('float64') if target_type == 'float' else numbers), lost
+        values = numbers.to_numpy(dtype=float, na_value=np.nan)
+        fractional = ~np.isnan(values) & (np.mod(values, 1) != 0)
+        if fractional.any():
+            # Keep the fractions rather than truncating them; they count against the match
+            return numbers, lost + int(np.count_nonzero(fractional))
+        return numbers.astype('Int64' if np.isnan(values).any() else 'int64'), lost
+
+    if target_type == 'boolean':
+        if pd.api.types.is_bool_dtype(column):
+            return column, 0
+        if pd.api.types.is_numeric_dtype(column):
+            truth = column.map({1: True, 0: False})
+        else:
+            truth = column.astype(str).str.strip().str.lower().map(BOOLEAN_WORDS)
+        truth = truth.where(pd.Series(present, index=column.index))
+        lost = int(np.count_nonzero(present & truth.isna().to_numpy()))
+        return truth.astype('boolean'), lost
+
+    if target_type == 'datetime':
+        if pd.api.types.is_datetime64_any_dtype(column):
+            return column, 0
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            parsed = pd.to_datetime(column, errors='coerce')
+            failed = present & parsed.isna().to_numpy()
+            if failed.any() and not pd.api.types.is_numeric_dtype(column):
+                # Values that did not follow the format inferred from the first one
+                retried = pd.to_datetime(column[failed], errors='coerce', format='mixed')
+                parsed = parsed.astype(retried.dtype) if failed.all() else parsed
+                parsed[failed] = retried
+        return parsed, int(np.count_nonzero(present & parsed.isna().to_numpy()))
+
+    if target_type == 'duration':
+        if pd.api.types.is_timedelta64_dtype(column):
+            return column, 0
+        parsed = pd.to_timedelta(column, errors='coerce')
+        return parsed, int(np.count_nonzero(present & parsed.isna().to_numpy()))
+
+    if target_type == 'string':
+        if pd.api.types.is_string_dtype(column) and not pd.api.types.is_object_dtype(column):
+            return column, 0
+        if pd.api.types.is_object_dtype(column) and pd.api.types.infer_dtype(column, skipna=True) in ('string', 'empty'):
+            return column, 0
+        text = column.astype(str).astype(object)
+        return text.where(pd.Series(present, index=column.index)), 0
+
+    return column, 0
+
+
+class SchemaMapping:
+    """
+    A column plan mapping a source sheet onto a target schema
+
+    Each entry of `columns` describes one target column, in target order:
+    the source column it is taken from (or None), the cast to the target
+    type, the evidence scores and the confidence of the match.
+    """
+
+    def __init__(self, columns: List[Dict[str, Any]], dropped: List[str]):
+        """
+        Initialize the mapping
+
+        Args:
+            columns: One entry per target column
+            dropped: Source columns no target column is taken from
+        """
+        self.columns = columns
+        self.dropped = dropped
+
+    @property
+    def confidence(self) -> float:
+        """Confidence of the whole plan: its weakest target column (0 if one has no source)"""
+        if not self.columns:
+            return 0.0
+        return min(column['confidence'] for column in self.columns)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Describe the plan for a response or prompt
+
+        Returns:
+            Dict[str, Any]: Columns, dropped source columns and overall confidence
+        """
+        return {'confidence': round(self.confidence, 3), 'columns': self.columns, 'dropped': self.dropped}
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Build the target-shaped sheet: one rename, cast and reorder pass
+
+        Columns taken over without a cast are not copied (copy-on-write).
+
+        Args:
+            df: Source sheet
+
+        Returns:
+            pd.DataFrame: Sheet with the target columns in target order
+        """
+        data = {}
+        for position, column in enumerate(self.columns):
+            source = column['source_position']
+            if source is None:
+                data[position] = pd.Series(None, index=df.index, dtype=object)
+            else:
+                data[position] = cast_column(df.iloc[:, source], column['type'])[0]
+        result = pd.DataFrame(data, index=df.index)
+        result.columns = [column['target'] for column in self.columns]
+        return result.reset_index(drop=True)
+
+
+class SchemaMapper:
+    """
+    Matches source columns to target schema columns without an LLM
+
+    Every (source, target) pair is scored from name similarity, type
+    compatibility and the overlap of their value distributions (numeric
+    and date ranges, or the value sets of low-cardinality text). Pairs are
+    assigned greedily from the best score down. A match's confidence is
+    its score, reduced when another candidate scored almost as well and by
+    the share of sampled values the cast to the target type would lose.
+    """
+
+    def __init__(self, min_score: float = 0.45, sample_rows: int = 2000):
+        """
+        Initialize the mapper
+
+        Args:
+            min_score: Pairs scoring below this are never matched
+            sample_rows: Rows per column used for value overlap and cast checks
+        """
+        self.min_score = min_score
+        self.sample_rows = sample_rows
+
+    def plan(self, source_df: pd.DataFrame, source_schema: Dict[str, Any], target_schema: Dict[str, Any],
+             target_df: Optional[pd.DataFrame] = None) -> SchemaMapping:
+        """
+        Plan how to turn the source sheet into the target schema
+
+        Args:
+            source_df: Source sheet
+            source_schema: SchemaGenerator schema of source_df
+            target_schema: SchemaGenerator schema of the target
+            target_df: Target example data, used for value overlap when given
+
+        Returns:
+            SchemaMapping: The plan and its confidence
+        """
+        source_columns = source_schema.get('columns', [])
+        target_columns = [{**target, 'type': self._target_type(target)} for target in target_schema.get('columns', [])]
+        source_sample = self._sample(source_df)
+        target_sample = self._sample(target_df) if target_df is not None else None
+        source_prints = [self._fingerprint(source_sample.iloc[:, i]) for i in range(len(source_columns))]
+        target_prints = [
+            self._fingerprint(target_sample.iloc[:, j]) if target_sample is not None and j < target_sample.shape[1] else None
+            for j in range(len(target_columns))
+        ]
+
+        # Evidence per (source, target) pair
+        evidence = np.zeros((len(source_columns), len(target_columns), 4))
+        for i, source in enumerate(source_columns):
+            for j, target in enumerate(target_columns):
+                evidence[i, j] = self._score(source, target, source_prints[i], target_prints[j])
+        scores = evidence[:, :, 0] if evidence.size else np.zeros((len(source_columns), len(target_columns)))
+
+        # Greedy assignment from the best pair down
+        assigned: Dict[int, int] = {}
+        used_sources = set()
+        for flat in np.argsort(-scores, axis=None, kind='stable'):
+            i, j = np.unravel_index(flat, scores.shape)
+            i, j = int(i), int(j)
+            if scores[i, j] < self.min_score:
+                break
+            if i in used_sources or j in assigned:
+                continue
+            assigned[j] = i
+            used_sources.add(i)
+
+        columns = []
+        for j, target in enumerate(target_columns):
+            entry: Dict[str, Any] = {
+                'target': target.get('name'),
+                'type': target.get('type', 'unknown'),
+                'source': None,
+                'source_position': None,
+                'confidence': 0.0
+            }
+            i = assigned.get(j)
+            if i is not None:
+                score, name_score, type_score, value_score = evidence[i, j]
+                # Closest alternative for either side of the match
+                others = np.concatenate((np.delete(scores[:, j], i), np.delete(scores[i, :], j)))
+                margin = score - (others.max() if len(others) else 0.0)
+                confidence = score * min(1.0, 0.5 + 5 * max(margin, 0.0))
+                cast_loss = self._cast_loss(source_sample.iloc[:, i], entry['type'])
+                confidence *= 1.0 - cast_loss
+                entry.update({
+                    'source': source_columns[i].get('name'),
+                    'source_position': i,
+                    'confidence': round(float(confidence), 3),
+                    'score': round(float(score), 3),
+                    'name_score': round(float(name_score), 3),
+                    'type_score': round(float(type_score), 3),
+                    'value_score': None if np.isnan(value_score) else round(float(value_score), 3),
+                    'cast_loss': round(cast_loss, 3)
+                })
+            columns.append(entry)
+
+        dropped = [source.get('name') for i, source in enumerate(source_columns) if i not in used_sources]
+        return SchemaMapping(columns, dropped)
+
+    def _score(self, source: Dict[str, Any], target: Dict[str, Any],
+               source_print: Optional[Tuple[str, Any]], target_print: Optional[Tuple[str, Any]]) -> Tuple[float, float, float, float]:
+        """Combined score and its name, type and value parts (value is NaN without evidence)"""
+        name_score = name_similarity(source.get('name'), target.get('name'))
+        type_score = type_compatibility(source.get('type', 'unknown'), target.get('type', 'unknown'))
+        if type_score == 0.0:
+            return 0.0, name_score, 0.0, np.nan
+        value_score = self._overlap(source_print, target_print)
+        if value_score is None:
+            score = (NAME_WEIGHT * name_score + TYPE_WEIGHT * type_score) / (NAME_WEIGHT + TYPE_WEIGHT)
+            return score, name_score, type_score, np.nan
+        score = NAME_WEIGHT * name_score + TYPE_WEIGHT * type_score + VALUE_WEIGHT * value_score
+        return score, name_score, type_score, value_score
+
+    def _sample(self, df: pd.DataFrame) -> pd.DataFrame:
+        """At most sample_rows rows spread over the frame"""
+        positions = sample_positions(len(df), self.sample_rows)
+        return df if positions is None else df.iloc[positions]
+
+    @staticmethod
+    def _target_type(target: Dict[str, Any]) -> str:
+        """Type to cast to: whole numbers stored as floats in the target stay floats"""
+        target_type = target.get('type', 'unknown')
+        if target_type == 'integer' and str(target.get('dtype', '')).startswith('float'):
+            return 'float'
+        return target_type
+
+    @staticmethod
+    def _fingerprint(column: pd.Series) -> Optional[Tuple[str, Any]]:
+        """
+        Summary of a column's values for overlap checks
+
+        Returns:
+            Optional[Tuple[str, Any]]: ('range', (low, high)) for numbers and
+            dates, ('set', values) for booleans and for text with few,
+            repeated distinct values, or None when there is no usable
+            evidence (free text, or too few values to tell)
+        """
+        values = column.dropna()
+        if len(values) == 0:
+            return None
+        if pd.api.types.is_datetime64_any_dtype(values):
+            if values.dt.tz is not None:
+                values = values.dt.tz_localize(None)
+            # Seconds, so sheets parsed at different resolutions compare
+            seconds = values.dt.as_unit('s').astype('int64')
+            if len(seconds) < MIN_RANGE_VALUES:
+                return None
+            return ('range', (float(seconds.min()), float(seconds.max())))
+        if pd.api.types.is_bool_dtype(values):
+            return ('set', frozenset(bool(v) for v in values.unique()))
+        numbers = values if pd.api.types.is_numeric_dtype(values) else pd.to_numeric(values, errors='coerce')
+        if numbers.notna().mean() >= 0.9:
+            if numbers.count() < MIN_RANGE_VALUES:
+                return None
+            return ('range', (float(numbers.min()), float(numbers.max())))
+        distinct = pd.unique(values.astype(str).str.strip().str.lower())
+        if all(value in BOOLEAN_WORDS for value in distinct):
+            # yes/no, y/n and true/false columns compare by truth value
+            return ('set', frozenset(BOOLEAN_WORDS[value] for value in distinct))
+        if len(distinct) > MAX_TEXT_FINGERPRINT or len(values) < 2 * len(distinct):
+            return None
+        return ('set', frozenset(distinct))
+
+    @staticmethod
+    def _overlap(source: Optional[Tuple[str, Any]], target: Optional[Tuple[str, Any]]) -> Optional[float]:
+        """Overlap coefficient of two fingerprints, or None without evidence"""
+        if source is None or target is None:
+            return None
+        if source[0] != target[0]:
+            return 0.0
+        if source[0] == 'set':
+            smaller = min(len(source[1]), len(target[1]))
+            return len(source[1] & target[1]) / smaller if smaller else None
+        (source_low, source_high), (target_low, target_high) = source[1], target[1]
+        shorter = min(source_high - source_low, target_high - target_low)
+        intersection = min(source_high, target_high) - max(source_low, target_low)
+        if shorter <= 0:
+            # A single value (or constant column) on one side: inside the other range or not
+            return 1.0 if intersection >= 0 else 0.0
+        return float(min(max(intersection / shorter, 0.0), 1.0))
+
+    @staticmethod
+    def _cast_loss(column: pd.Series, target_type: str) -> float:
+        """Share of the sampled present values the cast to target_type cannot represent"""
+        present = int(column.notna().sum())
+        if present == 0:
+            return 0.0
+        try:
+            _, lost = cast_column(column, target_type)
+        except (TypeError, ValueError, OverflowError):
+            return 1.0
+        return lost / present
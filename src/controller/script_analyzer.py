@@ -0,0 +1,616 @@
+"""
+Script Analyzer module
+--------------------
+Works out which columns a generated script reads and writes
+"""
+
+import ast
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+
+# Name the sandbox binds the spreadsheet to
+FRAME_NAME = 'df'
+
+# DataFrame methods that modify the frame without an inplace=True argument
+_MUTATING_METHODS = {'insert', 'pop', 'update', '__setitem__', '__delitem__'}
+
+# Methods that return a frame with different rows than the original
+_ROW_CHANGING_METHODS = {
+    'sort_values', 'sort_index', 'drop', 'dropna', 'drop_duplicates', 'head', 'tail', 'sample',
+    'query', 'reset_index', 'set_index', 'explode', 'melt', 'pivot', 'pivot_table', 'stack',
+    'unstack', 'groupby', 'merge', 'join', 'nlargest', 'nsmallest', 'reindex', 'transpose', 'T',
+    'truncate', 'loc', 'iloc'
+}
+
+# Methods and attributes that act on each row or element independently. A
+# script whose frame-derived values only go through these is row-local:
+# running it on slices of rows and concatenating gives the same result.
+_ROW_LOCAL_METHODS = {
+    # Series / DataFrame
+    'apply', 'map', 'applymap', 'astype', 'round', 'abs', 'clip', 'fillna', 'isna', 'isnull',
+    'notna', 'notnull', 'isin', 'between', 'where', 'mask', 'replace', 'copy', 'to_numpy',
+    'add', 'sub', 'mul', 'div', 'truediv', 'floordiv', 'mod', 'pow', 'radd', 'rsub', 'rmul',
+    'rdiv', 'rtruediv', 'rfloordiv', 'rmod', 'rpow', 'eq', 'ne', 'lt', 'le', 'gt', 'ge',
+    'combine_first',
+    # .str accessor
+    'lower', 'upper', 'title', 'capitalize', 'casefold', 'swapcase', 'strip', 'lstrip', 'rstrip',
+    'split', 'rsplit', 'partition', 'rpartition', 'contains', 'startswith', 'endswith',
+    'len', 'slice', 'slice_replace', 'pad', 'center', 'ljust', 'rjust', 'zfill', 'extract',
+    'find', 'rfind', 'findall', 'match', 'fullmatch', 'join', 'normalize', 'wrap',
+    'removeprefix', 'removesuffix', 'translate', 'encode', 'decode', 'isdigit', 'isnumeric',
+    'isdecimal', 'isalpha', 'isalnum', 'isspace', 'islower', 'isupper', 'istitle',
+    # .dt accessor
+    'strftime', 'floor', 'ceil', 'tz_localize', 'tz_convert', 'total_seconds', 'day_name',
+    'month_name', 'to_period', 'to_pydatetime', 'isocalendar',
+}
+# Allowlisted methods that may take other frame-derived values as arguments: they align
+# them by index, row for row. Any other method given one (isin(df['B']), map(df['B']),
+# replace(df['B'], ...)) looks values up across rows, which a chunk only partly holds.
+_ALIGNED_METHODS = {
+    'add', 'sub', 'mul', 'div', 'truediv', 'floordiv', 'mod', 'pow', 'radd', 'rsub', 'rmul',
+    'rdiv', 'rtruediv', 'rfloordiv', 'rmod', 'rpow', 'eq', 'ne', 'lt', 'le', 'gt', 'ge',
+    'where', 'mask', 'fillna', 'combine_first',
+}
+_ROW_LOCAL_ATTRIBUTES = {
+    'str', 'dt', 'values', 'index',
+    'year', 'month', 'day', 'hour', 'minute', 'second', 'microsecond', 'date', 'time',
+    'weekday', 'dayofweek', 'day_of_week', 'dayofyear', 'day_of_year', 'quarter',
+    'days', 'seconds', 'is_month_start', 'is_month_end', 'is_year_start', 'is_year_end',
+    'is_leap_year', 'days_in_month',
+}
+# Module functions that work element by element
+_ROW_LOCAL_FUNCTIONS = {
+    'pd': {'to_numeric', 'to_timedelta', 'isna', 'isnull', 'notna', 'notnull'},
+    'np': {
+        'where', 'select', 'round', 'around', 'abs', 'absolute', 'sqrt', 'log', 'log10', 'log2',
+        'log1p', 'exp', 'expm1', 'floor', 'ceil', 'trunc', 'rint', 'clip', 'maximum', 'minimum',
+        'fmax', 'fmin', 'isnan', 'isfinite', 'isinf', 'sign', 'power', 'mod', 'nan_to_num',
+        'sin', 'cos', 'tan', 'isin', 'logical_and', 'logical_or', 'logical_not',
+    },
+}
+_ROW_LOCAL_FUNCTIONS['pandas'] = _ROW_LOCAL_FUNCTIONS['pd']
+_ROW_LOCAL_FUNCTIONS['numpy'] = _ROW_LOCAL_FUNCTIONS['np']
+
+# A column reference: ('name', label), ('position', k) or ('positions', start, stop, step)
+ColumnRef = Tuple[Any, ...]
+
+
+class ScriptAnalysis:
+    """
+    Columns a script reads and writes, as far as static analysis can tell
+
+    The analysis is conclusive only when every use of `df` in the script is
+    a column access with a literal key (df['X'], df[['X', 'Y']],
+    df.loc[rows, 'X'], df.iloc[:, k], df.at / df.iat), a whole-frame read
+    (df.apply(...), df.sum(), df[mask], ...), len(df) or df.index. Anything
+    that can rebind, alias or restructure df makes it inconclusive.
+    """
+
+    def __init__(self, conclusive: bool, reads: Set[ColumnRef], writes: Set[ColumnRef],
+                 reads_all: bool = False, changes_rows: bool = False, reason: Optional[str] = None,
+                 row_local: bool = False):
+        """
+        Initialize the analysis
+
+        Args:
+            conclusive: Whether reads/writes cover everything the script touches
+            reads: Columns the script reads by literal reference
+            writes: Columns the script assigns to
+            reads_all: Whether the script reads the frame as a whole
+            changes_rows: Whether the script may reorder, filter or add rows
+            reason: Why the analysis is inconclusive, for logging
+            row_local: Whether each output row depends only on the same input
+                row, so the script can run on row chunks independently
+        """
+        self.conclusive = conclusive
+        self.reads = reads
+        self.writes = writes
+        self.reads_all = reads_all
+        self.changes_rows = changes_rows
+        self.reason = reason
+        self.row_local = row_local
+
+    @property
+    def positional(self) -> bool:
+        """Whether any column is referenced by position"""
+        return any(ref[0] != 'name' for ref in self.reads | self.writes)
+
+    def resolve(self, columns: pd.Index) -> Optional['ColumnScope']:
+        """
+        Map the referenced columns onto a frame's columns
+
+        Args:
+            columns: Columns of the frame the script will run on
+
+        Returns:
+            Optional[ColumnScope]: The columns to ship and diff, or None when
+            the full path must be used
+        """
+        if not self.conclusive or self.changes_rows or not columns.is_unique:
+            return None
+
+        read_positions: Set[int] = set()
+        write_positions: Set[int] = set()
+        new_names: List[Hashable] = []
+        for refs, positions in ((self.reads, read_positions), (self.writes, write_positions)):
+            for ref in refs:
+                if ref[0] == 'name':
+                    if ref[1] in columns:
+                        positions.add(columns.get_loc(ref[1]))
+                    elif positions is write_positions:
+                        new_names.append(ref[1])
+                    continue
+                resolved = _resolve_positions(ref, len(columns))
+                if resolved is None:
+                    return None
+                positions.update(resolved)
+
+        return ColumnScope(
+            None if self.reads_all else sorted(read_positions),
+            sorted(write_positions),
+            new_names,
+            self.positional
+        )
+
+
+class ColumnScope:
+    """
+    The columns of a particular frame a script touches
+    """
+
+    def __init__(self, read_positions: Optional[List[int]], write_positions: List[int],
+                 new_names: List[Hashable], positional: bool):
+        """
+        Initialize the scope
+
+        Args:
+            read_positions: Existing columns the script reads (None for all)
+            write_positions: Existing columns the script may overwrite
+            new_names: Names of columns the script may add
+            positional: Whether the script refers to columns by position
+        """
+        self.read_positions = read_positions
+        self.write_positions = write_positions
+        self.new_names = new_names
+        self.positional = positional
+
+    @property
+    def subset_positions(self) -> Optional[List[int]]:
+        """
+        Columns the script needs to see, or None when it needs the whole frame
+
+        Positional references only stay valid on the full frame.
+        """
+        if self.read_positions is None or self.positional:
+            return None
+        return sorted(set(self.read_positions) | set(self.write_positions))
+
+    def merge(self, orig_df: pd.DataFrame, result: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """
+        Put the written columns of a script run on a column subset back into the full frame
+
+        Args:
+            orig_df: The full original frame
+            result: The frame the script produced from the subset
+
+        Returns:
+            Optional[pd.DataFrame]: The full modified frame, or None when the
+            result does not have the layout the analysis predicted
+        """
+        if not isinstance(result, pd.DataFrame) or not result.index.equals(orig_df.index):
+            return None
+        subset_names = [orig_df.columns[position] for position in self.subset_positions]
+        expected = subset_names + [name for name in result.columns if name not in subset_names]
+        if list(result.columns) != expected or not set(expected[len(subset_names):]) <= set(self.new_names):
+            return None
+
+        merged = orig_df.copy(deep=False)
+        for position in self.write_positions:
+            merged.isetitem(position, result[orig_df.columns[position]])
+        for name in expected[len(subset_names):]:
+            merged[name] = result[name]
+        return merged
+
+    def diff_positions(self, orig_df: pd.DataFrame, new_df: pd.DataFrame) -> Optional[List[int]]:
+        """
+        Columns of the modified frame that can differ from the original
+
+        Args:
+            orig_df: The original frame
+            new_df: The modified frame (index reset)
+
+        Returns:
+            Optional[List[int]]: Positions in new_df to compare, or None when
+            the layout changed unexpectedly and the whole frame must be diffed
+        """
+        width = orig_df.shape[1]
+        if len(new_df) != len(orig_df) or not new_df.columns[:width].equals(orig_df.columns):
+            return None
+        added = list(new_df.columns[width:])
+        if not set(added) <= set(self.new_names):
+            return None
+        return self.write_positions + list(range(width, new_df.shape[1]))
+
+
+class ScriptAnalyzer:
+    """
+    Static read/write-set analysis of generated scripts
+    """
+
+    def analyze(self, script: str) -> ScriptAnalysis:
+        """
+        Analyze which columns a script reads and writes
+
+        Args:
+            script: The Python script to analyze
+
+        Returns:
+            ScriptAnalysis: The analysis; inconclusive when the script cannot be parsed
+        """
+        try:
+            tree = ast.parse(script)
+        except SyntaxError:
+            return ScriptAnalysis(False, set(), set(), reason="syntax error")
+        return self.analyze_tree(tree)
+
+    def analyze_tree(self, tree: ast.AST) -> ScriptAnalysis:
+        """
+        Analyze an already parsed script
+
+        Args:
+            tree: The parsed script
+
+        Returns:
+            ScriptAnalysis: The analysis
+        """
+        usage = _FrameUsage(tree)
+        analysis = usage.analysis()
+        if analysis.conclusive:
+            analysis.row_local = _RowLocality(tree, usage.parents).check()
+        return analysis
+
+
+class _FrameUsage:
+    """Classifies every occurrence of the frame name in a parsed script"""
+
+    def __init__(self, tree: ast.AST):
+        self.tree = tree
+        self.parents: Dict[ast.AST, ast.AST] = {}
+        for node in ast.walk(tree):
+            for child in ast.iter_child_nodes(node):
+                self.parents[child] = node
+        self.reads: Set[ColumnRef] = set()
+        self.writes: Set[ColumnRef] = set()
+        self.reads_all = False
+        self.changes_rows = False
+
+    def analysis(self) -> ScriptAnalysis:
+        """Classify every use of df, stopping at the first one that cannot be scoped"""
+        for node in ast.walk(self.tree):
+            if isinstance(node, ast.Call) and _has_inplace(node):
+                return self._inconclusive("inplace=True call")
+            if isinstance(node, ast.Name) and node.id == FRAME_NAME:
+                reason = self._classify(node)
+                if reason:
+                    return self._inconclusive(reason)
+            elif isinstance(node, (ast.FunctionDef, ast.Lambda, ast.AsyncFunctionDef)):
+                if FRAME_NAME in _parameter_names(node):
+                    return self._inconclusive("df shadowed by a parameter")
+        return ScriptAnalysis(True, self.reads, self.writes, self.reads_all, self.changes_rows)
+
+    def _inconclusive(self, reason: str) -> ScriptAnalysis:
+        return ScriptAnalysis(False, self.reads, self.writes, self.reads_all, self.changes_rows, reason)
+
+    def _classify(self, name: ast.Name) -> Optional[str]:
+        """Record the columns one occurrence of df touches; return a reason if it cannot be scoped"""
+        if not isinstance(name.ctx, ast.Load):
+            if _is_row_changing(self._assigned_value(name)):
+                self.changes_rows = True
+            return "df is reassigned"
+
+        parent = self.parents.get(name)
+        if isinstance(parent, ast.Subscript) and parent.value is name:
+            return self._classify_subscript(parent)
+        if isinstance(parent, ast.Attribute) and parent.value is name:
+            return self._classify_attribute(parent)
+        if isinstance(parent, ast.Call) and name in parent.args and _is_name(parent.func, 'len'):
+            return None
+        return "df is used as a value"
+
+    def _classify_subscript(self, node: ast.Subscript) -> Optional[str]:
+        """df[...]"""
+        labels = _literal_labels(node.slice)
+        if labels is None:
+            if isinstance(node.ctx, ast.Load):
+                # Boolean mask or computed key: a read of some derived frame
+                self.reads_all = True
+                return None
+            return "non-literal column assignment"
+        return self._record(node, [('name', label) for label in labels])
+
+    def _classify_attribute(self, node: ast.Attribute) -> Optional[str]:
+        """df.<attr>"""
+        parent = self.parents.get(node)
+        if node.attr in ('loc', 'iloc', 'at', 'iat'):
+            if not (isinstance(parent, ast.Subscript) and parent.value is node):
+                return f"df.{node.attr} used without indexing"
+            return self._classify_indexer(node.attr, parent)
+        if not isinstance(node.ctx, ast.Load):
+            return f"df.{node.attr} is assigned"
+        if node.attr == 'index':
+            return None
+        if isinstance(parent, ast.Call) and parent.func is node:
+            if node.attr in _MUTATING_METHODS:
+                return f"df.{node.attr}() modifies df"
+            self.reads_all = True
+            return None
+        if not hasattr(pd.DataFrame, node.attr):
+            # Attribute-style column access, e.g. df.Price
+            self.reads.add(('name', node.attr))
+            return None
+        if node.attr in ('columns', 'shape', 'dtypes', 'values', 'axes', 'size', 'ndim'):
+            # Depends on the full column layout
+            return f"df.{node.attr} is read"
+        self.reads_all = True
+        return None
+
+    def _classify_indexer(self, indexer: str, node: ast.Subscript) -> Optional[str]:
+        """df.loc[...], df.iloc[...], df.at[...], df.iat[...]"""
+        key = node.slice
+        if not (isinstance(key, ast.Tuple) and len(key.elts) == 2):
+            # Row-only indexing touches every column
+            if isinstance(node.ctx, ast.Load):
+                self.reads_all = True
+                return None
+            return f"row assignment through df.{indexer}"
+        column_key = key.elts[1]
+        if indexer in ('iloc', 'iat'):
+            refs = _literal_positions(column_key)
+        else:
+            labels = _literal_labels(column_key)
+            refs = None if labels is None else [('name', label) for label in labels]
+        if refs is None:
+            if isinstance(node.ctx, ast.Load):
+                self.reads_all = True
+                return None
+            return f"non-literal column key in df.{indexer}"
+        return self._record(node, refs)
+
+    def _record(self, node: ast.Subscript, refs: List[ColumnRef]) -> Optional[str]:
+        """Record column references as reads or writes depending on the subscript context"""
+        if isinstance(node.ctx, ast.Del):
+            return "column deleted"
+        if isinstance(node.ctx, ast.Store):
+            self.writes.update(refs)
+            if isinstance(self.parents.get(node), ast.AugAssign):
+                self.reads.update(refs)
+        else:
+            self.reads.update(refs)
+        return None
+
+    def _assigned_value(self, name: ast.Name) -> Optional[ast.AST]:
+        """The value assigned to df by a plain assignment, if any"""
+        parent = self.parents.get(name)
+        if isinstance(parent, (ast.Assign, ast.AnnAssign)):
+            return parent.value
+        return None
+
+
+class _RowLocality:
+    """
+    Decides whether a script only combines values within a row
+
+    Values derived from df (df itself and names assigned from expressions
+    that mention it) may only pass through allowlisted element-wise methods,
+    only index-aligned ones may take other frame-derived values as arguments,
+    and callbacks (lambdas, local functions) may not see df at all. Sorting,
+    grouping, shifting, aggregates, positional row access and loops over
+    rows all fall outside the allowlist.
+    """
+
+    def __init__(self, tree: ast.AST, parents: Dict[ast.AST, ast.AST]):
+        self.tree = tree
+        self.parents = parents
+        self.derived = {FRAME_NAME}
+        self.functions: Dict[str, ast.AST] = {}
+
+    def check(self) -> bool:
+        for node in ast.walk(self.tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                self.functions[node.name] = node
+        # Names assigned from frame-derived values, to a fixed point
+        assignments = [node for node in ast.walk(self.tree) if isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign))]
+        changed = True
+        while changed:
+            changed = False
+            for node in assignments:
+                if node.value is None or not self._mentions_frame(node.value):
+                    continue
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                for target in targets:
+                    for name in ast.walk(target):
+                        if isinstance(name, ast.Name) and name.id not in self.derived:
+                            self.derived.add(name.id)
+                            changed = True
+        return self._local(self.tree)
+
+    def _mentions_frame(self, node: ast.AST) -> bool:
+        return any(isinstance(child, ast.Name) and child.id in self.derived for child in ast.walk(node))
+
+    def _local(self, node: ast.AST) -> bool:
+        """Check a node and its children"""
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            # Callbacks see a single element or row; they must not reach the frame
+            body = node.body if isinstance(node.body, list) else [node.body]
+            return not any(self._mentions_frame(statement) for statement in body)
+        if isinstance(node, (ast.For, ast.AsyncFor, ast.While, ast.comprehension)):
+            if self._mentions_frame(node.iter if not isinstance(node, ast.While) else node.test):
+                return False
+        if isinstance(node, ast.Call) and not self._local_call(node):
+            return False
+        if isinstance(node, ast.Attribute) and not self._local_attribute(node):
+            return False
+        if isinstance(node, ast.Subscript) and not self._local_subscript(node):
+            return False
+        return all(self._local(child) for child in ast.iter_child_nodes(node))
+
+    def _local_call(self, node: ast.Call) -> bool:
+        arguments = list(node.args) + [keyword.value for keyword in node.keywords]
+        func = node.func
+        if isinstance(func, ast.Name):
+            # Builtins and local functions called directly on frame values see whole columns
+            return not any(self._mentions_frame(argument) for argument in arguments)
+        if not isinstance(func, ast.Attribute):
+            return not self._mentions_frame(node)
+        if isinstance(func.value, ast.Name) and func.value.id in _ROW_LOCAL_FUNCTIONS:
+            if not any(self._mentions_frame(argument) for argument in arguments):
+                return True
+            if func.value.id in ('pd', 'pandas') and func.attr == 'to_datetime':
+                # Without an explicit format, each chunk would infer its own
+                return any(keyword.arg == 'format' for keyword in node.keywords)
+            if func.attr == 'isin' and any(self._mentions_frame(argument) for argument in arguments[1:]):
+                # np.isin(df['A'], df['B']) tests against the whole column
+                return False
+            return func.attr in _ROW_LOCAL_FUNCTIONS[func.value.id]
+        if not self._mentions_frame(func.value):
+            # Method of a value unrelated to the frame, e.g. a dict lookup
+            return not any(self._mentions_frame(argument) for argument in arguments)
+        if func.attr not in _ROW_LOCAL_METHODS:
+            return False
+        if func.attr not in _ALIGNED_METHODS and any(self._mentions_frame(argument) for argument in arguments):
+            return False
+        keywords = {keyword.arg: keyword.value for keyword in node.keywords}
+        if func.attr == 'fillna' and ('method' in keywords or 'limit' in keywords):
+            return False
+        if func.attr == 'apply' and _is_name(func.value, FRAME_NAME):
+            # df.apply runs per column unless axis=1
+            axis = keywords.get('axis')
+            if not (isinstance(axis, ast.Constant) and axis.value in (1, 'columns')):
+                return False
+        # Named callbacks are checked like lambdas
+        for argument in arguments:
+            if isinstance(argument, ast.Name) and argument.id in self.functions:
+                if not self._local(self.functions[argument.id]):
+                    return False
+        return True
+
+    def _local_attribute(self, node: ast.Attribute) -> bool:
+        if not self._mentions_frame(node.value) or node.attr in _ROW_LOCAL_METHODS:
+            return True
+        if node.attr in ('loc', 'iloc'):
+            return True  # checked with the subscript
+        if _is_name(node.value, FRAME_NAME) and not hasattr(pd.DataFrame, node.attr):
+            return True  # df.Price
+        return node.attr in _ROW_LOCAL_ATTRIBUTES
+
+    def _local_subscript(self, node: ast.Subscript) -> bool:
+        value = node.value
+        if not self._mentions_frame(value):
+            return True
+        if _is_name(value, FRAME_NAME):
+            return _literal_labels(node.slice) is not None
+        if isinstance(value, ast.Attribute) and value.attr == 'str':
+            return True  # df['X'].str[0]
+        if isinstance(value, ast.Attribute) and _is_name(value.value, FRAME_NAME) and value.attr in ('loc', 'iloc'):
+            key = node.slice
+            rows = key.elts[0] if isinstance(key, ast.Tuple) and len(key.elts) == 2 else None
+            if rows is None:
+                return False
+            if _is_full_slice(rows):
+                return True
+            # A boolean mask built from the frame lines up with every chunk
+            return value.attr == 'loc' and not isinstance(rows, (ast.Slice, ast.Constant, ast.List, ast.Name)) \
+                and self._mentions_frame(rows)
+        return False
+
+
+def _is_full_slice(node: ast.AST) -> bool:
+    return isinstance(node, ast.Slice) and node.lower is None and node.upper is None and node.step is None
+
+
+def _is_name(node: ast.AST, name: str) -> bool:
+    return isinstance(node, ast.Name) and node.id == name
+
+
+def _has_inplace(call: ast.Call) -> bool:
+    """True if a call passes inplace= anything other than a literal False"""
+    for keyword in call.keywords:
+        if keyword.arg == 'inplace':
+            return not (isinstance(keyword.value, ast.Constant) and keyword.value.value is False)
+        if keyword.arg is None:
+            return True  # **kwargs may carry inplace=True
+    return False
+
+
+def _parameter_names(node: ast.AST) -> Set[str]:
+    arguments = node.args
+    names = {arg.arg for arg in arguments.posonlyargs + arguments.args + arguments.kwonlyargs}
+    names.update(arg.arg for arg in (arguments.vararg, arguments.kwarg) if arg is not None)
+    return names
+
+
+def _literal(node: ast.AST) -> Tuple[bool, Any]:
+    """Evaluate a literal column label (constants, including negative numbers)"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (str, int, float, bool)):
+        return True, node.value
+    if (isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub)
+            and isinstance(node.operand, ast.Constant) and isinstance(node.operand.value, (int, float))):
+        return True, -node.operand.value
+    return False, None
+
+
+def _literal_labels(node: ast.AST) -> Optional[List[Hashable]]:
+    """Labels of a literal column key: 'X' or ['X', 'Y']"""
+    found, value = _literal(node)
+    if found:
+        return [value]
+    if isinstance(node, ast.List):
+        labels = [_literal(element) for element in node.elts]
+        if all(found for found, _ in labels):
+            return [value for _, value in labels]
+    return None
+
+
+def _literal_positions(node: ast.AST) -> Optional[List[ColumnRef]]:
+    """Positions of a literal iloc column key: k, [j, k] or a slice of literals"""
+    if isinstance(node, ast.Slice):
+        bounds = []
+        for bound in (node.lower, node.upper, node.step):
+            if bound is None:
+                bounds.append(None)
+                continue
+            found, value = _literal(bound)
+            if not found or not isinstance(value, int) or isinstance(value, bool):
+                return None
+            bounds.append(value)
+        return [('positions', *bounds)]
+    labels = _literal_labels(node)
+    if labels is None or not all(isinstance(label, int) and not isinstance(label, bool) for label in labels):
+        return None
+    return [('position', label) for label in labels]
+
+
+def _resolve_positions(ref: ColumnRef, width: int) -> Optional[Iterable[int]]:
+    """Turn a positional reference into column positions, or None if out of range"""
+    if ref[0] == 'positions':
+        return range(*slice(*ref[1:]).indices(width))
+    position = ref[1]
+    if not -width <= position < width:
+        return None
+    return [position % width]
+
+
+def _is_row_changing(value: Optional[ast.AST]) -> bool:
+    """Whether an expression assigned to df produces a frame with different rows"""
+    while isinstance(value, (ast.Call, ast.Attribute, ast.Subscript)):
+        if isinstance(value, ast.Call):
+            value = value.func
+            continue
+        if isinstance(value, ast.Attribute) and value.attr in _ROW_CHANGING_METHODS:
+            return True
+        if isinstance(value, ast.Subscript) and _literal_labels(value.slice) is None:
+            return True
+        value = value.value
+    return False
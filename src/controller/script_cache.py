@@ -0,0 +1,132 @@
+"""
+Script Cache module
+------------------
+Caches the security verdict, compiled code and column analysis of generated scripts
+"""
+
+import ast
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from src.controller.security_manager import SecurityManager
+from src.controller.script_analyzer import ScriptAnalyzer, ScriptAnalysis
+from src.controller.script_sandbox import SCRIPT_FILENAME, format_script_error, script_digest
+from src.controller.sql_engine import is_sql_script, sql_body
+
+
+class CompiledScript:
+    """
+    Everything derived from a script's source before it runs
+    """
+
+    def __init__(self, digest: str, safe: bool, code: Any = None, syntax_error: Optional[str] = None,
+                 analysis: Optional[ScriptAnalysis] = None, query: Optional[str] = None):
+        """
+        Initialize a compiled script
+
+        Args:
+            digest: SHA-256 of the source
+            safe: Whether the script passed security validation
+            code: Code object compiled with SCRIPT_FILENAME (None if it does not compile)
+            syntax_error: Failing line and message when the script does not parse
+            analysis: Columns the script reads and writes
+            query: The SQL query, for scripts in the SQL execution mode
+        """
+        self.digest = digest
+        self.safe = safe
+        self.code = code
+        self.syntax_error = syntax_error
+        self.analysis = analysis or ScriptAnalysis(False, set(), set(), reason="not analyzed")
+        self.query = query
+
+    @property
+    def is_sql(self) -> bool:
+        """Whether the script is a SQL query rather than Python"""
+        return self.query is not None
+
+
+class ScriptCache:
+    """
+    LRU cache of compiled scripts keyed by source hash
+
+    A miss parses the script once and shares the tree between security
+    validation, column analysis and compilation; a hit (a repeated, replayed
+    or batch-applied script) skips all three.
+    """
+
+    def __init__(self, security_manager: SecurityManager, analyzer: ScriptAnalyzer, max_entries: int = 256):
+        """
+        Initialize the cache
+
+        Args:
+            security_manager: Validates scripts on a miss
+            analyzer: Analyzes column usage on a miss
+            max_entries: Number of scripts kept
+        """
+        self.security_manager = security_manager
+        self.analyzer = analyzer
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, CompiledScript]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, script: str) -> CompiledScript:
+        """
+        Get a script's verdict, code and analysis, computing them on first sight
+
+        Args:
+            script: The script source
+
+        Returns:
+            CompiledScript: The cached entry
+        """
+        digest = script_digest(script)
+        with self._lock:
+            entry = self.entries.get(digest)
+            if entry is not None:
+                self.entries.move_to_end(digest)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = self._compile(digest, script)
+        with self._lock:
+            self.entries[digest] = entry
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get cache counters
+
+        Returns:
+            Dict[str, int]: Entries, hits and misses
+        """
+        with self._lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+    def _compile(self, digest: str, script: str) -> CompiledScript:
+        """Parse, validate, analyze and compile a script"""
+        if is_sql_script(script):
+            query = sql_body(script)
+            return CompiledScript(digest, self.security_manager.validate_sql(query), query=query)
+
+        try:
+            tree = ast.parse(script, SCRIPT_FILENAME)
+        except SyntaxError:
+            syntax_error = format_script_error(script)
+            # Logs the rejection; unparsable scripts are never considered safe
+            self.security_manager.validate_script(script)
+            return CompiledScript(digest, False, syntax_error=syntax_error)
+
+        safe = self.security_manager.validate_tree(tree, script)
+        try:
+            code = compile(tree, SCRIPT_FILENAME, 'exec')
+        except SyntaxError:
+            # Errors only the compiler sees, e.g. 'return' outside a function
+            return CompiledScript(digest, safe, syntax_error=format_script_error(script))
+        return CompiledScript(digest, safe, code, analysis=self.analyzer.analyze_tree(tree))
@@ -5,102 +5,343 @@ Safely executes Python scripts generated by the LLM
 """
 
 import os
-import pandas as pd
+import ast
+import logging
+import threading
+import concurrent.futures
 import numpy as np
-import json
-from typing import Tuple, List, Dict, Any, Optional, Hashable
+import pandas as pd
+from typing import Tuple, List, Dict, Any, Optional
 from src.controller.security_manager import SecurityManager
+from src.controller.script_analyzer import ScriptAnalyzer, ColumnScope
+from src.controller.script_cache import ScriptCache
+from src.controller.sql_engine import SQLEngine
+from src.controller import script_sandbox
+from src.controller.cell_diff import diff_frames
+from src.model.modified_cells import ModifiedCells
+from src.controller.execution_pool import ScriptExecutionPool, ScriptExecutionError, ScriptCancelledError, ScriptTimeoutError
 from src.controller.script_manager import ScriptManager
-from src.controller.file_manager import FileManager
+from src.controller.artifact_log import ArtifactLog
 from src.controller.schema_generator import SchemaGenerator
+from src.controller.data_sampler import DataSampler
 
 class ScriptExecutor:
     """
     Executes Python scripts generated by the LLM on spreadsheet data
     """
+
+    # Filename given to compiled scripts so tracebacks can be traced back to them
+    SCRIPT_FILENAME = script_sandbox.SCRIPT_FILENAME
     
-    def __init__(self, script_dir: Optional[str] = None):
+    def __init__(self, script_dir: Optional[str] = None, artifact_log: Optional[ArtifactLog] = None):
         """
         Initialize the script executor
         
         Args:
             script_dir: Optional directory path for saving scripts
+            artifact_log: Optional log that executed scripts are recorded in
         """
         self.security_manager = SecurityManager()
+        self.script_analyzer = ScriptAnalyzer()
+        # Validated, compiled scripts keyed by source hash
+        self.script_cache = ScriptCache(self.security_manager, self.script_analyzer,
+                                        int(os.getenv('SCRIPT_CACHE_SIZE', '256')))
         self.script_dir = script_dir or os.path.join('src', 'script')
         self.script_manager = ScriptManager(self.script_dir)
-        self.schema_generator = SchemaGenerator()
+        self.artifact_log = artifact_log
+        # Schema types are inferred from at most this many rows (0 = all rows)
+        self.schema_generator = SchemaGenerator(sample_rows=int(os.getenv('SCHEMA_SAMPLE_ROWS', '100000')))
+        self.data_sampler = DataSampler()
+        self.dry_run_rows = int(os.getenv('SCRIPT_DRY_RUN_ROWS', '200'))
+        # 'process' runs scripts on isolated worker processes, 'inline' inside the API process
+        self.execution_mode = os.getenv('SCRIPT_EXECUTION_MODE', 'process').lower()
+        self.worker_count = int(os.getenv('SCRIPT_WORKERS', str(min(os.cpu_count() or 1, 4))))
+        self.timeout = float(os.getenv('SCRIPT_TIMEOUT_SECONDS', '120'))
+        self.dry_run_timeout = float(os.getenv('SCRIPT_DRY_RUN_TIMEOUT_SECONDS', '10'))
+        self.memory_limit_mb = int(os.getenv('SCRIPT_MEMORY_LIMIT_MB', '4096'))
+        # Row-local scripts on at least this many rows are split across the workers
+        self.parallel_min_rows = int(os.getenv('PARALLEL_MIN_ROWS', '200000'))
+        self._pool: Optional[ScriptExecutionPool] = None
+        # Scripts starting with '-- sql' run in-process on DuckDB (optional dependency)
+        self.sql_engine = SQLEngine(memory_limit_mb=self.memory_limit_mb)
+        self._pool_lock = threading.Lock()
+        # Sheets are never copied up front: states and script results share
+        # unchanged column buffers, and a column is copied only when modified
+        script_sandbox.enable_copy_on_write()
+
+    def _get_pool(self) -> ScriptExecutionPool:
+        """Start the worker pool on first use"""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ScriptExecutionPool(
+                    size=self.worker_count,
+                    timeout=self.timeout,
+                    memory_limit_mb=self.memory_limit_mb
+                )
+            return self._pool
+
+    def _run(self, script: str, df: pd.DataFrame, timeout: float,
+             cancel_event: Optional[threading.Event] = None) -> pd.DataFrame:
+        """
+        Run a script against a DataFrame in the configured execution mode
+
+        Args:
+            script: The Python script to run
+            df: The DataFrame exposed to the script as 'df'
+            timeout: Wall-clock timeout in seconds (process mode only)
+            cancel_event: Event that cancels the script when set (process mode only)
+
+        Returns:
+            pd.DataFrame: The value of 'df' after the script ran
+
+        Raises:
+            ScriptExecutionError: If the script failed, timed out or was cancelled
+        """
+        compiled = self.script_cache.get(script)
+        if compiled.is_sql:
+            return self.sql_engine.execute(compiled.query, df, timeout, cancel_event)
+        if compiled.code is None:
+            raise ScriptExecutionError(compiled.syntax_error.splitlines()[-1], 'SyntaxError', compiled.syntax_error)
+        if self.execution_mode == 'inline':
+            try:
+                # Copy-on-write keeps df intact, so the sandbox only needs a shallow copy
+                return script_sandbox.run_script(compiled.code, df, deep_copy=False)
+            except Exception as e:
+                raise ScriptExecutionError(str(e), type(e).__name__, script_sandbox.format_script_error(script))
+        return self._get_pool().run(script, df, timeout=timeout, cancel_event=cancel_event, digest=compiled.digest)
+
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
     
-    def execute_script(self, script: str, spreadsheet_df: pd.DataFrame, file_manager: Optional[FileManager] = None) -> Tuple[pd.DataFrame, List[List[int]]]:
+    def execute_script(self, script: str, spreadsheet_df: pd.DataFrame,
+                       cancel_event: Optional[threading.Event] = None) -> Tuple[pd.DataFrame, ModifiedCells]:
         """
         Execute a Python script on spreadsheet data
 
         Args:
             script: The Python script generated by LLM
             spreadsheet_df: The pandas DataFrame containing spreadsheet data
-            file_manager: Optional FileManager to save script for reference
+            cancel_event: Optional event that cancels the script when set
 
         Returns:
-            Tuple[pd.DataFrame, List[List[int]]]: Modified DataFrame and list of modified cells
+            Tuple[pd.DataFrame, ModifiedCells]: Modified DataFrame and the modified cells
         """
-        # Validate script for security
-        if not self.security_manager.validate_script(script):
+        # Validate script for security (cached per script hash along with the compiled code)
+        compiled = self.script_cache.get(script)
+        if not compiled.safe:
             raise ValueError(f"Script validation failed due to security concerns. See server logs for details.")
-              # Create a unique ID for this script
-        import uuid
-        script_id = str(uuid.uuid4())[:8]
-        
-        # Save script to src/script directory
-        script_dir = self.script_dir
-        os.makedirs(script_dir, exist_ok=True)
-        script_path = os.path.join(script_dir, f"script_{script_id}.py")
-        with open(script_path, 'w', encoding='utf-8') as f:
-            f.write(script)
-            
-        # Save script metadata to json directory for reference if file_manager is provided
-        if file_manager:
-            file_manager.save_json_data({
-                'script': script,
-                'script_id': script_id,
+
+        # Record the script for reference; the artifact log writes it in the background
+        if self.artifact_log is not None:
+            self.artifact_log.log_script(compiled.digest[:12], script, {
+                'digest': compiled.digest,
                 'timestamp': str(pd.Timestamp.now()),
                 'columns': spreadsheet_df.columns.tolist(),
                 'rows': len(spreadsheet_df)
-            }, f"script_{script_id}")
-        
-        # Track original data for determining modifications
-        orig_columns = set(spreadsheet_df.columns)
-        # Ensure keys are str for type compatibility
-        filled_df: pd.DataFrame = spreadsheet_df.copy().fillna(value=np.nan)
-        data_dict: Dict[Hashable, Any] = filled_df.to_dict()
-        orig_values = {str(k): v for k, v in data_dict.items()}
-        
-        # Create a sandbox environment
-        sandbox_globals = self._create_sandbox(spreadsheet_df)
-        
+            })
+
+        # Columns the script touches, when static analysis can tell
+        analysis = compiled.analysis
+        scope = analysis.resolve(spreadsheet_df.columns)
+
         try:
-            # Execute script
-            exec(script, sandbox_globals)
-            
-            # Get the modified dataframe
-            modified_df = sandbox_globals.get('df', spreadsheet_df)
+            # Execute script on a worker and get the modified dataframe
+            modified_df = self._run_scoped(script, spreadsheet_df, scope, analysis.row_local, cancel_event)
             
             # IMPORTANT: Reset the index to ensure consistent row numbering
             # This ensures that after deletions, row indices start from 0 again
             modified_df = modified_df.reset_index(drop=True)
             
-            # Find modified cells
-            modified_cells = self._find_modified_cells(
-                orig_df=spreadsheet_df, 
-                orig_columns=orig_columns,
-                orig_values=orig_values, 
-                new_df=modified_df
-            )
+            # Find modified cells; spreadsheet_df itself is the untouched original
+            positions = scope.diff_positions(spreadsheet_df, modified_df) if scope else None
+            modified_cells = self._find_modified_cells(orig_df=spreadsheet_df, new_df=modified_df, positions=positions)
             
             return modified_df, modified_cells
         except Exception as e:
             # Instead of a generic error, include the actual error message
             raise RuntimeError(f"{str(e)}")
     
+    def _run_scoped(self, script: str, spreadsheet_df: pd.DataFrame, scope: Optional[ColumnScope],
+                    row_local: bool = False, cancel_event: Optional[threading.Event] = None) -> pd.DataFrame:
+        """
+        Run a script on only the columns it uses, when that is known
+
+        Scripts that name their columns literally run on a frame holding just
+        those columns, and the columns they write are put back into the full
+        frame. If the result does not have the predicted layout the script is
+        run again on the full frame.
+
+        Args:
+            script: The Python script to run
+            spreadsheet_df: The full spreadsheet data
+            scope: Columns the script touches, or None if unknown
+            row_local: Whether the script may be run on row chunks in parallel
+            cancel_event: Optional event that cancels the script when set
+
+        Returns:
+            pd.DataFrame: The modified full frame
+        """
+        subset = scope.subset_positions if scope else None
+        if subset is not None and len(subset) < spreadsheet_df.shape[1]:
+            result = self._run_rows(script, spreadsheet_df.iloc[:, subset], row_local, cancel_event)
+            merged = scope.merge(spreadsheet_df, result)
+            if merged is not None:
+                return merged
+            logging.info("Script result did not match its column analysis; re-running on the full frame")
+        return self._run_rows(script, spreadsheet_df, row_local, cancel_event)
+
+    def _run_rows(self, script: str, df: pd.DataFrame, row_local: bool,
+                  cancel_event: Optional[threading.Event] = None) -> pd.DataFrame:
+        """
+        Run a script on the whole frame, split into row chunks when it is row-local and large
+
+        Args:
+            script: The Python script to run
+            df: The DataFrame exposed to the script as 'df'
+            row_local: Whether each output row depends only on the same input row
+            cancel_event: Optional event that cancels the script when set
+
+        Returns:
+            pd.DataFrame: The value of 'df' after the script ran
+        """
+        if (row_local and self.execution_mode != 'inline' and self.worker_count > 1
+                and len(df) >= self.parallel_min_rows):
+            result = self._run_chunked(script, df, cancel_event)
+            if result is not None:
+                return result
+            logging.info("Chunked script results did not line up; re-running on the whole frame")
+        return self._run(script, df, self.timeout, cancel_event)
+
+    def _run_chunked(self, script: str, df: pd.DataFrame,
+                     cancel_event: Optional[threading.Event] = None) -> Optional[pd.DataFrame]:
+        """
+        Run a row-local script on consecutive row chunks, one per worker, and concatenate the results
+
+        Args:
+            script: The Python script to run
+            df: The DataFrame exposed to the script as 'df'
+            cancel_event: Optional event that cancels the script when set
+
+        Returns:
+            Optional[pd.DataFrame]: The combined result, or None when the chunk
+            results disagree on rows, columns or dtypes (e.g. a column inferred
+            as object in one chunk and float in another)
+
+        Raises:
+            ScriptExecutionError: If any chunk failed, timed out or was cancelled
+        """
+        pool = self._get_pool()
+        bounds = np.linspace(0, len(df), self.worker_count + 1).astype(int)
+        chunks = [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+        # Stops the remaining chunks once one fails or the caller cancels
+        abort = threading.Event()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            futures = [executor.submit(pool.run, script, chunk, self.timeout, abort) for chunk in chunks]
+            pending = set(futures)
+            while pending:
+                done, pending = concurrent.futures.wait(pending, timeout=0.1,
+                                                        return_when=concurrent.futures.FIRST_EXCEPTION)
+                if (cancel_event is not None and cancel_event.is_set()) or any(f.exception() for f in done):
+                    abort.set()
+
+        if cancel_event is not None and cancel_event.is_set():
+            raise ScriptCancelledError("Script was cancelled", 'Cancelled')
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        if errors:
+            # Report the failure that caused the abort, not the chunks it cancelled
+            raise next((e for e in errors if not isinstance(e, ScriptCancelledError)), errors[0])
+
+        results = [f.result() for f in futures]
+        first = results[0]
+        for chunk, result in zip(chunks, results):
+            if (not isinstance(result, pd.DataFrame) or not result.index.equals(chunk.index)
+                    or not result.columns.equals(first.columns) or not result.dtypes.equals(first.dtypes)):
+                return None
+        return pd.concat(results)
+
+    def build_sample(self, spreadsheet_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Build the stratified sample used to dry-run scripts
+
+        Args:
+            spreadsheet_df: The full spreadsheet data
+
+        Returns:
+            pd.DataFrame: A small sample of the data
+        """
+        return self.data_sampler.stratified_sample(spreadsheet_df, self.dry_run_rows)
+
+    def dry_run(self, script: str, sample_df: pd.DataFrame, full_row_count: Optional[int] = None,
+                cancel_event: Optional[threading.Event] = None) -> Optional[str]:
+        """
+        Run a script against a small sample to catch errors before touching the full data
+
+        Args:
+            script: The Python script generated by LLM
+            sample_df: Sample produced by build_sample
+            full_row_count: Row count of the full data; when larger than the
+                sample, out-of-range positions and row labels missing from the
+                sample are not treated as failures
+            cancel_event: Optional event that cancels the dry run when set
+
+        Returns:
+            Optional[str]: A short traceback describing the failure, or None if
+            the script ran cleanly
+        """
+        compiled = self.script_cache.get(script)
+        if compiled.syntax_error is not None:
+            return compiled.syntax_error
+
+        if not compiled.safe:
+            return "Script validation failed due to security concerns (forbidden import or call, or inplace=True on a column or selection of df)."
+
+        try:
+            self._run(script, sample_df, self.dry_run_timeout, cancel_event)
+        except ScriptCancelledError:
+            return "Cancelled"
+        except ScriptTimeoutError:
+            return (f"TimeoutError: script did not finish within {self.dry_run_timeout:.0f} seconds "
+                    f"on a sample of {len(sample_df)} rows; use vectorized pandas operations instead of loops")
+        except ScriptExecutionError as e:
+            # Rows beyond the sample may exist in the full data
+            if full_row_count is not None and full_row_count > len(sample_df):
+                if e.error_type == 'IndexError':
+                    return None
+                if e.error_type == 'KeyError' and self._missing_row_label(str(e), sample_df):
+                    return None
+            return e.details
+        return None
+
+    @staticmethod
+    def _missing_row_label(message: str, sample_df: pd.DataFrame) -> bool:
+        """
+        Whether a KeyError message names a row label rather than a column
+
+        The sample keeps the full data's row labels, so a lookup such as
+        df.at[501, 'B'] fails on it although it works on the full data.
+        Missing column names still count as failures.
+        """
+        text = message.strip('\'"')
+        if text.endswith('are in the [index]'):
+            return True
+        if text.endswith(' not in index'):
+            # df.loc[[...]] and df[[...]] both report '[labels] not in index'
+            text = text[:-len(' not in index')]
+        try:
+            key = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            return False
+        keys = key if isinstance(key, list) else [key]
+        # Integer labels of the default row index; string keys are column names
+        return bool(keys) and all(
+            isinstance(label, int) and not isinstance(label, bool) and label not in sample_df.columns for label in keys
+        )
+
     def validate_script_safety(self, script: str) -> bool:
         """
         Validate that a script is safe to execute
@@ -111,74 +352,52 @@ class ScriptExecutor:
         Returns:
             bool: True if the script is safe, False otherwise
         """
-        return self.security_manager.validate_script(script)
-    
-    def _create_sandbox(self, df: pd.DataFrame) -> Dict[str, Any]:
+        return self.script_cache.get(script).safe
+
+    def run_query(self, query: str, df: pd.DataFrame, max_rows: int,
+                  cancel_event: Optional[threading.Event] = None) -> Tuple[pd.DataFrame, bool]:
         """
-        Create a sandbox environment for script execution
+        Run a read-only SQL query against a DataFrame without modifying it
 
         Args:
-            df: The pandas DataFrame to operate on
+            query: SELECT-style query over the table 'df'
+            df: The spreadsheet data
+            max_rows: Maximum number of result rows returned
+            cancel_event: Optional event that cancels the query when set
 
         Returns:
-            Dict[str, Any]: Dictionary of global variables for the sandbox
+            Tuple[pd.DataFrame, bool]: Up to max_rows result rows, and whether
+            the result had more rows than that
+
+        Raises:
+            ValueError: If the query fails security validation
+            ScriptExecutionError: If the query failed, timed out or was cancelled
         """
-        # Create a copy of the dataframe to avoid modifying the original
-        sandbox_df = df.copy()
-        
-        # Define allowed modules and functions
-        sandbox: Dict[str, Any] = {
-            'df': sandbox_df,
-            'pd': pd,
-            'np': np,
-            'print': print
-        }
-        
-        return sandbox
-    
-    def _find_modified_cells(self, orig_df: pd.DataFrame, orig_columns: set[str], orig_values: Dict[str, Any], new_df: pd.DataFrame) -> List[List[int]]:
+        query = query.strip().rstrip(';').strip()
+        if not self.security_manager.validate_sql(query):
+            raise ValueError("Query validation failed due to security concerns (only single read-only queries are allowed)")
+        # One extra row tells whether the result was truncated without materializing all of it
+        limited = f"SELECT * FROM (\n{query}\n) LIMIT {int(max_rows) + 1}"
+        result = self.sql_engine.execute(limited, df, self.timeout, cancel_event)
+        return result.iloc[:max_rows], len(result) > max_rows
+
+    def _find_modified_cells(self, orig_df: pd.DataFrame, new_df: pd.DataFrame,
+                             positions: Optional[List[int]] = None) -> ModifiedCells:
         """
         Find cells that were modified by the script
 
+        Whole columns are compared at once (see cell_diff); columns the script
+        left untouched share their buffer with the original and are skipped.
+
         Args:
             orig_df: Original DataFrame
-            orig_columns: Set of original column names
-            orig_values: Dict of original values
             new_df: Modified DataFrame
+            positions: Columns of new_df the script may have written (None for all)
 
         Returns:
-            List[List[int]]: List of [row, col] coordinates for modified cells
+            ModifiedCells: Changed rows per column of new_df
         """
-        modified_cells: List[List[int]] = []
-        
-        # Check for new columns
-        new_columns = set(new_df.columns) - orig_columns
-        for col_name in new_columns:
-            col_idx = list(new_df.columns).index(col_name)
-            for row_idx in range(len(new_df)):
-                modified_cells.append([row_idx, col_idx])
-        
-        # Check for modified values in existing columns
-        for col_name in orig_columns:
-            if col_name in new_df.columns:
-                col_idx = list(new_df.columns).index(col_name)
-                orig_col_idx = list(orig_df.columns).index(col_name)
-                
-                for row_idx in range(min(len(orig_df), len(new_df))):
-                    # Check for equality considering NaN values
-                    orig_val: Any = orig_df.iat[row_idx, orig_col_idx]
-                    new_val: Any = new_df.iat[row_idx, col_idx]
-                    
-                    if pd.isna(orig_val) and pd.isna(new_val):
-                        continue  # Both NaN, not modified
-                    elif pd.isna(orig_val) or pd.isna(new_val):
-                        # One is NaN and the other isn't, they're different
-                        modified_cells.append([row_idx, col_idx])
-                    elif orig_val != new_val:
-                        # Both are non-NaN but have different values
-                        modified_cells.append([row_idx, col_idx])
-        
-        return modified_cells
+        return diff_frames(orig_df, new_df, positions)
     
     def generate_schema_from_df(self, df: pd.DataFrame) -> Dict[str, Any]:
         """
@@ -192,16 +411,18 @@ class ScriptExecutor:
         """
         return self.schema_generator.generate_schema(df)
     
-    def generate_transformation_script(self, source_df: pd.DataFrame, target_df: pd.DataFrame) -> str:
+    def generate_transformation_script(self, source_df: pd.DataFrame, target_df: pd.DataFrame,
+                                       source_schema: Optional[Dict[str, Any]] = None) -> str:
         """
         Generate a script to transform source_df to match the structure of target_df
         
         Args:
             source_df: The source DataFrame to transform
             target_df: The target DataFrame with the desired structure
+            source_schema: Already computed schema of source_df, if available
             
         Returns:
             str: A prompt for the LLM to generate a transformation script
         """
         target_schema = self.schema_generator.generate_schema(target_df)
-        return self.schema_generator.get_transformation_prompt(source_df, target_schema)
+        return self.schema_generator.get_transformation_prompt(source_df, target_schema, source_schema)
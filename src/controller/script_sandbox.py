@@ -0,0 +1,110 @@
+"""
+Script Sandbox module
+------------------
+Runs generated scripts against a DataFrame; shared by in-process and worker execution
+"""
+
+import sys
+import hashlib
+import traceback
+from typing import Dict, Any
+
+import numpy as np
+import pandas as pd
+
+
+# Filename given to compiled scripts so tracebacks can be traced back to them
+SCRIPT_FILENAME = '<generated_script>'
+
+
+def script_digest(script: str) -> str:
+    """
+    Key a script by its content (used by the compiled-code caches)
+
+    Args:
+        script: The script source
+
+    Returns:
+        str: Hex SHA-256 of the source
+    """
+    return hashlib.sha256(script.encode('utf-8')).hexdigest()
+
+
+def enable_copy_on_write() -> None:
+    """
+    Turn on pandas copy-on-write (always on from pandas 3.0)
+
+    With copy-on-write, a shallow copy shares column buffers with the
+    original until a column is modified, and only that column is copied.
+    """
+    if int(pd.__version__.split('.')[0]) < 3:
+        pd.set_option('mode.copy_on_write', True)
+
+
+def create_sandbox(df: pd.DataFrame, deep_copy: bool = True) -> Dict[str, Any]:
+    """
+    Create a sandbox environment for script execution
+
+    Args:
+        df: The pandas DataFrame to operate on
+        deep_copy: Copy the data up front; pass False only when copy-on-write
+            is enabled, so the script copies just the columns it modifies
+
+    Returns:
+        Dict[str, Any]: Dictionary of global variables for the sandbox
+    """
+    # Create a copy of the dataframe to avoid modifying the original
+    sandbox_df = df.copy(deep=deep_copy)
+
+    # Define allowed modules and functions
+    return {
+        'df': sandbox_df,
+        'pd': pd,
+        'np': np,
+        'print': print
+    }
+
+
+def run_script(code: Any, df: pd.DataFrame, deep_copy: bool = True) -> pd.DataFrame:
+    """
+    Execute a script (source or compiled code) in a fresh sandbox
+
+    Args:
+        code: Script source or code object compiled with SCRIPT_FILENAME
+        df: The DataFrame the script modifies
+        deep_copy: Whether the sandbox deep-copies df (see create_sandbox)
+
+    Returns:
+        pd.DataFrame: The value of 'df' after the script ran
+
+    Raises:
+        TypeError: If the script replaced 'df' with something that is not a DataFrame
+    """
+    if isinstance(code, str):
+        code = compile(code, SCRIPT_FILENAME, 'exec')
+    sandbox_globals = create_sandbox(df, deep_copy)
+    exec(code, sandbox_globals)
+    result = sandbox_globals.get('df')
+    if not isinstance(result, pd.DataFrame):
+        raise TypeError(f"'df' must remain a pandas DataFrame, got {type(result).__name__}")
+    return result
+
+
+def format_script_error(script: str) -> str:
+    """
+    Describe the exception currently being handled, pointing at the failing script line
+
+    Args:
+        script: The script that raised
+
+    Returns:
+        str: The script line that failed and the exception message
+    """
+    exc_type, exc_value, exc_tb = sys.exc_info()
+    script_lines = script.splitlines()
+    lines = []
+    for frame in traceback.extract_tb(exc_tb):
+        if frame.filename == SCRIPT_FILENAME and frame.lineno and frame.lineno <= len(script_lines):
+            lines.append(f"Line {frame.lineno}: {script_lines[frame.lineno - 1].strip()}")
+    lines.extend(traceback.format_exception_only(exc_type, exc_value))
+    return "\n".join(line.rstrip() for line in lines)
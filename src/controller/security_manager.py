@@ -4,11 +4,26 @@ Security Manager module
 Validates scripts for security before execution
 """
 
+import re
 import ast
 import logging
 from typing import Dict, Any
 
 
+# String literals, quoted identifiers and comments, removed before SQL keywords are inspected
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\$\$.*?\$\$|--[^\n]*|/\*.*?\*/", re.S)
+
+
+def _blank_sql_literal(match: re.Match) -> str:
+    """Replace a literal with an empty one of the same kind, and a comment with a space"""
+    text = match.group(0)
+    if text[0] == '"':
+        return '""'
+    if text[0] in "'$":
+        return "''"
+    return ' '
+
+
 class SecurityManager:
     """
     Manages security for script execution
@@ -45,6 +60,26 @@ class SecurityManager:
             # # Other dangerous operations
             # 'pickle', 'marshal', 'shelve'
         }
+
+        # First keywords of SQL statements allowed in the SQL execution mode
+        self.allowed_sql_statements = {'SELECT', 'WITH', 'FROM', 'VALUES'}
+
+        # SQL keywords that write, change settings or reach outside the query
+        self.forbidden_sql_keywords = {
+            'INSERT', 'UPDATE', 'DELETE', 'MERGE', 'UPSERT', 'TRUNCATE', 'CREATE', 'DROP', 'ALTER',
+            'ATTACH', 'DETACH', 'COPY', 'EXPORT', 'IMPORT', 'INSTALL', 'LOAD', 'PRAGMA', 'SET', 'RESET',
+            'CALL', 'EXECUTE', 'PREPARE', 'DEALLOCATE', 'CHECKPOINT', 'VACUUM', 'GRANT', 'REVOKE',
+            'USE', 'BEGIN', 'COMMIT', 'ROLLBACK', 'TRANSACTION', 'SECRET'
+        }
+
+        # Table and scalar functions that read files, databases or server state
+        # (any read_* function and *_scan function is rejected as well)
+        self.forbidden_sql_functions = {
+            'glob', 'sniff_csv', 'parquet_metadata', 'parquet_schema', 'parquet_file_metadata',
+            'parquet_kv_metadata', 'sqlite_attach', 'postgres_attach', 'mysql_attach', 'query',
+            'query_table', 'getenv', 'load_extension', 'duckdb_secrets', 'duckdb_settings',
+            'duckdb_extensions', 'duckdb_databases', 'current_setting', 'pragma_database_list'
+        }
     
     def validate_script(self, script: str) -> bool:
         """
@@ -53,6 +88,26 @@ class SecurityManager:
         Args:
             script: The Python script to validate
 
+        Returns:
+            bool: True if the script passes security validation, False otherwise
+        """
+        # Use AST to analyze the script more thoroughly
+        try:
+            tree = ast.parse(script)
+        except SyntaxError:
+            logging.warning("SecurityManager: SyntaxError while parsing script.")
+            logging.warning(f"Rejected script:\n{script}")
+            return False
+        return self.validate_tree(tree, script)
+
+    def validate_tree(self, tree: ast.AST, script: str) -> bool:
+        """
+        Validate an already parsed script for security concerns
+
+        Args:
+            tree: The parsed script
+            script: The script source, for logging
+
         Returns:
             bool: True if the script passes security validation, False otherwise
         """
@@ -62,49 +117,99 @@ class SecurityManager:
                 logging.warning(f"SecurityManager: Forbidden keyword '{forbidden}' found in script.")
                 logging.warning(f"Rejected script:\n{script}")
                 return False
-        
-        # Use AST to analyze the script more thoroughly
-        try:
-            tree = ast.parse(script)
-            
-            # Check imports
-            for node in ast.walk(tree):
-                # Check for import statements
-                if isinstance(node, ast.Import):
-                    for name in node.names:
-                        if name.name not in self.allowed_modules:
-                            logging.warning(f"SecurityManager: Forbidden import '{name.name}' found in script.")
-                            logging.warning(f"Rejected script:\n{script}")
-                            return False
-                
-                # Check for import from statements
-                elif isinstance(node, ast.ImportFrom):
-                    if node.module not in self.allowed_modules:
-                        logging.warning(f"SecurityManager: Forbidden import from '{node.module}' found in script.")
-                        logging.warning(f"Rejected script:\n{script}")
-                        return False
-                    
-                # Check for calls to __import__
-                elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
-                    if node.func.id == '__import__':
-                        logging.warning("SecurityManager: __import__ call found in script.")
-                        logging.warning(f"Rejected script:\n{script}")
-                        return False
-                
-                # Check for exec or eval calls
-                elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
-                    if node.func.id in ['exec', 'eval']:
-                        logging.warning(f"SecurityManager: Forbidden call '{node.func.id}' found in script.")
+
+        # Check imports
+        for node in ast.walk(tree):
+            # Check for import statements
+            if isinstance(node, ast.Import):
+                for name in node.names:
+                    if name.name not in self.allowed_modules:
+                        logging.warning(f"SecurityManager: Forbidden import '{name.name}' found in script.")
                         logging.warning(f"Rejected script:\n{script}")
                         return False
             
-            return True
+            # Check for import from statements
+            elif isinstance(node, ast.ImportFrom):
+                if node.module not in self.allowed_modules:
+                    logging.warning(f"SecurityManager: Forbidden import from '{node.module}' found in script.")
+                    logging.warning(f"Rejected script:\n{script}")
+                    return False
+                
+            # Check for calls to __import__
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+                if node.func.id == '__import__':
+                    logging.warning("SecurityManager: __import__ call found in script.")
+                    logging.warning(f"Rejected script:\n{script}")
+                    return False
             
-        except SyntaxError:
-            logging.warning("SecurityManager: SyntaxError while parsing script.")
-            logging.warning(f"Rejected script:\n{script}")
+            # Check for exec or eval calls
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+                if node.func.id in ['exec', 'eval']:
+                    logging.warning(f"SecurityManager: Forbidden call '{node.func.id}' found in script.")
+                    logging.warning(f"Rejected script:\n{script}")
+                    return False
+
+            # Check for inplace calls on a column or selection, e.g. df['col'].fillna(0, inplace=True):
+            # with copy-on-write they modify a temporary copy and leave df unchanged
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+                if not isinstance(node.func.value, ast.Name) and self._inplace(node):
+                    logging.warning(f"SecurityManager: inplace=True call on a selection ('{node.func.attr}') found in script.")
+                    logging.warning(f"Rejected script:\n{script}")
+                    return False
+        
+        return True
+
+    @staticmethod
+    def _inplace(call: ast.Call) -> bool:
+        """True if a call passes inplace= anything other than a literal False"""
+        return any(
+            keyword.arg == 'inplace' and not (isinstance(keyword.value, ast.Constant) and keyword.value.value is False)
+            for keyword in call.keywords
+        )
+
+    def validate_sql(self, query: str) -> bool:
+        """
+        Validate a SQL query for the SQL execution mode
+
+        Only a single read/transform statement (SELECT, WITH ... SELECT,
+        FROM-first SELECT or VALUES) is allowed: no writes, DDL, settings,
+        extensions, attached databases or table functions reading files.
+
+        Args:
+            query: The SQL query to validate
+
+        Returns:
+            bool: True if the query passes validation, False otherwise
+        """
+        code = _SQL_LITERALS.sub(_blank_sql_literal, query)
+        statements = [statement for statement in code.split(';') if statement.strip()]
+        if len(statements) != 1:
+            logging.warning(f"SecurityManager: SQL must be exactly one statement, found {len(statements)}.")
+            logging.warning(f"Rejected query:\n{query}")
             return False
-    
+
+        first_word = (re.findall(r'[A-Za-z_]+', statements[0]) or [''])[0].upper()
+        if first_word not in self.allowed_sql_statements:
+            logging.warning(f"SecurityManager: SQL statement '{first_word}' is not allowed.")
+            logging.warning(f"Rejected query:\n{query}")
+            return False
+
+        words = set(re.findall(r'[A-Za-z_][A-Za-z0-9_]*', code))
+        forbidden = {word.upper() for word in words} & self.forbidden_sql_keywords
+        if forbidden:
+            logging.warning(f"SecurityManager: Forbidden SQL keyword '{sorted(forbidden)[0]}' found in query.")
+            logging.warning(f"Rejected query:\n{query}")
+            return False
+
+        for function in re.findall(r'([A-Za-z_][A-Za-z0-9_]*)\s*\(', code):
+            name = function.lower()
+            if name in self.forbidden_sql_functions or name.startswith('read_') or name.endswith('_scan'):
+                logging.warning(f"SecurityManager: Forbidden SQL function '{function}' found in query.")
+                logging.warning(f"Rejected query:\n{query}")
+                return False
+
+        return True
+
     def get_sandbox_parameters(self) -> Dict[str, Any]:
         """
         Get parameters for sandbox environment
@@ -114,5 +219,7 @@ class SecurityManager:
         """
         return {
             'allowed_modules': list(self.allowed_modules),
-            'forbidden_functions': list(self.forbidden_functions)
+            'forbidden_functions': list(self.forbidden_functions),
+            'allowed_sql_statements': list(self.allowed_sql_statements),
+            'forbidden_sql_keywords': list(self.forbidden_sql_keywords)
         }
@@ -0,0 +1,234 @@
+"""
+Shared Frame module
+------------------
+Hands DataFrames to and from script workers through shared memory instead of pickling them
+"""
+
+from multiprocessing import shared_memory
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Column buffers are placed at offsets aligned to a cache line
+_ALIGNMENT = 64
+
+# numpy dtype kinds whose raw buffers can be shared: bool, ints, floats, complex, timedelta, datetime
+_SHAREABLE_KINDS = 'biufcmM'
+
+
+def _column_values(df: pd.DataFrame, position: int) -> Any:
+    """
+    Get the backing array of a column without copying it
+
+    Args:
+        df: The DataFrame
+        position: Column position
+
+    Returns:
+        Any: A numpy array for numpy dtypes, otherwise the extension array
+    """
+    column = df.iloc[:, position]
+    if isinstance(column.dtype, np.dtype):
+        return column.to_numpy(copy=False)
+    return column.array
+
+
+def buffer_key(values: Any) -> Optional[Tuple[int, Any, int, Tuple[int, ...]]]:
+    """
+    Identify the memory a column array points at
+
+    Extension arrays backed by a single numpy array (e.g. python-storage
+    strings, tz-aware datetimes) are identified by that array, so unchanged
+    columns of those types are recognised too.
+
+    Returns:
+        Optional[Tuple]: Data address, dtype, length and strides, or None when
+        the array has no single numpy buffer
+    """
+    buffer = values if isinstance(values, np.ndarray) else getattr(values, '_ndarray', None)
+    if not isinstance(buffer, np.ndarray):
+        return None
+    return buffer.__array_interface__['data'][0], values.dtype, len(buffer), buffer.strides
+
+
+def column_arrays(df: pd.DataFrame) -> List[Any]:
+    """
+    Get the backing arrays of every column, by position
+
+    Args:
+        df: The DataFrame
+
+    Returns:
+        List[Any]: One array per column
+    """
+    return [_column_values(df, position) for position in range(df.shape[1])]
+
+
+def publish_frame(df: pd.DataFrame, min_shared_bytes: int = 0,
+                  base_arrays: Optional[List[Any]] = None) -> Tuple[Dict[str, Any], Optional[shared_memory.SharedMemory]]:
+    """
+    Describe a DataFrame so another process can rebuild it
+
+    Numeric, boolean and datetime columns are copied once into a single
+    shared memory segment; other columns travel inline with the description.
+    Columns still backed by one of `base_arrays` are sent as a reference to
+    that position, so data the receiver already holds is not sent back.
+
+    Args:
+        df: The DataFrame to publish
+        min_shared_bytes: Below this many bytes of shareable data, everything
+            is sent inline (a segment costs more than copying a small frame)
+        base_arrays: Column arrays the receiver already has, by position
+
+    Returns:
+        Tuple[Dict[str, Any], Optional[SharedMemory]]: Picklable description and
+        the segment holding the shared columns. The caller closes the segment;
+        the receiver is responsible for unlinking it.
+    """
+    base_lookup = {}
+    for position, values in enumerate(base_arrays or []):
+        key = buffer_key(values)
+        if key is not None:
+            base_lookup[key] = position
+
+    entries: List[Any] = []
+    shareable: List[Tuple[int, np.ndarray]] = []
+    for position in range(df.shape[1]):
+        values = _column_values(df, position)
+        key = buffer_key(values)
+        if key is not None and key in base_lookup:
+            entries.append(('base', base_lookup[key]))
+            continue
+        if isinstance(values, np.ndarray) and values.dtype.kind in _SHAREABLE_KINDS:
+            shareable.append((position, values))
+            entries.append(None)
+            continue
+        entries.append(('inline', values))
+
+    segment = None
+    total = sum(_aligned(values.nbytes) for _, values in shareable)
+    if shareable and total >= min_shared_bytes:
+        segment = shared_memory.SharedMemory(create=True, size=max(total, 1))
+        offset = 0
+        for position, values in shareable:
+            target = np.ndarray(values.shape, dtype=values.dtype, buffer=segment.buf, offset=offset)
+            target[...] = values
+            del target
+            entries[position] = ('shared', values.dtype.str, offset, len(values))
+            offset += _aligned(values.nbytes)
+    else:
+        for position, values in shareable:
+            entries[position] = ('inline', values)
+
+    meta = {
+        'segment': segment.name if segment else None,
+        'columns': df.columns,
+        'index': df.index,
+        'entries': entries
+    }
+    return meta, segment
+
+
+def attach_frame(meta: Dict[str, Any]) -> Tuple[pd.DataFrame, Optional[shared_memory.SharedMemory]]:
+    """
+    Rebuild a published DataFrame as read-only views of the shared segment
+
+    Writes to shared columns raise unless pandas copy-on-write is enabled,
+    which copies just the columns a script modifies.
+
+    Args:
+        meta: Description from publish_frame (without base references)
+
+    Returns:
+        Tuple[pd.DataFrame, Optional[SharedMemory]]: The frame and the attached
+        segment, which must stay open while the frame is in use
+    """
+    segment = shared_memory.SharedMemory(name=meta['segment']) if meta['segment'] else None
+    arrays = []
+    for entry in meta['entries']:
+        if entry[0] == 'shared':
+            _, dtype, offset, length = entry
+            values = np.ndarray((length,), dtype=np.dtype(dtype), buffer=segment.buf, offset=offset)
+            values.flags.writeable = False
+            arrays.append(values)
+        else:
+            arrays.append(entry[1])
+    return _build_frame(meta, arrays), segment
+
+
+def load_frame(meta: Dict[str, Any], base_df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Rebuild a published DataFrame as a private copy and unlink its segment
+
+    Args:
+        meta: Description from publish_frame
+        base_df: Frame whose columns 'base' references point at
+
+    Returns:
+        pd.DataFrame: The rebuilt frame; unchanged columns share memory with base_df
+    """
+    segment = shared_memory.SharedMemory(name=meta['segment']) if meta['segment'] else None
+    try:
+        arrays = []
+        for entry in meta['entries']:
+            if entry[0] == 'shared':
+                _, dtype, offset, length = entry
+                arrays.append(np.ndarray((length,), dtype=np.dtype(dtype), buffer=segment.buf, offset=offset).copy())
+            elif entry[0] == 'base':
+                arrays.append(_column_values(base_df, entry[1]))
+            else:
+                arrays.append(entry[1])
+    finally:
+        if segment is not None:
+            release_segment(segment, unlink=True)
+    return _build_frame(meta, arrays)
+
+
+def discard_frame(meta: Dict[str, Any]) -> None:
+    """
+    Unlink the segment of a published frame that will not be loaded
+
+    Args:
+        meta: Description from publish_frame
+    """
+    if meta.get('segment'):
+        try:
+            release_segment(shared_memory.SharedMemory(name=meta['segment']), unlink=True)
+        except FileNotFoundError:
+            pass
+
+
+def release_segment(segment: shared_memory.SharedMemory, unlink: bool = False) -> None:
+    """
+    Close (and optionally unlink) a segment
+
+    Closing fails while views of the segment are still alive; the mapping is
+    then released when the last view is garbage collected.
+
+    Args:
+        segment: The segment
+        unlink: Whether to remove the segment name as well
+    """
+    try:
+        segment.close()
+    except BufferError:
+        pass
+    if unlink:
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _build_frame(meta: Dict[str, Any], arrays: List[Any]) -> pd.DataFrame:
+    """Assemble columns into a DataFrame without copying or consolidating them"""
+    df = pd.DataFrame(dict(enumerate(arrays)), index=meta['index'], copy=False)
+    df.columns = meta['columns']
+    return df
+
+
+def _aligned(nbytes: int) -> int:
+    """Round a byte count up to the segment alignment"""
+    return -(-nbytes // _ALIGNMENT) * _ALIGNMENT
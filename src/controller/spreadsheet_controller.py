@@ -6,15 +6,30 @@ Main controller for spreadsheet operations
 
 import os
 import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
 import pandas as pd
 from werkzeug.datastructures import FileStorage
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List, Tuple, Optional
 from src.model.session_manager import SessionManager
 from src.model.spreadsheet import Spreadsheet
 from src.model.modification_history import ModificationHistory
+from src.model.modified_cells import ModifiedCells
+from src.model.spreadsheet_parser import SpreadsheetParser, FILE_FORMATS
 from src.llm.llm_service import LLMService
+from src.llm.llm_provider import LLMProviderError
 from src.controller.script_executor import ScriptExecutor
 from src.controller.file_manager import FileManager
+from src.controller.artifact_log import ArtifactLog
+from src.controller.edit_engine import EditEngine
+from src.controller.exporter import SpreadsheetExporter, MEDIA_TYPES
+from src.controller.metrics import MetricsRegistry
+from src.controller.precompute import PrecomputeScheduler, PrecomputeJob
+from src.controller.cell_diff import unchanged_columns, diff_frames
+from src.controller.schema_mapper import SchemaMapper
+from src.controller.block_detector import BlockDetector, single_table
 
 
 class SpreadsheetController:
@@ -30,15 +45,77 @@ class SpreadsheetController:
             session_manager: Session manager instance
         """
         self.session_manager = session_manager
-        self.llm_service = LLMService()
+        self.metrics = MetricsRegistry()
+        self.llm_service = LLMService(metrics=self.metrics)
         self.script_dir = os.path.join('src', 'script')
-        self.script_executor = ScriptExecutor(script_dir=self.script_dir)
+        # Scripts (and, if enabled, sheet snapshots) are recorded in one log by a background writer
+        self.artifact_log = ArtifactLog(
+            os.getenv('ARTIFACT_LOG_PATH', os.path.join(self.script_dir, 'artifacts.db')),
+            retention_hours=float(os.getenv('ARTIFACT_RETENTION_HOURS', '72'))
+        )
+        self.save_spreadsheet_json = os.getenv('SAVE_SPREADSHEET_JSON', 'false').lower() in ('1', 'true', 'yes')
+        self.script_executor = ScriptExecutor(script_dir=self.script_dir, artifact_log=self.artifact_log)
+        self.edit_engine = EditEngine()
+        # Downloads are streamed and cached per history version
+        self.exporter = SpreadsheetExporter(
+            chunk_rows=int(os.getenv('EXPORT_CHUNK_ROWS', '50000')),
+            cache_bytes=int(float(os.getenv('EXPORT_CACHE_MB', '256')) * 1024 * 1024)
+        )
+        # Downloads, schemas, column profiles and table blocks are built in the background after each new state
+        # Schemas and profiles are updated from at most this many earlier states before a full rebuild
+        self.artifact_lineage = 16
+        self.block_detector = BlockDetector()
+        self.precompute_tasks = {task.strip() for task in os.getenv('PRECOMPUTE_TASKS', 'export,schema,profiles,blocks').split(',') if task.strip()}
+        self.precompute = PrecomputeScheduler(
+            max_cpu=float(os.getenv('PRECOMPUTE_MAX_CPU', '0.5')),
+            idle_delay=int(os.getenv('PRECOMPUTE_IDLE_MS', '500')) / 1000,
+            enabled=os.getenv('PRECOMPUTE_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+            metrics=self.metrics
+        )
+        # Serializes history changes, so a version check or a state read together with
+        # its version (downloads, precompute) cannot interleave with an edit
+        self._edit_lock = threading.RLock()
         self.file_manager = FileManager(
             upload_dir=os.path.join('static', 'uploads'),
             download_dir=os.path.join('static', 'downloads'),
             json_dir=os.path.join('static', 'json')
         )
+        # Failed dry runs are sent back to the LLM this many times before giving up
+        self.script_repair_rounds = int(os.getenv('SCRIPT_REPAIR_ROUNDS', '2'))
+        # Number of candidate scripts requested concurrently per command (1 disables racing)
+        self.script_candidates = max(int(os.getenv('SCRIPT_CANDIDATES', '1')), 1)
+        self.candidate_temperatures = self._candidate_temperatures(self.script_candidates)
+        self._candidate_pool = ThreadPoolExecutor(max_workers=self.script_candidates * 2, thread_name_prefix='candidate')
+        # 'compact' (column runs, row ranges, bitmaps) or 'list' ([row, col] pairs, the original format)
+        self.modified_cells_format = os.getenv('MODIFIED_CELLS_FORMAT', 'compact').lower()
+        # Rows returned by /query; larger results are cut off and flagged as truncated
+        self.query_max_rows = int(os.getenv('QUERY_MAX_ROWS', '10000'))
+        # Schema transforms matched at least this confidently are applied without the LLM
+        self.schema_mapper = SchemaMapper()
+        self.schema_map_min_confidence = float(os.getenv('SCHEMA_MAP_MIN_CONFIDENCE', '0.75'))
     
+    def _candidate_temperatures(self, count: int) -> List[float]:
+        """
+        Sampling temperatures for racing candidates
+
+        Uses SCRIPT_CANDIDATE_TEMPERATURES (comma separated) when set, otherwise
+        spreads candidates from the default temperature upwards.
+
+        Args:
+            count: Number of candidates
+
+        Returns:
+            List[float]: One temperature per candidate
+        """
+        configured = os.getenv('SCRIPT_CANDIDATE_TEMPERATURES')
+        if configured:
+            temperatures = [float(t) for t in configured.split(',') if t.strip()]
+        else:
+            base = self.llm_service.generation_config.get('temperature', 0.2)
+            temperatures = [round(min(base + 0.3 * i, 1.0), 2) for i in range(count)]
+        # Repeat the list if fewer temperatures than candidates were configured
+        return [temperatures[i % len(temperatures)] for i in range(count)]
+
     def upload_spreadsheet(self, file: FileStorage) -> str:
         """
         Upload and process a spreadsheet file
@@ -54,22 +131,18 @@ class SpreadsheetController:
             raise ValueError("No filename provided")
             
         if not self.file_manager.validate_file_type(file.filename):
-            raise ValueError("Invalid file format. Supported formats: xlsx, xls, csv")
+            raise ValueError(f"Invalid file format. Supported formats: {', '.join(FILE_FORMATS)}")
         
         # Save file
         file_id = str(uuid.uuid4())
         file_path = self.file_manager.save_uploaded_file(file, file_id)
         
         # Parse file
-        df = None
-        if file_path.endswith('.xlsx') or file_path.endswith('.xls'):
-            df = pd.read_excel(file_path)
-        elif file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        
-        # Check if df is None
-        if df is None:
-            raise ValueError(f"Unsupported file format: {file_path}")
+        try:
+            df = SpreadsheetParser.read_file(file_path)
+        except Exception:
+            self.file_manager.delete_file(file_path)
+            raise
             
         # Create spreadsheet object
         spreadsheet = Spreadsheet(file_id, file.filename, df, file_path)
@@ -89,6 +162,7 @@ class SpreadsheetController:
         # Update session
         session.update_spreadsheet(spreadsheet)
         session.set_modification_history(history)
+        self._schedule_precompute(session_id, history)
         
         return session_id
     
@@ -116,19 +190,8 @@ class SpreadsheetController:
         if not spreadsheet:
             raise ValueError("No spreadsheet data found")
         
-        # Prepare view data with datetime handling
-        df_copy = spreadsheet.get_data().copy()
-        
-        # Convert datetime columns to strings for JSON serialization
-        for col in df_copy.columns:
-            if pd.api.types.is_datetime64_any_dtype(df_copy[col]):
-                df_copy[col] = df_copy[col].dt.strftime('%Y-%m-%d %H:%M:%S').fillna('')
-        
-        # Always return data as a 2D array (list of lists), ignore headers
-        data = df_copy.replace({float('nan'): None}).values.tolist()
-        col_count = len(df_copy.columns)
-        # Do not return headers at all
-        # headers = df_copy.columns.tolist()
+        # Rows for the grid view (datetimes formatted, missing values as None)
+        data = spreadsheet.to_rows()
         
         return {
             'data': data,
@@ -136,6 +199,7 @@ class SpreadsheetController:
             'metadata': spreadsheet.get_metadata(),
             'can_undo': history.can_undo(),
             'can_redo': history.can_redo(),
+            'version': history.version,
             'modified_cells': []  # No cells modified in view operation
         }
     
@@ -164,19 +228,23 @@ class SpreadsheetController:
         if not current_spreadsheet:
             raise ValueError("No spreadsheet data found")
         
-        # Convert spreadsheet to JSON format for LLM and save a copy to static/json
-        spreadsheet_json = current_spreadsheet.to_json(save_to_file=True, file_manager=self.file_manager)
+        # Optionally keep a JSON snapshot of the sheet; it is serialized on the log's writer thread
+        if self.save_spreadsheet_json:
+            self.artifact_log.append('spreadsheet', current_spreadsheet.file_id, current_spreadsheet.to_json)
         
-        # Generate script using LLM
-        script = self.llm_service.generate_script(spreadsheet_json, command)
+        # Generate a script that survives a dry run on a sample of the data
+        llm_usage: Dict[str, Any] = {}
+        script, attempts = self._generate_tested_script(
+            current_spreadsheet.get_data(), command, llm_usage, self.get_state_artifact(current_spreadsheet, 'profiles'),
+            self.get_state_artifact(current_spreadsheet, 'blocks')
+        )
         
         # Store generated script
         session.set_generated_script(script)
           # Execute script on spreadsheet data
         new_df, modified_cells = self.script_executor.execute_script(
             script, 
-            current_spreadsheet.get_data(),
-            file_manager=self.file_manager
+            current_spreadsheet.get_data()
         )
         
         # Create new spreadsheet state
@@ -185,24 +253,18 @@ class SpreadsheetController:
             current_spreadsheet.original_filename,
             new_df
         )
+        new_spreadsheet.derived_from = (
+            current_spreadsheet, unchanged_columns(current_spreadsheet.get_data(), new_df, modified_cells)
+        )
         
-        # Add to history
-        history.add_state(new_spreadsheet)
-        
-        # Update session spreadsheet
-        session.update_spreadsheet(new_spreadsheet)
-        
-        # Prepare view data with datetime handling
-        df_copy = new_df.copy()
-        
-        # Convert datetime columns to strings for JSON serialization
-        for col in df_copy.columns:
-            if pd.api.types.is_datetime64_any_dtype(df_copy[col]):
-                df_copy[col] = df_copy[col].dt.strftime('%Y-%m-%d %H:%M:%S').fillna('')
+        # Add to history and update the session spreadsheet
+        with self._edit_lock:
+            history.add_state(new_spreadsheet)
+            session.update_spreadsheet(new_spreadsheet)
+            self._schedule_precompute(session_id, history)
         
-        data = df_copy.replace({float('nan'): None}).values.tolist()
-        # Do not return headers at all
-        # headers = df_copy.columns.tolist()
+        # Rows for the grid view (datetimes formatted, missing values as None)
+        data = new_spreadsheet.to_rows()
         
         return {
             'data': data,
@@ -210,9 +272,147 @@ class SpreadsheetController:
             'metadata': new_spreadsheet.get_metadata(),
             'can_undo': history.can_undo(),
             'can_redo': history.can_redo(),
-            'modified_cells': modified_cells
+            'version': history.version,
+            'modified_cells': modified_cells.encode(self.modified_cells_format),
+            'llm_usage': llm_usage,
+            'script_attempts': attempts
         }
-    
+
+    def _generate_tested_script(self, df: pd.DataFrame, command: str, llm_usage: Dict[str, Any],
+                                profiles: Optional[List[Dict[str, Any]]] = None,
+                                blocks: Optional[Dict[str, Any]] = None) -> Tuple[str, int]:
+        """
+        Generate a script and repair it until it runs on a sample of the data
+
+        Each candidate is dry-run on a small stratified sample; failures are sent
+        back to the LLM with their traceback for up to `script_repair_rounds`
+        rounds, so broken scripts never run against the full DataFrame. When
+        `script_candidates` is above one, the first round races that many
+        candidates generated concurrently at different temperatures.
+
+        Args:
+            df: The current spreadsheet data
+            command: User command text
+            llm_usage: Dict that receives prompt token counts of the winning LLM call
+            profiles: Precomputed column profiles of df, if available
+            blocks: Table blocks of df (BlockDetector.detect), if available
+
+        Returns:
+            Tuple[str, int]: The script that passed the dry run and the number of
+            scripts generated
+
+        Raises:
+            ValueError: If no generated script passed the dry run
+        """
+        sample_df = self.script_executor.build_sample(df)
+        feedback: List[Tuple[str, str]] = []
+        last_error: Optional[str] = None
+        generated = 0
+        rounds = self.script_repair_rounds + 1
+
+        if self.script_candidates > 1:
+            script, failures = self._race_candidates(df, sample_df, command, llm_usage, profiles, blocks)
+            generated = len(failures)
+            if script is not None:
+                return script, generated + 1
+            # The race was the first round; repair the candidate that failed first
+            scripts = [failure for failure in failures if failure[0] is not None]
+            if scripts:
+                feedback.append(scripts[0])
+            last_error = failures[-1][1] if failures else None
+            rounds -= 1
+
+        for _ in range(rounds):
+            generated += 1
+            try:
+                script = self.llm_service.generate_script(df, command, stats=llm_usage, feedback=feedback or None,
+                                                          profiles=profiles, blocks=blocks)
+            except LLMProviderError as e:
+                # No script to repair; the next round asks again with the same feedback
+                logging.warning(f"Provider failed to generate a script (attempt {generated}): {e}")
+                last_error = str(e)
+                continue
+            error = self.script_executor.dry_run(script, sample_df, full_row_count=len(df))
+            if error is None:
+                return script, generated
+            logging.warning(f"Generated script failed dry run (attempt {generated}): {error}")
+            feedback.append((script, error))
+            last_error = error
+
+        raise ValueError(f"Failed to generate script for set of instructions. Last error: {last_error}")
+
+    def _race_candidates(self, df: pd.DataFrame, sample_df: pd.DataFrame, command: str, llm_usage: Dict[str, Any],
+                         profiles: Optional[List[Dict[str, Any]]] = None,
+                         blocks: Optional[Dict[str, Any]] = None) -> Tuple[Optional[str], List[Tuple[Optional[str], str]]]:
+        """
+        Generate several candidate scripts concurrently and keep the first that passes a dry run
+
+        Candidates still waiting to start are cancelled once a winner is found;
+        ones already waiting on the LLM finish in the background and are discarded.
+
+        Args:
+            df: The current spreadsheet data
+            sample_df: Sample used for dry runs
+            command: User command text
+            llm_usage: Dict that receives the winner's prompt token counts
+            profiles: Precomputed column profiles of df, if available
+            blocks: Table blocks of df (BlockDetector.detect), if available
+
+        Returns:
+            Tuple[Optional[str], List[Tuple[Optional[str], str]]]: The winning
+            script (or None if all failed) and the (script, error) pairs of failed
+            candidates in the order they finished; the script is None when the
+            provider failed to produce one
+        """
+        winner_found = threading.Event()
+
+        def run_candidate(index: int) -> Tuple[int, Optional[str], Optional[str], Dict[str, Any]]:
+            stats: Dict[str, Any] = {}
+            try:
+                script = self.llm_service.generate_script(
+                    df, command, stats=stats, profiles=profiles, blocks=blocks,
+                    generation_overrides={'temperature': self.candidate_temperatures[index]}
+                )
+            except LLMProviderError as e:
+                return index, None, str(e), stats
+            if winner_found.is_set():
+                return index, script, "Cancelled", stats
+            # Losing candidates' dry runs are interrupted as soon as a winner is found
+            error = self.script_executor.dry_run(script, sample_df, full_row_count=len(df), cancel_event=winner_found)
+            return index, script, error, stats
+
+        futures = [self._candidate_pool.submit(run_candidate, i) for i in range(self.script_candidates)]
+        failures: List[Tuple[Optional[str], str]] = []
+        try:
+            for future in as_completed(futures):
+                index, script, error, stats = future.result()
+                if error is None:
+                    winner_found.set()
+                    llm_usage.update(stats)
+                    llm_usage['candidate_index'] = index
+                    self.metrics.increment(f'script_candidates.win_index.{index}')
+                    return script, failures
+                if script is None:
+                    logging.warning(f"Candidate {index} got no script from the provider: {error}")
+                else:
+                    logging.warning(f"Candidate script {index} failed dry run: {error}")
+                failures.append((script, error))
+        finally:
+            for future in futures:
+                future.cancel()
+
+        self.metrics.increment('script_candidates.all_failed')
+        return None, failures
+
+    def shutdown(self) -> None:
+        """
+        Release background resources (candidate threads, precompute, script workers and the artifact writer)
+        """
+        self._candidate_pool.shutdown(wait=False, cancel_futures=True)
+        self.precompute.shutdown()
+        self.script_executor.shutdown()
+        self.artifact_log.close()
+
     def undo_modification(self, session_id: str) -> Dict[str, Any]:
         """
         Undo the last modification
@@ -232,26 +432,18 @@ class SpreadsheetController:
         history = session.get_modification_history()
         if not history:
             raise ValueError("No modification history found")
-        previous_spreadsheet = history.undo()
-        
-        if not previous_spreadsheet:
-            raise ValueError("Nothing to undo")
-        
-        # Update session
-        session.update_spreadsheet(previous_spreadsheet)
-        
-        # Prepare view data with datetime handling
-        df = previous_spreadsheet.get_data()
-        df_copy = df.copy()
-        
-        # Convert datetime columns to strings for JSON serialization
-        for col in df_copy.columns:
-            if pd.api.types.is_datetime64_any_dtype(df_copy[col]):
-                df_copy[col] = df_copy[col].dt.strftime('%Y-%m-%d %H:%M:%S').fillna('')
+        with self._edit_lock:
+            previous_spreadsheet = history.undo()
+            
+            if not previous_spreadsheet:
+                raise ValueError("Nothing to undo")
+            
+            # Update session
+            session.update_spreadsheet(previous_spreadsheet)
+            self._schedule_precompute(session_id, history)
         
-        data = df_copy.replace({float('nan'): None}).values.tolist()
-        # Do not return headers at all
-        # headers = df_copy.columns.tolist()
+        # Rows for the grid view (datetimes formatted, missing values as None)
+        data = previous_spreadsheet.to_rows()
         
         return {
             'data': data,
@@ -259,6 +451,7 @@ class SpreadsheetController:
             'metadata': previous_spreadsheet.get_metadata(),
             'can_undo': history.can_undo(),
             'can_redo': history.can_redo(),
+            'version': history.version,
             'modified_cells': []  # No specific cells to highlight in undo
         }
     
@@ -281,25 +474,17 @@ class SpreadsheetController:
         history = session.get_modification_history()
         if not history:
             raise ValueError("No modification history found")
-        next_spreadsheet = history.redo()
-        
-        if not next_spreadsheet:
-            raise ValueError("Nothing to redo")
-        # Update session
-        session.update_spreadsheet(next_spreadsheet)
-        
-        # Prepare view data with datetime handling
-        df = next_spreadsheet.get_data()
-        df_copy = df.copy()
-        
-        # Convert datetime columns to strings for JSON serialization
-        for col in df_copy.columns:
-            if pd.api.types.is_datetime64_any_dtype(df_copy[col]):
-                df_copy[col] = df_copy[col].dt.strftime('%Y-%m-%d %H:%M:%S').fillna('')
+        with self._edit_lock:
+            next_spreadsheet = history.redo()
+            
+            if not next_spreadsheet:
+                raise ValueError("Nothing to redo")
+            # Update session
+            session.update_spreadsheet(next_spreadsheet)
+            self._schedule_precompute(session_id, history)
         
-        data = df_copy.replace({float('nan'): None}).values.tolist()
-        # Do not return headers at all
-        # headers = df_copy.columns.tolist()
+        # Rows for the grid view (datetimes formatted, missing values as None)
+        data = next_spreadsheet.to_rows()
         
         # Since we've already verified history is not None, we can safely call these methods
         return {
@@ -308,18 +493,24 @@ class SpreadsheetController:
             'metadata': next_spreadsheet.get_metadata(),
             'can_undo': history.can_undo(),
             'can_redo': history.can_redo(),
+            'version': history.version,
             'modified_cells': []  # No specific cells to highlight in redo
         }
     
-    def download_spreadsheet(self, session_id: str) -> tuple:
+    def download_spreadsheet(self, session_id: str, format_type: Optional[str] = None) -> Tuple[Iterator[bytes], str, str, Optional[int]]:
         """
-        Generate a downloadable spreadsheet file
+        Export the current spreadsheet state for download
+
+        The file is streamed rather than saved to the downloads directory,
+        and exports are cached per history version. The session is kept.
 
         Args:
             session_id: Session ID
+            format_type: Export format (see MEDIA_TYPES), defaults to the uploaded file's format
 
         Returns:
-            tuple: (Path to the downloadable file, original filename)
+            Tuple[Iterator[bytes], str, str, Optional[int]]: File chunks,
+            download filename, media type and size (if known in advance)
         """
         # Get session
         session = self.session_manager.get_session(session_id)
@@ -331,19 +522,127 @@ class SpreadsheetController:
         if not history:
             raise ValueError("No modification history found")
             
-        spreadsheet = history.get_current_state()
-        if not spreadsheet:
+        # State and version are read together so an edit landing in between
+        # cannot cache the old sheet under the new version
+        with self._edit_lock:
+            spreadsheet = history.get_current_state()
+            version = history.version
+        if not spreadsheet or spreadsheet.get_data() is None:
             raise ValueError("No spreadsheet data found")
             
         # Determine output format based on original file
-        original_ext = os.path.splitext(spreadsheet.original_filename)[1].lower()
-        format_type = 'xlsx' if original_ext in ['.xlsx', '.xls'] else 'csv'
-        
-        # Save to download directory
-        download_path = spreadsheet.save(self.file_manager.download_dir, format_type)
-        
-        return download_path, spreadsheet.original_filename
+        name, default_format = self._download_format(spreadsheet)
+        if format_type is None:
+            format_type = default_format
+        elif format_type not in MEDIA_TYPES:
+            raise ValueError(f"Unsupported download format: {format_type}. Supported formats: {', '.join(MEDIA_TYPES)}")
+        
+        chunks, size = self.exporter.export(session_id, version, spreadsheet.get_data(), format_type)
+        return chunks, f"{name}.{format_type}", MEDIA_TYPES[format_type], size
     
+    @staticmethod
+    def _download_format(spreadsheet: Spreadsheet) -> Tuple[str, str]:
+        """Download name (without extension) and default format: the uploaded file's"""
+        filename = spreadsheet.original_filename
+        original_ext = SpreadsheetParser.file_extension(filename)
+        name = filename[:-len(original_ext) - 1] if original_ext else filename
+        return name, FILE_FORMATS.get(original_ext, 'csv')
+
+    def _schedule_precompute(self, session_id: str, history: ModificationHistory) -> None:
+        """
+        Queue background work for the current state, replacing work for older states
+
+        The default download is exported into the export cache; the schema
+        (used by transform_to_schema), the column profiles (used in command
+        prompts) and the table blocks (used by both) are attached to the
+        state's artifacts.
+
+        Args:
+            session_id: Session ID
+            history: The session's history, positioned at the new state
+        """
+        with self._edit_lock:
+            spreadsheet = history.get_current_state()
+            version = history.version
+        if spreadsheet is None or spreadsheet.get_data() is None:
+            return
+
+        tasks = []
+        if 'export' in self.precompute_tasks and self.exporter.cache_bytes > 0:
+            tasks.append(('export', lambda job: self._precompute_export(job, spreadsheet)))
+        for name in ('schema', 'profiles', 'blocks'):
+            if name in self.precompute_tasks:
+                tasks.append((name, lambda job, name=name: self.get_state_artifact(spreadsheet, name)))
+        self.precompute.submit(session_id, version, tasks)
+
+    def _precompute_export(self, job: PrecomputeJob, spreadsheet: Spreadsheet) -> None:
+        """Run the default download through the exporter so it lands in the export cache"""
+        _, format_type = self._download_format(spreadsheet)
+        chunks, size = self.exporter.export(job.session_id, job.version, spreadsheet.get_data(), format_type)
+        try:
+            if size is None:
+                for _ in chunks:
+                    job.checkpoint()
+        finally:
+            # An unfinished export is not cached; closing it stops a producer thread
+            chunks.close()
+
+    def get_state_artifact(self, spreadsheet: Spreadsheet, name: str) -> Any:
+        """
+        Get a state's schema, column profiles or table blocks, building them if needed
+
+        A state derived from another (by a command or grid edits) copies the
+        schema and profile entries of its unchanged columns from the nearest
+        ancestor that has the artifact, and computes only the columns changed
+        since. Table blocks depend on the whole layout and are always built
+        from the state itself. The result is kept on the state, so undo and
+        redo reuse it.
+
+        Args:
+            spreadsheet: History state
+            name: 'schema', 'profiles' or 'blocks'
+
+        Returns:
+            Any: The schema dict, the list of column profiles or the blocks dict
+        """
+        artifact = spreadsheet.artifacts.get(name)
+        if artifact is not None:
+            return artifact
+        if name == 'blocks':
+            spreadsheet.artifacts[name] = self.block_detector.detect(spreadsheet.get_data())
+            return spreadsheet.artifacts[name]
+
+        # States between the nearest ancestor that has the artifact and this one
+        chain = [spreadsheet]
+        while chain[-1].derived_from is not None and len(chain) <= self.artifact_lineage:
+            parent = chain[-1].derived_from[0]
+            if name in parent.artifacts:
+                break
+            chain.append(parent)
+        origin = chain[-1].derived_from
+        if origin is None or name not in origin[0].artifacts:
+            # No ancestor has it (within reach): build this state from scratch
+            chain = [spreadsheet]
+
+        for state in reversed(chain):
+            previous, sources = (None, None)
+            if state.derived_from is not None and name in state.derived_from[0].artifacts:
+                previous = state.derived_from[0].artifacts[name]
+                sources = state.derived_from[1]
+            state.artifacts[name] = self._build_artifact(name, state.get_data(), previous, sources)
+        return spreadsheet.artifacts[name]
+
+    def _build_artifact(self, name: str, df: pd.DataFrame, previous: Any,
+                        sources: Optional[List[Optional[int]]]) -> Any:
+        """Compute a schema or column profiles, copying unchanged columns from previous"""
+        if name == 'schema':
+            return self.script_executor.schema_generator.generate_schema(df, previous, sources)
+        if name == 'profiles':
+            return self.llm_service.prompt_builder.schema_generator.generate_column_profiles(
+                df, previous=previous, sources=sources
+            )
+        raise ValueError(f"Unknown artifact: {name}")
+
     def cleanup_session(self, session_id: str) -> None:
         """
         Clean up a session and its resources
@@ -370,7 +669,7 @@ class SpreadsheetController:
             
             # Remove download files (they're temporary)
             file_id = spreadsheet.file_id
-            for format_type in ['xlsx', 'csv']:
+            for format_type in MEDIA_TYPES:
                 download_path = os.path.join(self.file_manager.download_dir, f"{file_id}.{format_type}")
                 if os.path.exists(download_path):
                     try:
@@ -379,6 +678,8 @@ class SpreadsheetController:
                         print(f"Warning: Could not delete file {download_path}: {e}")
         
         # Remove session
+        self.precompute.cancel(session_id)
+        self.exporter.discard(session_id)
         self.session_manager.remove_session(session_id)
     
     def process_table_changes(self, session_id: str, changes: list) -> dict:
@@ -392,104 +693,100 @@ class SpreadsheetController:
         Returns:
             Dict[str, Any]: Updated spreadsheet view data
         """
-        import pandas as pd
+        new_spreadsheet, history, modified_cells, dtype_changes = self._apply_table_changes(session_id, changes)
 
-        # Get session and current spreadsheet
-        session = self.session_manager.get_session(session_id)
-        if not session:
-            raise ValueError("Session not found or expired")
+        # Rows for the grid view (datetimes formatted, missing values as None)
+        data = new_spreadsheet.to_rows()
 
-        history = session.get_modification_history()
-        if not history:
-            raise ValueError("Modification history not found for this session")
+        return {
+            'data': data,
+            'metadata': new_spreadsheet.get_metadata(),
+            'can_undo': history.can_undo(),
+            'can_redo': history.can_redo(),
+            'version': history.version,
+            'modified_cells': modified_cells.encode(self.modified_cells_format),
+            'dtype_changes': dtype_changes
+        }
 
-        spreadsheet = history.get_current_state()
-        if not spreadsheet:
-            raise ValueError("No spreadsheet data found")
+    def patch_table_changes(self, session_id: str, changes: list, expected_version: int) -> Dict[str, Any]:
+        """
+        Apply table changes streamed by a grid that already shows them and describe the result as a patch
 
-        df = spreadsheet.get_data().copy()
-        modified_cells = []
-
-        for change in changes:
-            if change.get('type') == 'cell':
-                for cell in change.get('changes', []):
-                    row = cell['row']
-                    col = cell['col']
-                    old_value = cell.get('oldValue')
-                    new_value = cell.get('newValue')
-                    # Only update if value actually changed
-                    if row < 0 or col < 0 or row >= len(df.index) or col >= len(df.columns):
-                        continue
-                    col_name = df.columns[col]
-                    if pd.isna(df.iloc[row, col]) and new_value == "":
-                        continue
-                    if df.iloc[row, col] != new_value:
-                        df.iloc[row, col] = new_value
-                        modified_cells.append([row, col])
-            elif change.get('type') == 'row':
-                idx = change.get('index')
-                amt = change.get('amount', 1)
-                if change.get('action') == 'create':
-                    # Insert new rows at idx
-                    for _ in range(amt):
-                        empty_row = [None] * len(df.columns)
-                        df = pd.concat([
-                            df.iloc[:idx],
-                            pd.DataFrame([empty_row], columns=df.columns),
-                            df.iloc[idx:]
-                        ], ignore_index=True)
-                elif change.get('action') == 'remove':
-                    df = df.drop(df.index[range(idx, idx + amt)]).reset_index(drop=True)
-            elif change.get('type') == 'col':
-                idx = change.get('index')
-                amt = change.get('amount', 1)
-                if change.get('action') == 'create':
-                    for i in range(amt):
-                        new_col_name = self._generate_new_col_name(df)
-                        df.insert(idx, new_col_name, None)
-                elif change.get('action') == 'remove':
-                    cols_to_remove = df.columns[idx:idx+amt]
-                    df = df.drop(columns=cols_to_remove)
-
-        # --- Ensure DataFrame is always reindexed after every operation ---
-        df.reset_index(drop=True, inplace=True)
-        df.columns = pd.Index(df.columns)  # Ensure columns are in current order
-
-        # Create new spreadsheet state and update history
-        new_spreadsheet = Spreadsheet(
-            spreadsheet.file_id,
-            spreadsheet.original_filename,
-            df,
-            getattr(spreadsheet, 'file_path', None)
-        )
-        history.add_state(new_spreadsheet)
-        session.update_spreadsheet(new_spreadsheet)
+        Args:
+            session_id: Session ID
+            changes: Change dicts, as for process_table_changes
+            expected_version: History version the changes were made against
 
-        # Prepare view data with datetime handling
-        df_copy = df.copy()
-        for col in df_copy.columns:
-            if pd.api.types.is_datetime64_any_dtype(df_copy[col]):
-                df_copy[col] = df_copy[col].dt.strftime('%Y-%m-%d %H:%M:%S').fillna('')
+        Returns:
+            Dict[str, Any]: {"type": "patch"} with the new version, the
+            shape and the stored values of the edited cells (which may differ
+            from what was typed after dtype coercion), or {"type": "resync"}
+            if the state changed in the meantime and the changes were not applied
+        """
+        session = self.session_manager.get_session(session_id)
+        if not session or not session.get_modification_history():
+            raise ValueError("Session not found or expired")
+        history = session.get_modification_history()
 
-        data = df_copy.replace({float('nan'): None}).values.tolist()
+        with self._edit_lock:
+            if history.version != expected_version:
+                return {'type': 'resync', 'version': history.version}
+            new_spreadsheet, history, modified_cells, dtype_changes = self._apply_table_changes(session_id, changes)
 
+        cells = np.array(modified_cells.to_list(), dtype=np.int64).reshape(-1, 2)
         return {
-            'data': data,
+            'type': 'patch',
+            'version': history.version,
+            'shape': [len(new_spreadsheet.get_data().index), len(new_spreadsheet.get_data().columns)],
+            'cells': {
+                'rows': cells[:, 0].tolist(),
+                'cols': cells[:, 1].tolist(),
+                'values': new_spreadsheet.cell_values(cells[:, 0], cells[:, 1])
+            },
             'metadata': new_spreadsheet.get_metadata(),
             'can_undo': history.can_undo(),
             'can_redo': history.can_redo(),
-            'modified_cells': modified_cells
+            'dtype_changes': dtype_changes
         }
 
-    def _generate_new_col_name(self, df):
-        """
-        Generate a new column name (e.g., 'New Column 1', 'New Column 2', etc.)
-        """
-        base = "New Column"
-        i = 1
-        while f"{base} {i}" in df.columns:
-            i += 1
-        return f"{base} {i}"
+    def _apply_table_changes(self, session_id: str, changes: list) -> Tuple[Spreadsheet, ModificationHistory,
+                                                                           ModifiedCells, List[Dict[str, Any]]]:
+        """Apply table changes to the current state and add the result to the history"""
+        # Get session and current spreadsheet
+        session = self.session_manager.get_session(session_id)
+        if not session:
+            raise ValueError("Session not found or expired")
+
+        history = session.get_modification_history()
+        if not history:
+            raise ValueError("Modification history not found for this session")
+
+        with self._edit_lock, self.precompute.foreground():
+            spreadsheet = history.get_current_state()
+            if not spreadsheet:
+                raise ValueError("No spreadsheet data found")
+
+            # Cell edits are coerced to their column's dtype and written per column;
+            # row and column inserts/removals are single reindexes
+            df, modified_cells, dtype_changes = self.edit_engine.apply(spreadsheet.get_data(), changes)
+
+            # Create new spreadsheet state and update history
+            new_spreadsheet = Spreadsheet(
+                spreadsheet.file_id,
+                spreadsheet.original_filename,
+                df,
+                getattr(spreadsheet, 'file_path', None)
+            )
+            # Inserted columns may reuse a removed column's name, and row inserts and
+            # removals shift the values below them without marking those cells
+            # modified; only cell edits and column removals keep columns
+            if not any(change.get('type') == 'row' or (change.get('type') == 'col' and change.get('action') == 'create')
+                       for change in changes):
+                new_spreadsheet.derived_from = (spreadsheet, unchanged_columns(spreadsheet.get_data(), df, modified_cells))
+            history.add_state(new_spreadsheet)
+            session.update_spreadsheet(new_spreadsheet)
+            self._schedule_precompute(session_id, history)
+        return new_spreadsheet, history, modified_cells, dtype_changes
 
     def get_schema_from_df(self, df: pd.DataFrame) -> Dict[str, Any]:
         """
@@ -503,18 +800,123 @@ class SpreadsheetController:
         """
         return self.script_executor.generate_schema_from_df(df)
 
-    def generate_transformation_prompt(self, source_df: pd.DataFrame, target_df: pd.DataFrame) -> str:
+    def generate_transformation_prompt(self, source_df: pd.DataFrame, target_df: pd.DataFrame,
+                                       session_id: Optional[str] = None) -> str:
         """
         Generate a prompt to transform source_df to match the structure of target_df
         
         Args:
             source_df: The source DataFrame to transform
             target_df: The target DataFrame with the desired structure
+            session_id: Session whose current state is source_df; its precomputed schema is reused
             
         Returns:
             str: A prompt for the LLM to generate a transformation script
         """
-        return self.script_executor.generate_transformation_script(source_df, target_df)
+        source_schema = None
+        session = self.session_manager.get_session(session_id) if session_id else None
+        history = session.get_modification_history() if session else None
+        spreadsheet = history.get_current_state() if history else None
+        if spreadsheet is not None and spreadsheet.get_data() is source_df:
+            source_schema = self.get_state_artifact(spreadsheet, 'schema')
+        return self.script_executor.generate_transformation_script(source_df, target_df, source_schema)
+
+    def transform_to_schema(self, session_id: str, target_df: pd.DataFrame,
+                            target_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Transform the current state to the target schema
+
+        Columns are matched by name, type and values, separately for each
+        table block when the sheet holds several. Confident plans are
+        applied directly (rename, cast, reorder, and the tables stacked);
+        otherwise the plans and the table coordinates are passed to the LLM
+        in the transformation prompt.
+
+        Args:
+            session_id: Session ID
+            target_df: Target example data
+            target_schema: Schema of target_df if already computed
+
+        Returns:
+            Dict[str, Any]: Updated spreadsheet view data, with the mapping
+            and the method used ('mapping' or 'llm')
+        """
+        session = self.session_manager.get_session(session_id)
+        if not session:
+            raise ValueError("Session not found or expired")
+
+        history = session.get_modification_history()
+        if not history:
+            raise ValueError("Modification history not found for this session")
+
+        current_spreadsheet = history.get_current_state()
+        if not current_spreadsheet:
+            raise ValueError("No spreadsheet data found")
+
+        source_df = current_spreadsheet.get_data()
+        source_schema = self.get_state_artifact(current_spreadsheet, 'schema')
+        blocks = self.get_state_artifact(current_spreadsheet, 'blocks')
+        if target_schema is None:
+            target_schema = self.get_schema_from_df(target_df)
+
+        if single_table(blocks):
+            frames = [source_df]
+            mappings = [self.schema_mapper.plan(source_df, source_schema, target_schema, target_df)]
+            mapping_info = mappings[0].to_dict()
+        else:
+            # One plan per table block, each against its own header
+            frames = [self.block_detector.extract(source_df, table) for table in blocks['tables']]
+            mappings = [
+                self.schema_mapper.plan(frame, self.get_schema_from_df(frame), target_schema, target_df)
+                for frame in frames
+            ]
+            mapping_info = {
+                'confidence': min((mapping.confidence for mapping in mappings), default=0.0),
+                'tables': [
+                    {'rows': table['rows'], 'cols': table['cols'], **mapping.to_dict()}
+                    for table, mapping in zip(blocks['tables'], mappings)
+                ]
+            }
+
+        if not mappings or min(mapping.confidence for mapping in mappings) < self.schema_map_min_confidence:
+            self.metrics.increment('schema_map.escalated')
+            prompt = self.script_executor.schema_generator.get_transformation_prompt(
+                source_df, target_schema, source_schema, mapping_info, blocks
+            )
+            view = self.process_command(session_id, prompt)
+            view['schema_mapping'] = mapping_info
+            view['transform_method'] = 'llm'
+            return view
+
+        self.metrics.increment('schema_map.applied')
+        if len(frames) == 1:
+            new_df = mappings[0].apply(frames[0])
+        else:
+            new_df = pd.concat([mapping.apply(frame) for mapping, frame in zip(mappings, frames)], ignore_index=True)
+        modified_cells = diff_frames(source_df, new_df)
+        new_spreadsheet = Spreadsheet(
+            current_spreadsheet.file_id,
+            current_spreadsheet.original_filename,
+            new_df
+        )
+        new_spreadsheet.derived_from = (
+            current_spreadsheet, unchanged_columns(source_df, new_df, modified_cells)
+        )
+        with self._edit_lock:
+            history.add_state(new_spreadsheet)
+            session.update_spreadsheet(new_spreadsheet)
+            self._schedule_precompute(session_id, history)
+
+        return {
+            'data': new_spreadsheet.to_rows(),
+            'metadata': new_spreadsheet.get_metadata(),
+            'can_undo': history.can_undo(),
+            'can_redo': history.can_redo(),
+            'version': history.version,
+            'modified_cells': modified_cells.encode(self.modified_cells_format),
+            'schema_mapping': mapping_info,
+            'transform_method': 'mapping'
+        }
 
     def get_spreadsheet_df(self, session_id: str) -> pd.DataFrame:
         """
@@ -540,4 +942,28 @@ class SpreadsheetController:
         if not spreadsheet:
             raise ValueError("No spreadsheet data found")
         
-        return spreadsheet.get_data()
\ No newline at end of file
+        return spreadsheet.get_data()
+    
+    def run_query(self, session_id: str, query: str) -> Dict[str, Any]:
+        """
+        Run a read-only SQL query against the current spreadsheet state
+
+        The sheet is exposed as the table 'df'; the query result is returned
+        but does not become a new state.
+
+        Args:
+            session_id: Session ID
+            query: SELECT-style SQL query
+
+        Returns:
+            Dict[str, Any]: Result headers, rows and whether the rows were truncated
+        """
+        df = self.get_spreadsheet_df(session_id)
+        result, truncated = self.script_executor.run_query(query, df, self.query_max_rows)
+        rows = Spreadsheet(session_id, '', result).to_rows()
+        return {
+            'headers': [str(column) for column in result.columns],
+            'data': rows,
+            'row_count': len(rows),
+            'truncated': truncated
+        }
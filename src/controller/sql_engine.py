@@ -0,0 +1,168 @@
+"""
+SQL Engine module
+------------------
+Runs SQL over a spreadsheet DataFrame with an embedded DuckDB database
+"""
+
+import os
+import time
+import threading
+from typing import Optional
+
+import pandas as pd
+
+from src.controller.execution_pool import ScriptExecutionError, ScriptTimeoutError, ScriptCancelledError
+
+
+# First line of a generated script that is SQL rather than Python
+SQL_MARKER = '-- sql'
+
+# Name the sheet is exposed under, matching the DataFrame name in Python scripts
+TABLE_NAME = 'df'
+
+
+def is_sql_script(script: str) -> bool:
+    """
+    Check whether a generated script is a SQL query
+
+    Args:
+        script: The generated script
+
+    Returns:
+        bool: True if the first non-blank line is the SQL marker
+    """
+    for line in script.splitlines():
+        if line.strip():
+            return line.strip().lower().startswith(SQL_MARKER)
+    return False
+
+
+def sql_body(script: str) -> str:
+    """
+    Strip the SQL marker line from a generated script
+
+    Args:
+        script: A script for which is_sql_script is True
+
+    Returns:
+        str: The query
+    """
+    lines = script.strip().splitlines()
+    return "\n".join(lines[1:]).strip().rstrip(';').strip()
+
+
+class SQLEngine:
+    """
+    Executes read-only SQL against a DataFrame
+
+    Each query gets its own in-memory DuckDB connection with file, network
+    and extension access disabled. The DataFrame is registered as the view
+    'df' and scanned in place (numeric and datetime columns are read
+    without copying); the query result becomes the new DataFrame.
+    """
+
+    def __init__(self, memory_limit_mb: int = 0, threads: int = 0):
+        """
+        Initialize the SQL engine
+
+        Args:
+            memory_limit_mb: DuckDB memory limit per query (0 for DuckDB's default)
+            threads: DuckDB worker threads per query (0 for one per core)
+        """
+        self.memory_limit_mb = memory_limit_mb
+        self.threads = threads
+
+    @property
+    def available(self) -> bool:
+        """Whether the optional duckdb package is installed"""
+        try:
+            import duckdb  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def execute(self, query: str, df: pd.DataFrame, timeout: Optional[float] = None,
+                cancel_event: Optional[threading.Event] = None) -> pd.DataFrame:
+        """
+        Run a query against a DataFrame
+
+        Args:
+            query: A validated SELECT-style query over the table 'df'
+            df: The spreadsheet data
+            timeout: Seconds after which the query is interrupted
+            cancel_event: Event that interrupts the query when set
+
+        Returns:
+            pd.DataFrame: The query result
+
+        Raises:
+            ScriptExecutionError: If duckdb is missing or the query fails
+            ScriptTimeoutError: If the query ran past the timeout
+            ScriptCancelledError: If cancel_event was set
+        """
+        try:
+            import duckdb
+        except ImportError:
+            raise ScriptExecutionError("SQL execution requires the 'duckdb' package", 'ImportError')
+
+        connection = duckdb.connect(':memory:')
+        try:
+            self._configure(connection)
+            try:
+                connection.register(TABLE_NAME, self._scannable(df))
+            except duckdb.Error as e:
+                raise ScriptExecutionError(f"The sheet cannot be queried with SQL: {e}", type(e).__name__)
+
+            done = threading.Event()
+            interrupted = []
+
+            def watch() -> None:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while not done.wait(0.05):
+                    if cancel_event is not None and cancel_event.is_set():
+                        interrupted.append('cancelled')
+                    elif deadline is not None and time.monotonic() >= deadline:
+                        interrupted.append('timeout')
+                    else:
+                        continue
+                    connection.interrupt()
+                    return
+
+            watcher = threading.Thread(target=watch, name='sql-watchdog', daemon=True)
+            watcher.start()
+            try:
+                return connection.execute(query).df()
+            except duckdb.Error as e:
+                if interrupted and interrupted[0] == 'cancelled':
+                    raise ScriptCancelledError("Query was cancelled", 'Cancelled')
+                if interrupted:
+                    raise ScriptTimeoutError("Query execution timed out", 'TimeoutError')
+                message = str(e)
+                raise ScriptExecutionError(message, type(e).__name__, f"{type(e).__name__}: {message}")
+            finally:
+                done.set()
+                watcher.join()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _scannable(df: pd.DataFrame) -> pd.DataFrame:
+        """Expose string extension columns as object columns, which DuckDB scans natively"""
+        positions = [position for position, dtype in enumerate(df.dtypes) if isinstance(dtype, pd.StringDtype)]
+        if not positions:
+            return df
+        view = df.copy(deep=False)
+        for position in positions:
+            view.isetitem(position, view.iloc[:, position].astype(object))
+        return view
+
+    def _configure(self, connection) -> None:
+        """Restrict a fresh connection to in-memory work on registered data"""
+        connection.execute("SET enable_external_access = false")
+        connection.execute("SET autoinstall_known_extensions = false")
+        connection.execute("SET autoload_known_extensions = false")
+        if self.memory_limit_mb > 0:
+            connection.execute(f"SET memory_limit = '{int(self.memory_limit_mb)}MB'")
+        connection.execute(f"SET threads = {int(self.threads) or os.cpu_count() or 1}")
+        # Queries cannot re-enable anything above
+        connection.execute("SET lock_configuration = true")
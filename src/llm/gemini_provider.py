@@ -0,0 +1,136 @@
+"""
+Gemini Provider module
+-----------------
+Sends prompts to the Google Gemini API
+"""
+
+import os
+from typing import Dict, Any, Optional
+import google.generativeai as genai
+from src.llm.llm_provider import LLMProvider, LLMProviderError
+from src.llm.prompt_builder import PromptContext
+
+
+class GeminiProvider(LLMProvider):
+    """
+    LLM provider backed by Google Gemini
+    """
+
+    def __init__(self, model: str):
+        """
+        Initialize the Gemini provider
+
+        Args:
+            model: Gemini model name
+        """
+        super().__init__(model)
+        self.api_key = os.getenv('GEMINI_API_KEY')
+
+        if not self.api_key:
+            raise ValueError("GEMINI_API_KEY environment variable not set")
+
+        # Configure the Gemini API
+        genai.configure(api_key=self.api_key)
+
+        self.safety_settings = [
+            {
+                "category": "HARM_CATEGORY_HARASSMENT",
+                "threshold": "BLOCK_NONE"
+            },
+            {
+                "category": "HARM_CATEGORY_HATE_SPEECH",
+                "threshold": "BLOCK_NONE"
+            },
+            {
+                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                "threshold": "BLOCK_NONE"
+            },
+            {
+                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+                "threshold": "BLOCK_NONE"
+            }
+        ]
+        self._models: Dict[Any, Any] = {}
+
+    @property
+    def name(self) -> str:
+        return f"gemini:{self.model}"
+
+    def _get_model(self, system_instruction: str, generation_config: Dict[str, Any]):
+        """
+        Get a Gemini model bound to a system instruction, reusing it across calls
+
+        Args:
+            system_instruction: The stable prompt prefix
+            generation_config: Sampling parameters for the model
+
+        Returns:
+            The configured GenerativeModel, or None if the installed SDK does
+            not support system instructions
+        """
+        key = (system_instruction, tuple(sorted(generation_config.items())))
+        model = self._models.get(key)
+        if model is None:
+            try:
+                model = genai.GenerativeModel(
+                    model_name=self.model,
+                    generation_config=genai.types.GenerationConfig(**generation_config),
+                    safety_settings=self.safety_settings,
+                    system_instruction=system_instruction
+                )
+            except TypeError:
+                return None
+            self._models[key] = model
+        return model
+
+    def generate(self, prompt_context: PromptContext, generation_config: Dict[str, Any],
+                 stats: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> str:
+        request_options = {'timeout': timeout} if timeout is not None else None
+        try:
+            # The static instructions go in the system instruction so the
+            # provider sees an identical prefix on every request
+            model = self._get_model(prompt_context.prefix, generation_config)
+            if model is not None:
+                response = model.generate_content(prompt_context.body, request_options=request_options)
+            else:
+                model = genai.GenerativeModel(
+                    model_name=self.model,
+                    generation_config=genai.types.GenerationConfig(**generation_config),
+                    safety_settings=self.safety_settings
+                )
+                response = model.generate_content(prompt_context.text, request_options=request_options)
+        except Exception as e:
+            raise LLMProviderError(f"Gemini API request failed: {str(e)}")
+
+        # Record the provider's own token accounting when available
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None and stats is not None:
+            stats['prompt_tokens'] = getattr(usage, 'prompt_token_count', None)
+            stats['cached_prompt_tokens'] = getattr(usage, 'cached_content_token_count', None)
+            stats['output_tokens'] = getattr(usage, 'candidates_token_count', None)
+
+        # Robustly extract and return the text or error
+        # 1. If response.text exists and is not empty, return it
+        try:
+            if response.text and response.text.strip():
+                return response.text
+        except ValueError:
+            # Accessing .text raises when the candidate has no parts
+            pass
+
+        # 2. If candidates exist, check for content or safety block
+        if hasattr(response, 'candidates') and response.candidates:
+            candidate = response.candidates[0]
+            # If content exists
+            if hasattr(candidate, 'content') and getattr(candidate.content, 'parts', None):
+                parts = candidate.content.parts
+                if parts and hasattr(parts[0], 'text') and parts[0].text.strip():
+                    return parts[0].text
+            # If blocked by safety
+            if hasattr(candidate, 'safety_ratings') and candidate.safety_ratings:
+                safety_issues = [getattr(rating, 'category', str(rating)) for rating in candidate.safety_ratings]
+                raise LLMProviderError(f"Content was blocked due to safety concerns: {', '.join(map(str, safety_issues))}")
+            # No valid content
+            raise LLMProviderError("No valid response was generated. The model may have encountered an issue processing the request.")
+        # 3. Fallback: empty response
+        raise LLMProviderError("Empty response received from Gemini API.")
@@ -0,0 +1,80 @@
+"""
+LLM Provider module
+-----------------
+Common interface for the backends that turn prompts into scripts
+"""
+
+import abc
+from typing import Dict, Any, Optional
+from src.llm.prompt_builder import PromptContext
+
+
+class LLMProviderError(Exception):
+    """
+    Raised when a provider fails to produce a response
+    """
+
+
+class LLMProvider(abc.ABC):
+    """
+    Base class for LLM backends
+    """
+
+    def __init__(self, model: str):
+        """
+        Initialize the provider
+
+        Args:
+            model: Name of the model this provider talks to
+        """
+        self.model = model
+
+    @property
+    def name(self) -> str:
+        """Short provider name used in logs and metrics"""
+        return self.__class__.__name__
+
+    @abc.abstractmethod
+    def generate(self, prompt_context: PromptContext, generation_config: Dict[str, Any],
+                 stats: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> str:
+        """
+        Generate a response for a prompt
+
+        Args:
+            prompt_context: The prompt, split into stable prefix and body
+            generation_config: Sampling parameters (temperature, top_p, ...)
+            stats: Optional dict that receives provider token accounting
+            timeout: Seconds the call may take before giving up (None for no limit)
+
+        Returns:
+            str: The raw model response text
+
+        Raises:
+            LLMProviderError: If no usable response could be produced
+        """
+
+
+def create_provider(provider_name: str, model: str) -> LLMProvider:
+    """
+    Create the provider selected by configuration
+
+    Providers are imported lazily so the local stand-in works on machines
+    without the Google SDK or network access.
+
+    Args:
+        provider_name: 'gemini' or 'local'
+        model: Model name passed to the provider
+
+    Returns:
+        LLMProvider: The provider instance
+    """
+    provider_name = (provider_name or 'gemini').strip().lower()
+
+    if provider_name == 'gemini':
+        from src.llm.gemini_provider import GeminiProvider
+        return GeminiProvider(model)
+    if provider_name == 'local':
+        from src.llm.local_provider import LocalStandInProvider
+        return LocalStandInProvider(model)
+
+    raise ValueError(f"Unknown LLM provider: {provider_name}. Supported providers: gemini, local")
@@ -1,31 +1,56 @@
 """
-Gemini LLM Service module
+LLM Service module
 -----------------
-Handles interactions with the Google Gemini API to generate Python scripts
+Handles interactions with the configured LLM provider to generate Python scripts
 """
 import os
-import json
 import re
-from typing import Dict, Any
-import google.generativeai as genai
+import logging
+from typing import Dict, Any, Optional, List, Tuple
+import pandas as pd
 from dotenv import load_dotenv
+from src.llm.prompt_builder import PromptContextBuilder
+from src.llm.llm_provider import create_provider, LLMProviderError
+from src.llm.model_router import ModelRouter
+from src.controller.metrics import MetricsRegistry
+from src.controller.sql_engine import SQL_MARKER, is_sql_script
 
 # Load environment variables
 load_dotenv()
 
 class LLMService:
     """
-    Service for interacting with Google Gemini API
+    Service that turns user commands into Python scripts using an LLM provider
     """
-    def __init__(self):
-        self.api_key = os.getenv('GEMINI_API_KEY')
+    def __init__(self, metrics: Optional[MetricsRegistry] = None):
+        """
+        Initialize the LLM service
+
+        Args:
+            metrics: Registry receiving per-model latency, hedge and failover metrics
+        """
         self.model = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')  # Default to gemini-2.0-flash if not set
         
-        if not self.api_key:
-            raise ValueError("GEMINI_API_KEY environment variable not set")
+        # 'gemini' talks to Google; 'local' is the offline stand-in for load tests
+        default_provider = os.getenv('LLM_PROVIDER', 'gemini')
+        
+        # LLM_MODELS lists models in order of preference, optionally as provider:model
+        model_specs = [m.strip() for m in os.getenv('LLM_MODELS', self.model).split(',') if m.strip()]
+        providers = []
+        for spec in model_specs:
+            provider_name, _, model = spec.rpartition(':')
+            providers.append(create_provider(provider_name or default_provider, model))
+        self.model = providers[0].model
         
-        # Configure the Gemini API
-        genai.configure(api_key=self.api_key)
+        self.provider = ModelRouter(
+            providers,
+            timeout=float(os.getenv('LLM_TIMEOUT_SECONDS', '60')),
+            hedge_delay=float(os.getenv('LLM_HEDGE_DELAY_SECONDS', '5')),
+            max_hedges=int(os.getenv('LLM_MAX_HEDGES', '1')),
+            metrics=metrics,
+            failure_threshold=int(os.getenv('LLM_CIRCUIT_FAILURES', '3')),
+            reset_timeout=float(os.getenv('LLM_CIRCUIT_RESET_SECONDS', '30'))
+        )
         
         # Set up the model
         self.generation_config = {
@@ -34,51 +59,59 @@ class LLMService:
             "top_k": 32,
             "max_output_tokens": 10240,
         }
-        
-        self.safety_settings = [
-            {
-                "category": "HARM_CATEGORY_HARASSMENT",
-                "threshold": "BLOCK_NONE"
-            },
-            {
-                "category": "HARM_CATEGORY_HATE_SPEECH",
-                "threshold": "BLOCK_NONE"
-            },
-            {
-                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                "threshold": "BLOCK_NONE"
-            },
-            {
-                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                "threshold": "BLOCK_NONE"
-            }
-        ]
 
-    def generate_script(self, spreadsheet_data: Dict[str, Any], command: str) -> str:
+        # LLM_SQL_MODE lets the model answer with a DuckDB query instead of a Python script
+        self.sql_mode = os.getenv('LLM_SQL_MODE', 'false').lower() in ('1', 'true', 'yes')
+        # Spreadsheet context is trimmed to fit this many estimated tokens
+        self.prompt_builder = PromptContextBuilder(
+            token_budget=int(os.getenv('LLM_PROMPT_TOKEN_BUDGET', '6000')),
+            allow_sql=self.sql_mode
+        )
+
+    def generate_script(self, spreadsheet_df: pd.DataFrame, command: str, stats: Optional[Dict[str, Any]] = None,
+                        feedback: Optional[List[Tuple[str, str]]] = None,
+                        generation_overrides: Optional[Dict[str, Any]] = None,
+                        profiles: Optional[List[Dict[str, Any]]] = None,
+                        blocks: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Generate a script that applies a user command to a DataFrame
+
+        Args:
+            spreadsheet_df: The current spreadsheet data
+            command: The user command
+            stats: Optional dict that receives prompt token counts for this request
+            feedback: Earlier (script, error) attempts to repair, oldest first
+            generation_overrides: Sampling parameters replacing the defaults for this call
+            profiles: Precomputed column profiles of spreadsheet_df, if available
+            blocks: Table blocks of spreadsheet_df (BlockDetector.detect), if available
+
+        Returns:
+            str: The generated Python script
+
+        Raises:
+            LLMProviderError: If the provider failed to produce a response
+        """
         try:
-            # The input 'spreadsheet_data' is already a dictionary.
-            # No need to call json.loads()
-            data_obj = spreadsheet_data 
-            headers = data_obj.get('headers', [])
-            metadata = data_obj.get('metadata', {})
-            data_sample = data_obj.get('data', [])[:5] # Ensure data_sample is a list of dicts
-            
-            # If data_sample itself is a dict (e.g. from to_dict('records')), it's fine.
-            # If data_obj['data'] was a list of lists, it would need conversion.
-            # Based on Spreadsheet.to_json, data_obj['data'] is already a list of dicts.
-
             # Process the command to handle cell references if present
             processed_command = self._process_cell_references(command)
             
-            prompt = self._create_prompt(headers, metadata, data_sample, processed_command)
-            response = self._call_gemini_api(prompt)
-            # If the response is a Gemini safety block message, return as error script
-            if response.startswith("Content was blocked due to safety concerns:"):
-                return self.handle_api_error(Exception(response))
+            prompt_context = self.prompt_builder.build(spreadsheet_df, processed_command, feedback, profiles, blocks)
+            prompt_stats = prompt_context.get_stats()
+            prompt_stats['provider'] = self.provider.name
+            try:
+                generation_config = {**self.generation_config, **(generation_overrides or {})}
+                response = self.provider.generate(prompt_context, generation_config, prompt_stats)
+            finally:
+                logging.info(f"LLMService: prompt tokens {prompt_stats}")
+                if stats is not None:
+                    stats.update(prompt_stats)
+
             script = self._extract_script(response)
             return script
+        except LLMProviderError:
+            raise
         except Exception as e:
-            return self.handle_api_error(e)
+            raise LLMProviderError(f"Failed to process command: {e}") from e
 
     def _process_cell_references(self, command: str) -> str:
         """Process any cell references in the command to make them clearer for the LLM"""
@@ -127,109 +160,14 @@ class LLMService:
         
         return processed
 
-    def _create_prompt(self, headers: list, metadata: Dict[str, Any], data_sample: list, command: str) -> str:
-        prompt = f"""You are an expert Python programmer tasked with modifying a spreadsheet based on user instructions.
-<spreadsheet_context>
-Headers: {headers}
-Row count: {metadata.get('rows', 'unknown')}
-Sample data (first few rows): {json.dumps(data_sample)}
-</spreadsheet_context>
-
-<user_command>
-{command}
-</user_command>
-
-<task>
-Write a Python script that modifies the Pandas DataFrame named 'df' according to the user's command.
-The script should handle edge cases and error conditions gracefully.
-DO NOT import modules other than pandas and numpy, which are already imported.
-</task>
-
-<instructions>
-1. The DataFrame is already loaded and available as 'df'
-2. Your modifications should be made directly to 'df'
-3. Only use pandas and numpy functions
-4. Do not include any explanations or comments in your response, ONLY THE PYTHON CODE
-5. Do not attempt to write to files or perform any I/O operations
-6. Output ONLY the Python code - no other text
-7. Ensure your code handles potential errors gracefully
-
-Important notes on cell references:
-- When the user references specific cells with # notation, they're using Excel-style references
-- For a single cell (like A1), use df.iloc[0, 0] (zero-indexed)
-- For a column (like column A), use df.iloc[:, 0]
-- For a row (like row 1), use df.iloc[0, :]
-- For cell ranges (like A1:C3), use df.iloc[0:3, 0:3]
-- For column ranges (like A:C), use df.iloc[:, 0:3]
-- For row ranges (like 1:3), use df.iloc[0:3, :]
-- Remember that Excel-style references use 1-based indexing for rows but df.iloc uses 0-based indexing
-- Multiple selections may be indicated with commas (like A1, B2, C3)
-
-Cell reference conversion examples:
-- A1 = df.iloc[0, 0]
-- B2 = df.iloc[1, 1] 
-- Column A = df.iloc[:, 0]
-- Row 5 = df.iloc[4, :]
-- A1:C3 = df.iloc[0:3, 0:3]
-- A:C = df.iloc[:, 0:3]
-- 1:5 = df.iloc[0:5, :]
-</instructions>
-
-Provide only the Python code needed to execute the requested modification:"""
-        return prompt
-
-    def _call_gemini_api(self, prompt: str) -> str:
-        try:
-            # Initialize the Gemini model
-            generation_config = genai.types.GenerationConfig(**self.generation_config)
-            model = genai.GenerativeModel(
-                model_name=self.model,
-                generation_config=generation_config,
-                safety_settings=self.safety_settings
-            )
-            
-            # Generate content
-            response = model.generate_content(prompt)
-            
-            # Robustly extract and return the text or error
-            # 1. If response.text exists and is not empty, return it
-            if hasattr(response, 'text') and response.text and response.text.strip():
-                return response.text
-
-            # 2. If candidates exist, check for content or safety block
-            if hasattr(response, 'candidates') and response.candidates:
-                candidate = response.candidates[0]
-                # If content exists
-                if hasattr(candidate, 'content') and getattr(candidate.content, 'parts', None):
-                    parts = candidate.content.parts
-                    if parts and hasattr(parts[0], 'text') and parts[0].text.strip():
-                        return parts[0].text
-                # If blocked by safety
-                if hasattr(candidate, 'safety_ratings') and candidate.safety_ratings:
-                    safety_issues = [getattr(rating, 'category', str(rating)) for rating in candidate.safety_ratings]
-                    return f"Content was blocked due to safety concerns: {', '.join(safety_issues)}"
-                # No valid content
-                return "No valid response was generated. The model may have encountered an issue processing the request."
-            # 3. Fallback: empty response
-            return "Empty response received from Gemini API."
-                
-        except Exception as e:
-            # Always return a string so the frontend can display a user-friendly error
-            return f"Gemini API request failed: {str(e)}"
-
     def _extract_script(self, response: str) -> str:
-        code_block_pattern = r'```(?:python)?\s*([\s\S]*?)\s*```'
+        code_block_pattern = r'```(python|sql)?\s*([\s\S]*?)\s*```'
         matches = re.findall(code_block_pattern, response)
         if matches:
-            return matches[0].strip()
+            language, code = matches[0]
+            code = code.strip()
+            # SQL answers are marked so the executor runs them on the SQL engine
+            if language == 'sql' and not is_sql_script(code):
+                return f"{SQL_MARKER}\n{code}"
+            return code
         return response.strip()
-
-    def handle_api_error(self, error: Exception) -> str:
-        error_message = str(error)
-        script = f"""
-# Error occurred in LLM API: {error_message}
-# Returning original DataFrame without modifications
-# Add error column to inform user
-df['ERROR'] = "Failed to process command: {error_message}"
-"""
-        return script.strip()
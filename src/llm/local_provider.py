@@ -0,0 +1,261 @@
+"""
+Local Provider module
+-----------------
+Deterministic offline stand-in for the LLM, used for load tests and benchmarks
+"""
+
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from typing import Dict, Any, Optional, List, Tuple, Callable
+from src.llm.llm_provider import LLMProvider, LLMProviderError
+from src.llm.prompt_builder import PromptContext, column_letter
+
+
+class LatencyModel:
+    """
+    Samples simulated response latencies from a configured distribution
+    """
+
+    def __init__(self, spec: str):
+        """
+        Initialize the latency model
+
+        Args:
+            spec: Distribution spec in milliseconds, one of
+                'fixed:<ms>', 'uniform:<low>,<high>', 'normal:<mean>,<std>'
+                or 'lognormal:<median>,<sigma>'
+        """
+        self.spec = spec.strip() or 'fixed:0'
+        kind, _, params = self.spec.partition(':')
+        self.kind = kind.lower()
+        try:
+            self.params = [float(p) for p in params.split(',') if p.strip()]
+        except ValueError:
+            raise ValueError(f"Invalid latency spec: {spec}")
+
+        expected = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}
+        if self.kind not in expected or len(self.params) != expected[self.kind]:
+            raise ValueError(f"Invalid latency spec: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        """
+        Draw one latency
+
+        Args:
+            rng: Random source to draw from
+
+        Returns:
+            float: Latency in seconds
+        """
+        if self.kind == 'fixed':
+            ms = self.params[0]
+        elif self.kind == 'uniform':
+            ms = rng.uniform(self.params[0], self.params[1])
+        elif self.kind == 'normal':
+            ms = rng.gauss(self.params[0], self.params[1])
+        else:
+            median, sigma = self.params
+            ms = median * rng.lognormvariate(0, sigma)
+        return max(ms, 0.0) / 1000
+
+
+class LocalStandInProvider(LLMProvider):
+    """
+    LLM provider that answers from canned and rule-generated scripts
+
+    Responses only depend on the seed, the prompt, the generation config and
+    how many times that same prompt was asked before, so runs are repeatable
+    even when requests interleave across threads.
+    """
+
+    # Script returned when the simulated model produces a broken answer
+    BROKEN_SCRIPT = "df['__missing_column__'] = df['__missing_column__'] + 1"
+
+    def __init__(self, model: str):
+        """
+        Initialize the stand-in provider from LOCAL_LLM_* environment variables
+
+        Args:
+            model: Model name, only used for reporting
+        """
+        super().__init__(model)
+        self.seed = int(os.getenv('LOCAL_LLM_SEED', '0'))
+        self.latency = LatencyModel(os.getenv('LOCAL_LLM_LATENCY', 'fixed:0'))
+        self.failure_rate = float(os.getenv('LOCAL_LLM_FAILURE_RATE', '0'))
+        self.bad_script_rate = float(os.getenv('LOCAL_LLM_BAD_SCRIPT_RATE', '0'))
+        self.canned_scripts = self._load_canned_scripts(os.getenv('LOCAL_LLM_SCRIPTS'))
+
+        self._prompt_counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.rules: List[Tuple[re.Pattern, Callable[[re.Match, Dict[str, int]], str]]] = [
+            (re.compile(r"add (?:a |an )?(?:new )?column (?:named |called )?['\"]?(?P<name>[\w ]+?)['\"]? (?:that |which )?(?:is the )?sums? (?:of )?(?:columns? )?(?P<a>[\w ]+?) and (?P<b>[\w ]+)$", re.I),
+             lambda m, cols: f"df[{m.group('name')!r}] = {self._col(m.group('a'), cols)} + {self._col(m.group('b'), cols)}"),
+            (re.compile(r"add (?:a |an )?(?:new )?column (?:named |called )?['\"]?(?P<name>[\w ]+?)['\"]?$", re.I),
+             lambda m, cols: f"df[{m.group('name')!r}] = np.nan"),
+            (re.compile(r"(?:delete|remove|drop) (?:the )?column (?P<col>[\w ]+)$", re.I),
+             lambda m, cols: f"df = df.drop(columns=[df.columns[{self._col_index(m.group('col'), cols)}]])"),
+            (re.compile(r"(?:delete|remove|drop) (?:the )?row (?P<row>\d+)$", re.I),
+             lambda m, cols: f"df = df.drop(index={int(m.group('row')) - 1}).reset_index(drop=True)"),
+            (re.compile(r"sort (?:the )?(?:data |rows )?by (?:column )?(?P<col>[\w ]+?)(?P<desc> desc(?:ending)?)?$", re.I),
+             lambda m, cols: f"df = df.sort_values(by=df.columns[{self._col_index(m.group('col'), cols)}], ascending={not m.group('desc')}).reset_index(drop=True)"),
+            (re.compile(r"(?P<case>upper|lower)case (?:column )?(?P<col>[\w ]+)$", re.I),
+             lambda m, cols: f"df.iloc[:, {self._col_index(m.group('col'), cols)}] = {self._col(m.group('col'), cols)}.astype(str).str.{m.group('case').lower()}()"),
+            (re.compile(r"multiply (?:column )?(?P<col>[\w ]+?) by (?P<factor>-?[\d.]+)$", re.I),
+             lambda m, cols: f"df.iloc[:, {self._col_index(m.group('col'), cols)}] = pd.to_numeric({self._col(m.group('col'), cols)}, errors='coerce') * {float(m.group('factor'))}"),
+            (re.compile(r"fill (?:empty|missing|null|blank) (?:cells|values)?\s*with (?P<value>.+)$", re.I),
+             lambda m, cols: f"df = df.fillna({self._literal(m.group('value'))})"),
+            (re.compile(r"remove duplicates?(?: rows)?$", re.I),
+             lambda m, cols: "df = df.drop_duplicates().reset_index(drop=True)"),
+        ]
+
+    @property
+    def name(self) -> str:
+        return f"local:{self.model}"
+
+    def generate(self, prompt_context: PromptContext, generation_config: Dict[str, Any],
+                 stats: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> str:
+        rng = self._call_rng(prompt_context, generation_config)
+
+        latency = self.latency.sample(rng)
+        if timeout is not None and latency > timeout:
+            time.sleep(max(timeout, 0))
+            raise LLMProviderError(f"{self.name} timed out after {timeout:.2f}s")
+        time.sleep(latency)
+
+        if rng.random() < self.failure_rate:
+            raise LLMProviderError(f"Simulated failure from {self.name}")
+
+        if stats is not None:
+            stats['prompt_tokens'] = None
+            stats['output_tokens'] = None
+
+        if rng.random() < self.bad_script_rate:
+            return f"```python\n{self.BROKEN_SCRIPT}\n```"
+
+        return f"```python\n{self._script_for(prompt_context.body)}\n```"
+
+    def _call_rng(self, prompt_context: PromptContext, generation_config: Dict[str, Any]) -> random.Random:
+        """
+        Create the random source for one call
+
+        Args:
+            prompt_context: The prompt being answered
+            generation_config: Sampling parameters of the call
+
+        Returns:
+            random.Random: Seeded from the provider seed, the prompt, the
+            generation config and the repeat count of that prompt
+        """
+        key = hashlib.sha256(
+            f"{self.model}\0{prompt_context.text}\0{sorted(generation_config.items())}".encode('utf-8')
+        ).hexdigest()
+        with self._lock:
+            repeat = self._prompt_counts.get(key, 0)
+            self._prompt_counts[key] = repeat + 1
+        return random.Random(f"{self.seed}:{key}:{repeat}")
+
+    def _script_for(self, body: str) -> str:
+        """
+        Map a prompt body to a script
+
+        Canned scripts are tried first, then the built-in rules. Commands that
+        match nothing get a script that leaves the data unchanged.
+
+        Args:
+            body: The per-request prompt body
+
+        Returns:
+            str: Python script
+        """
+        command = self._extract_command(body)
+        columns = self._extract_columns(body)
+
+        for pattern, script in self.canned_scripts:
+            if pattern.search(command):
+                return script
+
+        for pattern, build in self.rules:
+            match = pattern.search(command)
+            if match:
+                try:
+                    return build(match, columns)
+                except KeyError:
+                    break
+
+        return "df = df.copy()"
+
+    @staticmethod
+    def _extract_command(body: str) -> str:
+        """Pull the user command out of the prompt body"""
+        match = re.search(r"<user_command>\s*([\s\S]*?)\s*</user_command>", body)
+        command = match.group(1) if match else body
+        return " ".join(command.split()).rstrip('.')
+
+    @staticmethod
+    def _extract_columns(body: str) -> Dict[str, int]:
+        """
+        Map column names and letters to positions using the context lines
+
+        Args:
+            body: The per-request prompt body
+
+        Returns:
+            Dict[str, int]: Lower-cased names and letters to column index
+        """
+        columns: Dict[str, int] = {}
+        for index, match in enumerate(re.finditer(r"^([A-Z]+): (.+?) \|", body, re.M)):
+            letter, name = match.groups()
+            columns.setdefault(name.strip().lower(), index)
+            columns.setdefault(letter.lower(), index)
+        return columns
+
+    def _col_index(self, reference: str, columns: Dict[str, int]) -> int:
+        """Resolve a column name or letter to its position"""
+        reference = re.sub(r"^column ", "", reference.strip(), flags=re.I).strip("'\"").lower()
+        if reference in columns:
+            return columns[reference]
+        if re.fullmatch(r"[a-z]+", reference):
+            # Letters beyond the described columns still map positionally
+            index = 0
+            for char in reference:
+                index = index * 26 + (ord(char) - 96)
+            if column_letter(index - 1).lower() == reference:
+                return index - 1
+        raise KeyError(reference)
+
+    def _col(self, reference: str, columns: Dict[str, int]) -> str:
+        """Python expression selecting a column by position"""
+        return f"df.iloc[:, {self._col_index(reference, columns)}]"
+
+    @staticmethod
+    def _literal(value: str) -> str:
+        """Python literal for a fill value given in a command"""
+        value = value.strip().strip("'\"")
+        try:
+            float(value)
+            return value
+        except ValueError:
+            return repr(value)
+
+    @staticmethod
+    def _load_canned_scripts(path: Optional[str]) -> List[Tuple[re.Pattern, str]]:
+        """
+        Load canned command-to-script mappings
+
+        Args:
+            path: JSON file holding an object of regex -> script, or None
+
+        Returns:
+            List[Tuple[re.Pattern, str]]: Compiled patterns and their scripts
+        """
+        if not path:
+            return []
+        with open(path, 'r', encoding='utf-8') as f:
+            mapping = json.load(f)
+        return [(re.compile(pattern, re.I), script) for pattern, script in mapping.items()]
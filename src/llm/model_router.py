@@ -0,0 +1,306 @@
+"""
+Model Router module
+-----------------
+Routes LLM requests across a list of models with hedging, failover and circuit breakers
+"""
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, List, Deque, Set
+
+import numpy as np
+
+from src.llm.llm_provider import LLMProvider, LLMProviderError
+from src.llm.prompt_builder import PromptContext
+from src.controller.metrics import MetricsRegistry
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a model after repeated failures
+
+    After `failure_threshold` consecutive failures the breaker opens and the
+    model is skipped for `reset_timeout` seconds. It then lets a single probe
+    request through (half-open); success closes it, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        """
+        Initialize the circuit breaker
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds to wait before probing an open circuit
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current state: closed, open or half_open"""
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a request may be sent, reserving the probe slot when half-open
+
+        Returns:
+            bool: True if the request may be sent
+        """
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful request"""
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Count a failure, opening the circuit at the threshold"""
+        with self.lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """
+    Keeps recent successful response times of one model
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 10):
+        """
+        Initialize the latency tracker
+
+        Args:
+            window: Number of most recent samples kept
+            min_samples: Samples needed before percentiles are reported
+        """
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """Record a successful response time"""
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Get a latency percentile
+
+        Args:
+            q: Percentile between 0 and 100
+
+        Returns:
+            Optional[float]: Latency in seconds, or None with too few samples
+        """
+        with self.lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            return float(np.percentile(list(self.samples), q))
+
+
+class ModelRouter(LLMProvider):
+    """
+    Provider that spreads requests over several underlying providers
+
+    The first healthy model is the primary. If it has not answered after its
+    observed p95 latency, a hedged duplicate goes to the next healthy model
+    (or the same model when only one is configured) and the first answer
+    wins. Errors fail over to the next model immediately, and every attempt
+    shares one overall timeout, which providers get as their call timeout.
+    Attempts that lose still report their outcome to their model's breaker.
+    """
+
+    def __init__(self, providers: List[LLMProvider], timeout: float = 60.0, hedge_delay: float = 5.0,
+                 max_hedges: int = 1, metrics: Optional[MetricsRegistry] = None,
+                 failure_threshold: int = 3, reset_timeout: float = 30.0):
+        """
+        Initialize the router
+
+        Args:
+            providers: Providers in order of preference
+            timeout: Overall seconds allowed per request across all attempts
+            hedge_delay: Hedge delay used until a model has enough latency samples
+            max_hedges: Maximum hedged duplicates per request (0 disables hedging)
+            metrics: Registry receiving latency, hedge and failover metrics
+            failure_threshold: Consecutive failures that open a model's circuit
+            reset_timeout: Seconds before an open circuit is probed again
+        """
+        if not providers:
+            raise ValueError("ModelRouter needs at least one provider")
+        super().__init__(providers[0].model)
+        self.providers = providers
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.max_hedges = max_hedges
+        self.metrics = metrics or MetricsRegistry()
+        self.breakers = [CircuitBreaker(failure_threshold, reset_timeout) for _ in providers]
+        self.latencies = [LatencyTracker() for _ in providers]
+        # Abandoned attempts keep running until their provider returns or times out, so leave headroom
+        self.executor = ThreadPoolExecutor(max_workers=max(8, len(providers) * 4), thread_name_prefix='llm')
+
+    @property
+    def name(self) -> str:
+        return "router:" + ",".join(p.name for p in self.providers)
+
+    def generate(self, prompt_context: PromptContext, generation_config: Dict[str, Any],
+                 stats: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> str:
+        deadline = time.monotonic() + (self.timeout if timeout is None else min(timeout, self.timeout))
+        order = self._healthy_order()
+        next_choice = 0
+        pending: Dict[Future, int] = {}
+        started: Dict[Future, float] = {}
+        attempt_stats: Dict[Future, Dict[str, Any]] = {}
+        hedges = 0
+        failovers = 0
+        errors: List[str] = []
+        settled: Set[Future] = set()
+        settle_lock = threading.Lock()
+
+        def settle(future: Future, index: int, launched: float) -> None:
+            # Record each attempt's outcome once, whether the loop sees it or
+            # it ends after another attempt won, so half-open probes are released
+            with settle_lock:
+                if future in settled:
+                    return
+                settled.add(future)
+            if future.done() and future.exception() is None:
+                elapsed = time.monotonic() - launched
+                self.breakers[index].record_success()
+                self.latencies[index].record(elapsed)
+                self.metrics.observe(f'llm.latency.{self.providers[index].name}', elapsed)
+            else:
+                self._record_failure(index)
+
+        def launch(index: int) -> None:
+            call_stats: Dict[str, Any] = {}
+            launched = time.monotonic()
+            # Providers stop at the shared deadline so abandoned calls free their thread
+            future = self.executor.submit(self.providers[index].generate, prompt_context, generation_config,
+                                          call_stats, max(deadline - launched, 0.0))
+            pending[future] = index
+            started[future] = launched
+            attempt_stats[future] = call_stats
+            future.add_done_callback(lambda done: settle(done, index, launched))
+
+        def launch_next() -> Optional[int]:
+            # Half-open models admit one probe at a time, so some may be skipped
+            nonlocal next_choice
+            while next_choice < len(order):
+                index = order[next_choice]
+                next_choice += 1
+                if self.breakers[index].allow_request():
+                    launch(index)
+                    return index
+            return None
+
+        primary = launch_next()
+        if primary is None:
+            # Every circuit is busy probing; send the request anyway rather than refuse it
+            primary = order[0]
+            launch(primary)
+
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+
+            # Each hedge waits a full delay after the most recent launch
+            hedge_at = max(started.values()) + self._hedge_delay(primary)
+            can_hedge = hedges < self.max_hedges
+            wait_for = deadline - now
+            if can_hedge:
+                wait_for = min(wait_for, max(hedge_at - now, 0))
+
+            done, _ = wait(list(pending), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                index = pending.pop(future)
+                settle(future, index, started.pop(future))
+                try:
+                    response = future.result()
+                except Exception as e:
+                    errors.append(f"{self.providers[index].name}: {e}")
+                    # Fail over to the next model right away
+                    if launch_next() is not None:
+                        failovers += 1
+                        self.metrics.increment('llm.failovers')
+                    continue
+
+                if stats is not None:
+                    stats.update(attempt_stats[future])
+                    stats.update({'model': self.providers[index].name, 'hedges': hedges, 'failovers': failovers})
+                return response
+
+            if not done and can_hedge and pending and time.monotonic() >= hedge_at:
+                # Primary is slower than usual: send a duplicate
+                hedges += 1
+                self.metrics.increment('llm.hedges')
+                if launch_next() is None:
+                    launch(primary)
+
+        for future, index in pending.items():
+            settle(future, index, started[future])
+            errors.append(f"{self.providers[index].name}: timed out")
+        self.metrics.increment('llm.exhausted')
+        raise LLMProviderError("All models failed or timed out: " + "; ".join(errors))
+
+    def get_status(self) -> List[Dict[str, Any]]:
+        """
+        Get the health of each configured model
+
+        Returns:
+            List[Dict[str, Any]]: Circuit state and p95 latency per model
+        """
+        return [
+            {
+                'model': provider.name,
+                'circuit': breaker.state,
+                'p95_ms': round(tracker.percentile(95) * 1000, 2) if tracker.percentile(95) is not None else None
+            }
+            for provider, breaker, tracker in zip(self.providers, self.breakers, self.latencies)
+        ]
+
+    def _healthy_order(self) -> List[int]:
+        """
+        Provider indexes to try, healthy ones first in configured order
+
+        Returns:
+            List[int]: Provider indexes; falls back to all providers when every
+            circuit is open so requests are never refused outright
+        """
+        healthy = [i for i, breaker in enumerate(self.breakers) if breaker.state != 'open']
+        return healthy or list(range(len(self.providers)))
+
+    def _hedge_delay(self, index: int) -> float:
+        """Seconds to wait for a model before hedging: its observed p95"""
+        p95 = self.latencies[index].percentile(95)
+        return p95 if p95 is not None else self.hedge_delay
+
+    def _record_failure(self, index: int) -> None:
+        """Count a failed or timed out attempt against a model's circuit"""
+        self.breakers[index].record_failure()
+        self.metrics.increment(f'llm.errors.{self.providers[index].name}')
+        if self.breakers[index].state != 'closed':
+            self.metrics.increment(f'llm.circuit_open.{self.providers[index].name}')
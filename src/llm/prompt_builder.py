@@ -0,0 +1,351 @@
+"""
+Prompt Builder module
+-----------------
+Builds token-budgeted LLM prompts from spreadsheet data
+"""
+
+import json
+import math
+from typing import Dict, Any, List, Optional, Tuple
+
+import pandas as pd
+
+from src.controller.schema_generator import SchemaGenerator
+from src.controller.data_sampler import DataSampler
+from src.controller.block_detector import single_table
+
+
+# Instructions shared by every request. Keep this text byte-for-byte stable:
+# it is sent as the system instruction so providers can cache the prefix.
+STATIC_INSTRUCTIONS = """You are an expert Python programmer tasked with modifying a spreadsheet based on user instructions.
+
+<task>
+Write a Python script that modifies the Pandas DataFrame named 'df' according to the user's command.
+The script should handle edge cases and error conditions gracefully.
+DO NOT import modules other than pandas and numpy, which are already imported.
+</task>
+
+<instructions>
+1. The DataFrame is already loaded and available as 'df'
+2. Your modifications should be made directly to 'df'
+3. Only use pandas and numpy functions
+4. Do not include any explanations or comments in your response, ONLY THE PYTHON CODE
+5. Do not attempt to write to files or perform any I/O operations
+6. Output ONLY the Python code - no other text
+7. Ensure your code handles potential errors gracefully
+8. Assign through df directly (df['col'] = ..., df.loc[...] = ..., df.iloc[...] = ...); chained assignment such as df['col'][0] = value, and inplace=True on a column or selection such as df['col'].fillna(0, inplace=True), do not modify df; write df['col'] = df['col'].fillna(0) instead
+
+The spreadsheet context lists every column as "<letter>: <name> | <type> (<dtype>) | nulls <rate> | <distinct> distinct | e.g. <examples>".
+Sample rows are JSON arrays in column order and are only a subset of the data.
+
+Important notes on cell references:
+- When the user references specific cells with # notation, they're using Excel-style references
+- For a single cell (like A1), use df.iloc[0, 0] (zero-indexed)
+- For a column (like column A), use df.iloc[:, 0]
+- For a row (like row 1), use df.iloc[0, :]
+- For cell ranges (like A1:C3), use df.iloc[0:3, 0:3]
+- For column ranges (like A:C), use df.iloc[:, 0:3]
+- For row ranges (like 1:3), use df.iloc[0:3, :]
+- Remember that Excel-style references use 1-based indexing for rows but df.iloc uses 0-based indexing
+- Multiple selections may be indicated with commas (like A1, B2, C3)
+
+Cell reference conversion examples:
+- A1 = df.iloc[0, 0]
+- B2 = df.iloc[1, 1]
+- Column A = df.iloc[:, 0]
+- Row 5 = df.iloc[4, :]
+- A1:C3 = df.iloc[0:3, 0:3]
+- A:C = df.iloc[:, 0:3]
+- 1:5 = df.iloc[0:5, :]
+</instructions>"""
+
+# Appended to STATIC_INSTRUCTIONS when SQL answers are enabled (also byte-for-byte stable)
+SQL_INSTRUCTIONS = """
+
+<sql_mode>
+For aggregations, grouping, deduplication, filtering or sorting you may instead answer with a single
+DuckDB SQL query in a ```sql code block. The spreadsheet is the table df; quote column names with
+double quotes. The query result replaces the whole spreadsheet, so select every column that should remain.
+Only one SELECT (or WITH ... SELECT) statement is allowed and it cannot read files or other tables.
+Use Python for cell-level edits and anything that refers to cell positions.
+</sql_mode>"""
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a piece of text
+
+    Uses the common ~4 characters per token heuristic, which is close enough
+    for budgeting without a provider round trip.
+
+    Args:
+        text: The text to measure
+
+    Returns:
+        int: Estimated token count
+    """
+    return math.ceil(len(text) / 4)
+
+
+def column_letter(index: int) -> str:
+    """
+    Convert a zero-based column index into an Excel-style column letter
+
+    Args:
+        index: Zero-based column index
+
+    Returns:
+        str: Column letter (A, B, ..., Z, AA, ...)
+    """
+    letters = ''
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+class PromptContext:
+    """
+    A prompt split into a stable prefix and a per-request body
+    """
+
+    def __init__(self, prefix: str, body: str, details: Optional[Dict[str, Any]] = None):
+        """
+        Initialize a prompt context
+
+        Args:
+            prefix: Static instructions, identical across requests
+            body: Spreadsheet context and user command for this request
+            details: What the builder had to drop to fit the budget
+        """
+        self.prefix = prefix
+        self.body = body
+        self.details = details or {}
+
+    @property
+    def text(self) -> str:
+        """Full prompt for providers without system instruction support"""
+        return f"{self.prefix}\n\n{self.body}"
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get estimated token counts for this prompt
+
+        Returns:
+            Dict[str, Any]: Prefix, body and total token estimates plus the
+            builder's fitting details
+        """
+        prefix_tokens = estimate_tokens(self.prefix)
+        body_tokens = estimate_tokens(self.body)
+        return {
+            'prefix_tokens': prefix_tokens,
+            'body_tokens': body_tokens,
+            'estimated_prompt_tokens': prefix_tokens + body_tokens,
+            **self.details
+        }
+
+
+class PromptContextBuilder:
+    """
+    Builds spreadsheet context for LLM prompts within a token budget
+    """
+
+    def __init__(self, token_budget: int = 6000, sample_rows: int = 5, max_value_chars: int = 40,
+                 schema_generator: Optional[SchemaGenerator] = None, sampler: Optional[DataSampler] = None,
+                 allow_sql: bool = False):
+        """
+        Initialize the prompt context builder
+
+        Args:
+            token_budget: Maximum estimated tokens for the per-request body
+            sample_rows: Number of representative rows to include when they fit
+            max_value_chars: Cell values longer than this are truncated
+            schema_generator: Schema generator used for column profiles
+            sampler: Sampler used to pick representative rows
+            allow_sql: Whether the model may answer with a SQL query instead of Python
+        """
+        self.token_budget = token_budget
+        self.sample_rows = sample_rows
+        self.max_value_chars = max_value_chars
+        self.schema_generator = schema_generator or SchemaGenerator()
+        self.sampler = sampler or DataSampler()
+        self.instructions = STATIC_INSTRUCTIONS + SQL_INSTRUCTIONS if allow_sql else STATIC_INSTRUCTIONS
+        # Table blocks (and header names per block) listed in the context before the rest are summarized
+        self.max_tables = 20
+        self.max_table_names = 12
+
+    def build(self, df: pd.DataFrame, command: str, feedback: Optional[List[Tuple[str, str]]] = None,
+              profiles: Optional[List[Dict[str, Any]]] = None, blocks: Optional[Dict[str, Any]] = None) -> PromptContext:
+        """
+        Build the prompt for a command against a DataFrame
+
+        Detail is reduced step by step until the body fits the budget: first
+        fewer sample rows, then column lines without examples, and finally
+        only as many columns as fit.
+
+        Args:
+            df: The spreadsheet data
+            command: The (already processed) user command
+            feedback: Earlier (script, error) attempts the model should repair
+            profiles: Column profiles of df if already computed
+            blocks: Table blocks of df (BlockDetector.detect); listed unless the
+                sheet is a single table under its column names
+
+        Returns:
+            PromptContext: The prompt split into stable prefix and body
+        """
+        if profiles is None:
+            profiles = self.schema_generator.generate_column_profiles(df)
+        positions = self.sampler.representative_rows(df, self.sample_rows)
+        table_lines = self._table_lines(blocks)
+
+        column_limit = len(profiles)
+        for with_examples in (True, False):
+            for row_count in self._row_counts(len(positions)):
+                body = self._render(df, command, profiles, positions[:row_count], with_examples, column_limit, feedback,
+                                    table_lines)
+                if estimate_tokens(body) <= self.token_budget:
+                    return PromptContext(self.instructions, body, {
+                        'columns_included': column_limit,
+                        'sample_rows_included': row_count,
+                        'column_examples_included': with_examples
+                    })
+
+        # Still too wide: keep as many compact column lines as fit the budget
+        fixed = estimate_tokens(self._render(df, command, profiles, [], False, 0, feedback, table_lines))
+        remaining = max(self.token_budget - fixed, 0)
+        column_limit = 0
+        for profile_idx, profile in enumerate(profiles):
+            remaining -= estimate_tokens(self._column_line(profile_idx, profile, False)) + 1
+            if remaining < 0:
+                break
+            column_limit += 1
+
+        body = self._render(df, command, profiles, [], False, column_limit, feedback, table_lines)
+        return PromptContext(self.instructions, body, {
+            'columns_included': column_limit,
+            'sample_rows_included': 0,
+            'column_examples_included': False
+        })
+
+    def _row_counts(self, available: int) -> List[int]:
+        """Sample row counts to try, from most to least detailed"""
+        counts = [available]
+        while counts[-1] > 0:
+            counts.append(counts[-1] // 2)
+        return counts
+
+    def _render(self, df: pd.DataFrame, command: str, profiles: List[Dict[str, Any]], positions: List[int],
+                with_examples: bool, column_limit: int, feedback: Optional[List[Tuple[str, str]]] = None,
+                table_lines: Optional[List[str]] = None) -> str:
+        """
+        Render the per-request prompt body
+
+        Args:
+            df: The spreadsheet data
+            command: The user command
+            profiles: Column profiles from the schema generator
+            positions: Row positions to include as samples
+            with_examples: Whether column lines include example values
+            column_limit: Number of columns to describe
+            feedback: Earlier (script, error) attempts to include
+            table_lines: Table block lines to include
+
+        Returns:
+            str: The prompt body
+        """
+        column_lines = [self._column_line(i, p, with_examples) for i, p in enumerate(profiles[:column_limit])]
+        if column_limit < len(profiles):
+            column_lines.append(f"... and {len(profiles) - column_limit} more columns")
+
+        lines = [
+            "<spreadsheet_context>",
+            f"Row count: {len(df)}",
+            f"Column count: {len(df.columns)}",
+            "Columns:",
+            *column_lines
+        ]
+
+        if table_lines:
+            lines.extend(table_lines)
+
+        if positions:
+            lines.append("Sample rows (row number: values):")
+            for position in positions:
+                values = [self._format_value(v) for v in df.iloc[position, :column_limit].tolist()]
+                lines.append(f"{position + 1}: {json.dumps(values, default=str, separators=(',', ':'))}")
+
+        lines.extend([
+            "</spreadsheet_context>",
+            "",
+            "<user_command>",
+            command,
+            "</user_command>",
+            ""
+        ])
+
+        if feedback:
+            lines.append("<previous_attempts>")
+            for attempt, (script, error) in enumerate(feedback, start=1):
+                lines.extend([
+                    f"Attempt {attempt} failed when run on a sample of the data:",
+                    "```python",
+                    script,
+                    "```",
+                    "Error:",
+                    error,
+                    ""
+                ])
+            lines.extend([
+                "</previous_attempts>",
+                "",
+                "Provide only the corrected Python code, fixing the errors above:"
+            ])
+        else:
+            lines.append("Provide only the Python code needed to execute the requested modification:")
+        return "\n".join(lines)
+
+    def _table_lines(self, blocks: Optional[Dict[str, Any]]) -> List[str]:
+        """Describe the sheet's table blocks, unless it is a single table under its column names"""
+        if single_table(blocks):
+            return []
+        tables = blocks['tables']
+        lines = ["Tables (separated by empty rows/columns; df.iloc positions, end exclusive):"]
+        for number, table in enumerate(tables[:self.max_tables], start=1):
+            (r0, r1), (c0, c1) = table['rows'], table['cols']
+            header = "column names" if table['header_row'] is None else f"row {table['header_row']}"
+            names = [self._format_value(name) for name in table['header'][:self.max_table_names]]
+            if len(table['header']) > self.max_table_names:
+                names.append(f"... {len(table['header']) - self.max_table_names} more")
+            line = (f"T{number}: data rows {r0}:{r1}, cols {c0}:{c1} | header {header}: "
+                    f"{json.dumps(names, separators=(',', ':'))}")
+            if table.get('title'):
+                line += f" | title {json.dumps(self._format_value(table['title']))}"
+            lines.append(line)
+        if len(tables) > self.max_tables:
+            lines.append(f"... and {len(tables) - self.max_tables} more tables")
+        return lines
+
+    def _column_line(self, index: int, profile: Dict[str, Any], with_examples: bool) -> str:
+        """Render one column summary line"""
+        col_type = f"{profile['type']} as text" if profile.get('stored_as_text') else profile['type']
+        line = f"{column_letter(index)}: {profile['name']} | {col_type} ({profile['dtype']}) | nulls {profile['null_rate']:.1%}"
+        if profile.get('cardinality') is not None:
+            approx = "~" if profile.get('approximate') else ""
+            line += f" | {approx}{profile['cardinality']} distinct"
+        if 'min' in profile:
+            line += f" | range {profile['min']}..{profile['max']}"
+        if with_examples and profile.get('examples'):
+            examples = ", ".join(json.dumps(self._format_value(v), default=str) for v in profile['examples'])
+            line += f" | e.g. {examples}"
+        return line
+
+    def _format_value(self, value: Any) -> Any:
+        """Make a cell value JSON friendly and truncate long text"""
+        if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+            return None
+        value = SchemaGenerator._to_json_value(value)
+        if isinstance(value, str) and len(value) > self.max_value_chars:
+            return value[:self.max_value_chars] + "..."
+        return value
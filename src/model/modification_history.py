@@ -16,6 +16,8 @@ class ModificationHistory:
         """Initialize modification history"""
         self.states: List[Spreadsheet] = []
         self.current_position = -1
+        # Incremented whenever the current state changes (add, undo, redo)
+        self.version = 0
     
     def add_state(self, spreadsheet: Spreadsheet) -> None:
         """
@@ -31,6 +33,7 @@ class ModificationHistory:
         # Add the new state
         self.states.append(spreadsheet)
         self.current_position += 1
+        self.version += 1
     
     def can_undo(self) -> bool:
         """
@@ -61,6 +64,7 @@ class ModificationHistory:
             return None
         
         self.current_position -= 1
+        self.version += 1
         return self.states[self.current_position]
     
     def redo(self) -> Optional[Spreadsheet]:
@@ -74,6 +78,7 @@ class ModificationHistory:
             return None
         
         self.current_position += 1
+        self.version += 1
         return self.states[self.current_position]
     
     def get_current_state(self) -> Optional[Spreadsheet]:
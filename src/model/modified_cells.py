@@ -0,0 +1,131 @@
+"""
+Modified Cells module
+-------------------------
+Cells changed by a command, with a compact wire format for large edits
+"""
+
+import base64
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class ModifiedCells:
+    """
+    Cells changed by a command, stored as one row mask per column
+
+    The compact encoding groups consecutive columns with identical changes
+    and describes each group's rows as "all", a list of row ranges, or a
+    bitmap, whichever is smallest. Adding a column to a million-row sheet is
+    then a few bytes instead of a million [row, col] pairs.
+    """
+
+    def __init__(self, row_count: int, changes: Sequence[Optional[np.ndarray]]):
+        """
+        Initialize modified cells
+
+        Args:
+            row_count: Number of rows in the modified sheet
+            changes: Per column, a boolean mask of changed rows (may be shorter
+                than row_count) or None when every row changed
+        """
+        self.row_count = row_count
+        self.changes = list(changes)
+
+    def _rows(self, col: int) -> np.ndarray:
+        """Modified row positions of a column"""
+        mask = self.changes[col]
+        return np.arange(self.row_count) if mask is None else np.flatnonzero(mask)
+
+    @property
+    def count(self) -> int:
+        """Number of modified cells"""
+        return sum(self.row_count if mask is None else int(np.count_nonzero(mask)) for mask in self.changes)
+
+    def columns(self) -> List[int]:
+        """
+        Get the columns with at least one modified cell
+
+        Returns:
+            List[int]: Column positions
+        """
+        return [col for col, mask in enumerate(self.changes)
+                if (mask is None and self.row_count > 0) or (mask is not None and mask.any())]
+
+    def to_list(self) -> List[List[int]]:
+        """
+        Get the modified cells as [row, col] pairs (the original payload format)
+
+        Returns:
+            List[List[int]]: Coordinates ordered by column and then row
+        """
+        blocks = []
+        for col in range(len(self.changes)):
+            rows = self._rows(col)
+            if len(rows):
+                block = np.empty((len(rows), 2), dtype=np.int64)
+                block[:, 0] = rows
+                block[:, 1] = col
+                blocks.append(block)
+        if not blocks:
+            return []
+        return np.concatenate(blocks).tolist()
+
+    def to_compact(self) -> Dict[str, Any]:
+        """
+        Get the modified cells in the compact encoding
+
+        Each entry covers the inclusive column run "cols": [first, last] and one of:
+            "all": true                  every row (0..row_count-1)
+            "ranges": [s0, e0, s1, ...]  half-open row ranges [s, e)
+            "bitmap": "<base64>"         little-endian bits for rows offset..offset+length-1
+
+        Returns:
+            Dict[str, Any]: JSON-serializable compact description
+        """
+        entries: List[Dict[str, Any]] = []
+        for col in self.columns():
+            entry = self._encode_rows(col)
+            previous = entries[-1] if entries else None
+            if previous is not None and previous['cols'][1] == col - 1 and self._same_rows(previous, entry):
+                previous['cols'][1] = col
+                continue
+            entries.append({'cols': [col, col], **entry})
+        return {'format': 'compact', 'count': self.count, 'row_count': self.row_count, 'columns': entries}
+
+    def encode(self, fmt: str = 'compact') -> Any:
+        """
+        Encode for a response payload
+
+        Args:
+            fmt: 'compact' or 'list'
+
+        Returns:
+            Any: The compact dict or the list of [row, col] pairs
+        """
+        if fmt == 'list':
+            return self.to_list()
+        return self.to_compact()
+
+    def _encode_rows(self, col: int) -> Dict[str, Any]:
+        """Pick the smallest row encoding for one column"""
+        mask = self.changes[col]
+        if mask is None or (len(mask) == self.row_count and mask.all()):
+            return {'all': True}
+
+        padded = np.concatenate(([False], mask, [False]))
+        edges = np.flatnonzero(padded[1:] != padded[:-1])
+        first, last = int(edges[0]), int(edges[-1])
+        # Rough JSON sizes: ~8 characters per range bound, 4 base64 characters per 3 bytes of bitmap
+        range_size = len(edges) * 8
+        bitmap_size = ((last - first + 7) // 8 + 2) // 3 * 4
+        if range_size <= bitmap_size:
+            return {'ranges': edges.tolist()}
+
+        bits = np.packbits(mask[first:last], bitorder='little')
+        return {'bitmap': base64.b64encode(bits.tobytes()).decode('ascii'), 'offset': first, 'length': last - first}
+
+    @staticmethod
+    def _same_rows(previous: Dict[str, Any], entry: Dict[str, Any]) -> bool:
+        """Check whether an entry's rows match an existing entry's rows"""
+        return {k: v for k, v in previous.items() if k != 'cols'} == entry
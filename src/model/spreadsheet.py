@@ -9,6 +9,7 @@ import pandas as pd
 import numpy as np
 import json
 from typing import Dict, List, Any, Optional, Tuple
+from src.model.spreadsheet_parser import CSV_COMPRESSION
 
 class Spreadsheet:
     """
@@ -34,6 +35,11 @@ class Spreadsheet:
             'columns': data_df.columns.tolist() if data_df is not None else [],
             'rows': len(data_df) if data_df is not None else 0
         }
+        # Data derived from this state (schema, column profiles), built in the background or on demand
+        self.artifacts: Dict[str, Any] = {}
+        # The state this one was derived from and, per column, the position of the
+        # same unchanged column there (None if changed); lets artifacts be updated per column
+        self.derived_from: Optional[Tuple['Spreadsheet', List[Optional[int]]]] = None
     
     def get_data(self) -> Optional[pd.DataFrame]:
         """
@@ -52,6 +58,8 @@ class Spreadsheet:
             data_df: New DataFrame
         """
         self.data_df = data_df
+        self.artifacts = {}
+        self.derived_from = None
         self.metadata['columns'] = data_df.columns.tolist()
         self.metadata['rows'] = len(data_df)
     
@@ -64,6 +72,54 @@ class Spreadsheet:
         """
         return self.metadata
     
+    def to_rows(self) -> List[List[Any]]:
+        """
+        Convert the data to a list of rows for the grid view
+
+        Datetimes are formatted as strings (missing ones as '') and other
+        missing values become None. The data is not copied beyond the single
+        object array the rows are built from.
+
+        Returns:
+            List[List[Any]]: One list of cell values per row
+        """
+        if self.data_df is None:
+            return []
+
+        # Shallow copy: formatted datetime columns replace columns of the view only
+        view = self.data_df.copy(deep=False)
+        for position in range(view.shape[1]):
+            column = view.iloc[:, position]
+            if pd.api.types.is_datetime64_any_dtype(column):
+                view.isetitem(position, column.dt.strftime('%Y-%m-%d %H:%M:%S').fillna(''))
+
+        # copy=True only copies when the frame is a single object block, whose
+        # array would otherwise be a read-only view of the data
+        values = view.to_numpy(dtype=object, copy=True)
+        values[pd.isna(values)] = None
+        return values.tolist()
+
+    def cell_values(self, rows: np.ndarray, cols: np.ndarray) -> List[Any]:
+        """
+        Get individual cells formatted as in to_rows
+
+        Args:
+            rows: Row positions
+            cols: Column positions, parallel to rows
+
+        Returns:
+            List[Any]: One value per (row, col) pair
+        """
+        values = np.empty(len(rows), dtype=object)
+        for col in np.unique(cols):
+            selected = np.flatnonzero(cols == col)
+            column = self.data_df.iloc[rows[selected], int(col)]
+            if pd.api.types.is_datetime64_any_dtype(column):
+                column = column.dt.strftime('%Y-%m-%d %H:%M:%S').fillna('')
+            values[selected] = column.to_numpy(dtype=object)
+        values[pd.isna(values)] = None
+        return values.tolist()
+
     def to_json(self, save_to_file: bool = False, file_manager = None) -> dict:
         """
         Convert spreadsheet to JSON format
@@ -80,7 +136,7 @@ class Spreadsheet:
         
         # Convert DataFrame to dict, handling datetime objects
         if self.data_df is not None:
-            df_copy = self.data_df.copy()
+            df_copy = self.data_df.copy(deep=False)
             
             # Convert datetime columns to ISO format strings
             for col in df_copy.columns:
@@ -155,7 +211,7 @@ class Spreadsheet:
 
         Args:
             save_dir: Directory to save the file to
-            format: File format (xlsx, csv)
+            format: File format (xlsx, csv, csv.gz, csv.zst, parquet, feather, jsonl)
 
         Returns:
             str: Path to the saved file
@@ -169,8 +225,14 @@ class Spreadsheet:
         
         if format == 'xlsx':
             self.data_df.to_excel(file_path, index=False)
-        elif format == 'csv':
-            self.data_df.to_csv(file_path, index=False)
+        elif format in CSV_COMPRESSION:
+            self.data_df.to_csv(file_path, index=False, compression=CSV_COMPRESSION[format])
+        elif format == 'parquet':
+            self.data_df.to_parquet(file_path, index=False)
+        elif format == 'feather':
+            self.data_df.reset_index(drop=True).to_feather(file_path)
+        elif format == 'jsonl':
+            self.data_df.to_json(file_path, orient='records', lines=True, date_format='iso')
         else:
             raise ValueError(f"Unsupported format: {format}")
         
@@ -8,6 +8,29 @@ import os
 import pandas as pd
 from typing import Union, Dict, Any, Tuple
 
+# File format by file extension. Compound extensions (csv.gz) are matched before
+# their last part; the format names double as the download file extensions.
+FILE_FORMATS = {
+    'xlsx': 'xlsx',
+    'xls': 'xlsx',
+    'csv': 'csv',
+    'csv.gz': 'csv.gz',
+    'csv.zst': 'csv.zst',
+    'parquet': 'parquet',
+    'pq': 'parquet',
+    'feather': 'feather',
+    'arrow': 'feather',
+    'jsonl': 'jsonl',
+    'ndjson': 'jsonl',
+}
+
+# pandas compression of the CSV formats
+CSV_COMPRESSION = {'csv': None, 'csv.gz': 'gzip', 'csv.zst': 'zstd'}
+
+# Optional packages needed for a format
+FORMAT_PACKAGES = {'parquet': 'pyarrow', 'feather': 'pyarrow', 'csv.zst': 'zstandard'}
+
+
 class SpreadsheetParser:
     """
     Handles parsing of spreadsheet files
@@ -24,15 +47,7 @@ class SpreadsheetParser:
         Returns:
             Tuple[str, Dict]: JSON representation and metadata
         """
-        file_ext = os.path.splitext(file_path)[1].lower()
-        
-        # Read file based on extension
-        if file_ext in ['.xlsx', '.xls']:
-            df = pd.read_excel(file_path)
-        elif file_ext == '.csv':
-            df = pd.read_csv(file_path)
-        else:
-            raise ValueError(f"Unsupported file format: {file_ext}")
+        df = SpreadsheetParser.read_file(file_path)
         
         # Convert to JSON
         data = df.to_json(orient='records')
@@ -41,11 +56,28 @@ class SpreadsheetParser:
         metadata = {
             'columns': df.columns.tolist(),
             'rows': len(df),
-            'file_type': file_ext[1:]  # Remove the dot
+            'file_type': SpreadsheetParser.detect_file_format(file_path)
         }
         
         return data, metadata
     
+    @staticmethod
+    def file_extension(filename: str) -> str:
+        """
+        Get a file's extension, including a known compound one such as csv.gz
+
+        Args:
+            filename: File name or path
+
+        Returns:
+            str: Lower-case extension without the leading dot
+        """
+        name = os.path.basename(filename).lower()
+        for ext in sorted(FILE_FORMATS, key=len, reverse=True):
+            if name.endswith(f".{ext}"):
+                return ext
+        return os.path.splitext(name)[1][1:]
+    
     @staticmethod
     def detect_file_format(file_path: str) -> str:
         """
@@ -55,16 +87,77 @@ class SpreadsheetParser:
             file_path: Path to the spreadsheet file
 
         Returns:
-            str: Detected format (excel, csv)
+            str: Detected format (xlsx, csv, csv.gz, csv.zst, parquet, feather, jsonl)
+        """
+        file_ext = SpreadsheetParser.file_extension(file_path)
+        if file_ext not in FILE_FORMATS:
+            raise ValueError(f"Unsupported file format: .{file_ext}")
+        return FILE_FORMATS[file_ext]
+    
+    @staticmethod
+    def read_file(file_path: str, chunk_rows: int = 100000) -> pd.DataFrame:
+        """
+        Read a spreadsheet file into a DataFrame
+
+        CSV (plain, gzip or zstd) is read by the pandas C parser, which
+        decompresses and tokenizes the file in blocks. JSON Lines is read
+        in chunks of chunk_rows records instead of loading the whole text.
+        Parquet and Feather/Arrow IPC files are memory-mapped and converted
+        from Arrow column by column, keeping their stored types.
+
+        Args:
+            file_path: Path to the spreadsheet file
+            chunk_rows: Records per chunk for JSON Lines
+
+        Returns:
+            pd.DataFrame: The sheet
+
+        Raises:
+            ValueError: If the format is unsupported, its optional package is
+            missing or the file cannot be read
         """
-        file_ext = os.path.splitext(file_path)[1].lower()
+        file_format = SpreadsheetParser.detect_file_format(file_path)
+        try:
+            if file_format == 'xlsx':
+                return pd.read_excel(file_path)
+            if file_format in CSV_COMPRESSION:
+                return pd.read_csv(file_path, compression=CSV_COMPRESSION[file_format])
+            if file_format == 'jsonl':
+                return SpreadsheetParser._read_jsonl(file_path, chunk_rows)
+            return SpreadsheetParser._read_arrow(file_path, file_format)
+        except ImportError:
+            package = FORMAT_PACKAGES.get(file_format, 'an optional package')
+            raise ValueError(f"Reading {file_format} files requires the '{package}' package")
+    
+    @staticmethod
+    def _read_jsonl(file_path: str, chunk_rows: int) -> pd.DataFrame:
+        """JSON Lines records read in chunks"""
+        with pd.read_json(file_path, lines=True, chunksize=chunk_rows) as reader:
+            chunks = list(reader)
+        if not chunks:
+            return pd.DataFrame()
+        return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    
+    @staticmethod
+    def _read_arrow(file_path: str, file_format: str) -> pd.DataFrame:
+        """Parquet or Feather/Arrow IPC (file or stream format) through pyarrow"""
+        import pyarrow as pa
         
-        if file_ext in ['.xlsx', '.xls']:
-            return 'excel'
-        elif file_ext == '.csv':
-            return 'csv'
+        if file_format == 'parquet':
+            import pyarrow.parquet as pq
+            table = pq.read_table(file_path, memory_map=True)
         else:
-            raise ValueError(f"Unsupported file format: {file_ext}")
+            import pyarrow.feather as feather
+            try:
+                table = feather.read_table(file_path, memory_map=True)
+            except pa.ArrowInvalid:
+                # Arrow IPC stream format has no file footer
+                with pa.memory_map(file_path) as source:
+                    table = pa.ipc.open_stream(source).read_all()
+        
+        # Release each Arrow column once it is converted, so the table and the
+        # DataFrame are not both held in full
+        return table.to_pandas(split_blocks=True, self_destruct=True)
     
     @staticmethod
     def parse_from_pandas(df: pd.DataFrame) -> str:
@@ -1,5 +1,4 @@
 import { showLoading, hideLoading, showError, updateStatus, showMainInterface, updateSessionInfo } from './uiInteractions.js';
-import { resetApplicationState } from './main.js'; // Assuming main.js will export this
 
 export async function handleFileUpload(event, fileInput) {
     event.preventDefault();
@@ -111,10 +110,19 @@ export async function redoModification(sessionId) {
     }
 }
 
+// Get the download name from a Content-Disposition header (filename* preferred)
+function dispositionFilename(disposition, fallback) {
+    if (!disposition) return fallback;
+    const encoded = disposition.match(/filename\*=utf-8''([^;]+)/i);
+    if (encoded) return decodeURIComponent(encoded[1]);
+    const plain = disposition.match(/filename="?([^";]+)"?/i);
+    return plain ? plain[1] : fallback;
+}
+
 export function downloadSpreadsheet(sessionId) {
     if (!sessionId) return;
     updateStatus('Downloading...', 'processing');
-    // Use fetch to trigger download and handle errors
+    // One request: the filename comes from the same response as the file
     fetch(`/download/${sessionId}`)
         .then(response => {
             if (!response.ok) {
@@ -122,35 +130,22 @@ export function downloadSpreadsheet(sessionId) {
                     throw new Error(data.detail || 'Failed to download file');
                 });
             }
-            return response.blob();
+            const filename = dispositionFilename(response.headers.get('Content-Disposition'), 'spreadsheet.xlsx');
+            return response.blob().then(blob => ({ blob, filename }));
         })
-        .then(blob => {
+        .then(({ blob, filename }) => {
             // Create a temporary link to trigger download
             const url = window.URL.createObjectURL(blob);
             const a = document.createElement('a');
-            // Try to extract filename from Content-Disposition header if present
-            fetch(`/download/${sessionId}`, { method: 'HEAD' })
-                .then(headResp => {
-                    let filename = 'spreadsheet.xlsx';
-                    const disposition = headResp.headers.get('Content-Disposition');
-                    if (disposition && disposition.indexOf('filename=') !== -1) {
-                        filename = disposition.split('filename=')[1].replace(/["']/g, '');
-                    }
-                    a.href = url;
-                    a.download = filename;
-                    document.body.appendChild(a);
-                    a.click();
-                    setTimeout(() => {
-                        document.body.removeChild(a);
-                        window.URL.revokeObjectURL(url);
-                        // Show session cleanup dialog after download
-                        if (confirm('Your session has been completed. The spreadsheet and all related data have been cleaned up. Click OK to return to the start page.')) {
-                            window.location.reload();
-                        } else {
-                            resetApplicationState();
-                        }
-                    }, 30000);
-                });
+            a.href = url;
+            a.download = filename;
+            document.body.appendChild(a);
+            a.click();
+            document.body.removeChild(a);
+            // The session stays open, so editing can continue after a download
+            setTimeout(() => window.URL.revokeObjectURL(url), 1000);
+            updateStatus('Downloaded', 'active');
+            setTimeout(() => updateStatus('Ready', 'active'), 2000);
         })
         .catch(error => {
             updateStatus('Error', 'error');
@@ -206,7 +206,6 @@ async function redoLastModification() {
 
 function downloadCurrentSpreadsheet() {
     apiDownloadSpreadsheet(currentSessionId);
-    // resetApplicationState will be called by apiDownloadSpreadsheet after timeout
 }
 
 // Centralized state reset
@@ -0,0 +1,85 @@
+/**
+ * Modified Cells Module
+ * Answers "was this cell modified?" for both modified_cells payload formats.
+ * Compact payloads are never expanded: lookups are only made for the cells
+ * Handsontable renders, and bitmaps are decoded on first use.
+ */
+
+// Decode a base64 string into bytes
+function base64ToBytes(text) {
+    const binary = atob(text);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return bytes;
+}
+
+// Find the entry whose inclusive column run [first, last] contains col
+function findColumnEntry(entries, col) {
+    let low = 0;
+    let high = entries.length - 1;
+    while (low <= high) {
+        const mid = (low + high) >> 1;
+        const [first, last] = entries[mid].cols;
+        if (col < first) {
+            high = mid - 1;
+        } else if (col > last) {
+            low = mid + 1;
+        } else {
+            return entries[mid];
+        }
+    }
+    return null;
+}
+
+// Check a row against a flat list of half-open ranges [s0, e0, s1, e1, ...]
+function inRanges(ranges, row) {
+    let low = 0;
+    let high = ranges.length / 2 - 1;
+    while (low <= high) {
+        const mid = (low + high) >> 1;
+        if (row < ranges[mid * 2]) {
+            high = mid - 1;
+        } else if (row >= ranges[mid * 2 + 1]) {
+            low = mid + 1;
+        } else {
+            return true;
+        }
+    }
+    return false;
+}
+
+function rowMatches(entry, row, rowCount) {
+    if (entry.all) return row < rowCount;
+    if (entry.ranges) return inRanges(entry.ranges, row);
+    if (entry.bitmap) {
+        const index = row - entry.offset;
+        if (index < 0 || index >= entry.length) return false;
+        if (!entry.bits) entry.bits = base64ToBytes(entry.bitmap);
+        return ((entry.bits[index >> 3] >> (index & 7)) & 1) === 1;
+    }
+    return false;
+}
+
+/**
+ * Build a lookup function for a modified_cells payload
+ * @param {Array|Object} modified - [[row, col], ...] or a {format: 'compact'} object
+ * @returns {Function|null} (row, col) => boolean, or null when nothing was modified
+ */
+export function createModifiedCellLookup(modified) {
+    if (!modified) return null;
+
+    if (Array.isArray(modified)) {
+        if (modified.length === 0) return null;
+        const cells = new Set(modified.map(([row, col]) => `${row},${col}`));
+        return (row, col) => cells.has(`${row},${col}`);
+    }
+
+    if (modified.format !== 'compact' || !modified.count) return null;
+    const entries = modified.columns;
+    return (row, col) => {
+        const entry = findColumnEntry(entries, col);
+        return entry !== null && rowMatches(entry, row, modified.row_count);
+    };
+}
@@ -1,10 +1,17 @@
 import { showLoading, hideLoading, showError } from './uiInteractions.js';
 import { updateUndoRedoButtons, updateStatus } from './uiInteractions.js';
 import { updateCellSelector, clearCellSelector } from './cell-selector.js';
+import { createModifiedCellLookup } from './modifiedCells.js';
 
 const spreadsheetDataContainer = document.getElementById('spreadsheetData');
 let pendingChanges = []; // Store changes to batch submit
 let isProcessingChanges = false; // Prevent overlapping change submissions
+let modifiedCellLookup = null; // (row, col) => boolean for cells highlighted after a command
+let gridVersion = null; // History version the grid was last rendered from
+let editSocket = null; // WebSocket streaming edits for editSocketSession
+let editSocketSession = null;
+let editSocketUnavailable = false; // Set when the channel cannot connect; edits then use HTTP
+let editSeq = 0;
 
 // Add these variables to track split view state
 let isSplitViewActive = false;
@@ -12,6 +19,7 @@ let editableHotInstance = null;
 
 export function renderSpreadsheet(data) { // data is currentData from main.js
     if (!data || !data.data) return;
+    gridVersion = data.version ?? null;
     
     if (window.hotInstance) {
         window.hotInstance.destroy();
@@ -21,6 +29,10 @@ export function renderSpreadsheet(data) { // data is currentData from main.js
     const columnCount = data.data[0] ? data.data[0].length : 0;
     const alphabeticHeaders = generateExcelColHeaders(columnCount);
     
+    // Modified cells are looked up as cells render, so only the visible viewport is ever checked
+    const lookup = createModifiedCellLookup(data.modified_cells);
+    modifiedCellLookup = lookup;
+    
     const settings = {
         data: data.data,
         rowHeaders: true,
@@ -35,6 +47,11 @@ export function renderSpreadsheet(data) { // data is currentData from main.js
         outsideClickDeselects: false, // Persist selection when clicking outside
         multiSelect: true, // Enable multiple selection of cell ranges
         fillHandle: true, // Enable the drag-down fill handle for data entry
+        cells: function(row, col) {
+            // Always return a className: cell meta is cached, so the highlight must be reset explicitly
+            const modified = modifiedCellLookup !== null && modifiedCellLookup(row, col);
+            return { className: modified ? 'htDark modified' : 'htDark' };
+        },
         afterRender: function() {
             this.rootElement.classList.add('handsontable-dark');
         },
@@ -56,23 +73,16 @@ export function renderSpreadsheet(data) { // data is currentData from main.js
         },
         // Track changes for undo/redo functionality
         afterChange: function(changes, source) {
-            if (source === 'loadData') return; // Skip initial data load
+            if (source === 'loadData' || source === 'server') return; // Skip data load and server patches
             if (!changes) return;
             
             // Process changes for undo/redo
             if (source !== 'undo' && source !== 'redo') {
-                const changeData = {
-                    type: 'cell',
-                    changes: changes.map(([row, prop, oldValue, newValue]) => ({
-                        row, 
-                        col: typeof prop === 'string' ? this.propToCol(prop) : prop,
-                        oldValue, 
-                        newValue
-                    }))
-                };
-                
-                // Add to pending changes queue
-                pendingChanges.push(changeData);
+                queueCellChanges(changes.map(([row, prop, oldValue, newValue]) => [
+                    row,
+                    typeof prop === 'string' ? this.propToCol(prop) : prop,
+                    newValue
+                ]));
                 
                 // Debounce to avoid too many API calls
                 submitPendingChanges();
@@ -144,8 +154,25 @@ export function renderSpreadsheet(data) { // data is currentData from main.js
     
     window.hotInstance = new Handsontable(spreadsheetDataContainer, settings);
     
-    if (data.modified_cells && data.modified_cells.length > 0) {
-        highlightModifiedCells(data.modified_cells);
+    if (lookup) {
+        setTimeout(() => {
+            // Skip if a newer render replaced the highlight
+            if (modifiedCellLookup !== lookup) return;
+            modifiedCellLookup = null;
+            if (window.hotInstance) window.hotInstance.render();
+        }, 2000);
+    }
+}
+
+// Queue [row, col, value] edits as parallel arrays; consecutive edits share one entry
+function queueCellChanges(cells) {
+    const last = pendingChanges[pendingChanges.length - 1];
+    const entry = last && last.type === 'cells' ? last : { type: 'cells', rows: [], cols: [], values: [] };
+    if (entry !== last) pendingChanges.push(entry);
+    for (const [row, col, value] of cells) {
+        entry.rows.push(row);
+        entry.cols.push(col);
+        entry.values.push(value);
     }
 }
 
@@ -164,6 +191,21 @@ function submitPendingChanges() {
         return;
     }
     
+    // Stream edits over the session's channel when it is open; wait while it connects
+    const socket = getEditSocket(sessionId);
+    if (socket && socket.readyState === WebSocket.CONNECTING) {
+        isProcessingChanges = false;
+        return;
+    }
+    if (socket) {
+        editSeq += 1;
+        socket.send(JSON.stringify({ type: 'edit', seq: editSeq, version: gridVersion, changes: pendingChanges }));
+        pendingChanges = [];
+        isProcessingChanges = false;
+        updateStatus('Saving changes...', 'processing');
+        return;
+    }
+    
     // Clone the changes array and clear the pending queue
     const changes = [...pendingChanges];
     pendingChanges = [];
@@ -184,8 +226,7 @@ function submitPendingChanges() {
         // --- Always re-render spreadsheet with latest data from backend ---
         renderSpreadsheet(data);
         updateUndoRedoButtons(data.can_undo, data.can_redo);
-        updateStatus('Changes saved', 'active');
-        setTimeout(() => updateStatus('Ready', 'active'), 2000);
+        reportChangesSaved(data);
     })
     .catch(error => {
         showError(`Error saving changes: ${error.message}`);
@@ -200,6 +241,77 @@ function submitPendingChanges() {
     });
 }
 
+// Show that edits were stored, including columns whose type had to widen (e.g. int64 -> float64)
+function reportChangesSaved(data) {
+    const dtypeChanges = data.dtype_changes || [];
+    if (dtypeChanges.length > 0) {
+        const details = dtypeChanges.map(change => `${change.column}: ${change.from} → ${change.to}`).join(', ');
+        updateStatus(`Changes saved; column types changed (${details})`, 'active');
+    } else {
+        updateStatus('Changes saved', 'active');
+    }
+    setTimeout(() => updateStatus('Ready', 'active'), 2000);
+}
+
+// Get the edit channel for a session, connecting it on first use (null when only HTTP works)
+function getEditSocket(sessionId) {
+    if (editSocketUnavailable || typeof WebSocket === 'undefined') return null;
+    if (editSocket && editSocketSession === sessionId) return editSocket;
+    if (editSocket) editSocket.close();
+
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const socket = new WebSocket(`${protocol}//${window.location.host}/ws/${sessionId}`);
+    let opened = false;
+    editSocket = socket;
+    editSocketSession = sessionId;
+    socket.onopen = () => {
+        opened = true;
+        submitPendingChanges();
+    };
+    socket.onmessage = event => handleChannelMessage(JSON.parse(event.data));
+    socket.onclose = () => {
+        if (editSocket !== socket) return;
+        editSocket = null;
+        editSocketSession = null;
+        // Never connected: the server has no channel, so fall back to HTTP for good
+        if (!opened) editSocketUnavailable = true;
+        submitPendingChanges();
+    };
+    return socket;
+}
+
+// Apply acknowledgements and patches pushed by the edit channel
+function handleChannelMessage(message) {
+    if (message.type === 'patch') {
+        const hot = window.hotInstance;
+        if (!hot || hot.countRows() !== message.shape[0] || hot.countCols() !== message.shape[1]) {
+            reloadSpreadsheet();
+            return;
+        }
+        // Edited cells as stored (e.g. "5" in a number column becomes 5)
+        const { rows, cols, values } = message.cells;
+        if (rows.length > 0) {
+            hot.setDataAtCell(rows.map((row, i) => [row, cols[i], values[i]]), 'server');
+        }
+        updateUndoRedoButtons(message.can_undo, message.can_redo);
+        if (pendingChanges.length === 0) reportChangesSaved(message);
+    } else if (message.type === 'resync') {
+        // The sheet changed elsewhere (command, undo, another tab); edits since then were not applied
+        showError('The spreadsheet changed on the server; your latest edits were not saved.');
+        reloadSpreadsheet();
+    } else if (message.type === 'error') {
+        showError(`Error saving changes: ${message.message}`);
+        updateStatus('Error', 'error');
+        reloadSpreadsheet();
+    }
+}
+
+// Re-render the grid from the server state
+async function reloadSpreadsheet() {
+    const data = await loadSpreadsheetData(window.currentSessionId);
+    if (data) renderSpreadsheet(data);
+}
+
 // Add function to generate Excel-style column headers
 function generateExcelColHeaders(count) {
     const headers = [];
@@ -220,19 +332,6 @@ function generateExcelColHeaders(count) {
     return headers;
 }
 
-function highlightModifiedCells(modifiedCells) {
-    if (!window.hotInstance) return;
-    for (const [row, col] of modifiedCells) {
-        const td = window.hotInstance.getCell(row, col);
-        if (td) {
-            td.classList.add('modified');
-            setTimeout(() => {
-                td.classList.remove('modified');
-            }, 2000);
-        }
-    }
-}
-
 export async function loadSpreadsheetData(sessionId) {
     if (!sessionId) return null;
     showLoading('Loading spreadsheet data...');